@@ -0,0 +1,176 @@
+"""
+Content-addressed cache of AI adjudication results for Falsifi
+
+Two tiers: an in-process LRU in front of the adjudication_cache table.
+Keys hash everything that influences the verdict, including the model and
+a digest of the system prompt, so changing either invalidates old entries.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from flask import has_app_context
+from sqlalchemy.exc import IntegrityError
+from models import db, AdjudicationCacheEntry
+from metrics import ADJUDICATION_CACHE_EVENTS, counter_totals
+
+CACHE_EVENTS = ('memory_hits', 'db_hits', 'misses', 'memory_evictions', 'db_evictions', 'expired')
+
+
+def make_cache_key(bounty_title: str, bounty_description: str, refutation_content: str,
+                   sources: Optional[str], model: str, prompt_version: str) -> str:
+    """Hash the adjudication inputs into a stable cache key."""
+    payload = json.dumps(
+        [bounty_title, bounty_description, refutation_content, sources or '', model, prompt_version],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class AdjudicationCache:
+    """
+    Two-tier adjudication result cache.
+
+    The memory tier is a thread-safe LRU of `memory_size` entries. The table
+    tier is shared by all processes; entries older than `ttl` seconds are
+    treated as misses, and every `prune_every` writes the table is trimmed
+    back to `max_rows` least recently used entries.
+
+    Hits, misses and evictions are counted in the
+    falsifi_adjudication_cache_events Prometheus counter rather than on the
+    instance, so they reach /metrics and, with PROMETHEUS_MULTIPROC_DIR set,
+    can be read from any process.
+    """
+
+    def __init__(self, memory_size: int = 1024, ttl: int = 7 * 24 * 3600,
+                 max_rows: int = 100000, prune_every: int = 100):
+        self.memory_size = memory_size
+        self.ttl = timedelta(seconds=ttl)
+        self.max_rows = max_rows
+        self.prune_every = max(1, prune_every)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        if amount:
+            ADJUDICATION_CACHE_EVENTS.labels(event=name).inc(amount)
+
+    def _remember(self, key: str, result: Dict, stored_at: datetime) -> None:
+        evicted = 0
+        with self._lock:
+            self._memory[key] = (result, stored_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+                evicted += 1
+        self._count('memory_evictions', evicted)
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return a cached result or None. Expired entries count as misses."""
+        now = datetime.utcnow()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                result, stored_at = entry
+                if now - stored_at <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self._count('memory_hits')
+                    return dict(result)
+                del self._memory[key]
+                self._count('expired')
+
+        if not has_app_context():
+            self._count('misses')
+            return None
+
+        table = AdjudicationCacheEntry.__table__
+        # Use a separate connection so cache bookkeeping never joins (or rolls
+        # back) the caller's session transaction.
+        with db.engine.begin() as conn:
+            row = conn.execute(
+                db.select(table.c.result, table.c.created_at).where(table.c.key == key)
+            ).first()
+            if row is None:
+                self._count('misses')
+                return None
+            if now - row.created_at > self.ttl:
+                conn.execute(table.delete().where(table.c.key == key))
+                self._count('expired')
+                self._count('misses')
+                return None
+            conn.execute(
+                table.update().where(table.c.key == key)
+                .values(hit_count=table.c.hit_count + 1, last_used_at=now)
+            )
+
+        result = json.loads(row.result)
+        self._remember(key, result, row.created_at)
+        self._count('db_hits')
+        return dict(result)
+
+    def put(self, key: str, result: Dict) -> None:
+        """Store a result in both tiers."""
+        now = datetime.utcnow()
+        self._remember(key, dict(result), now)
+        if not has_app_context():
+            return
+
+        table = AdjudicationCacheEntry.__table__
+        encoded = json.dumps(result)
+        try:
+            with db.engine.begin() as conn:
+                updated = conn.execute(
+                    table.update().where(table.c.key == key)
+                    .values(result=encoded, created_at=now, last_used_at=now)
+                ).rowcount
+                if not updated:
+                    conn.execute(table.insert().values(
+                        key=key, result=encoded, hit_count=0, created_at=now, last_used_at=now
+                    ))
+        except IntegrityError:
+            # Another worker stored the same key first; its result is as good as ours
+            pass
+
+        with self._lock:
+            self._writes += 1
+            due = self._writes % self.prune_every == 0
+        if due:
+            self.prune()
+
+    def prune(self) -> int:
+        """Delete expired rows and trim the table to `max_rows`. Returns rows deleted."""
+        table = AdjudicationCacheEntry.__table__
+        with db.engine.begin() as conn:
+            deleted = conn.execute(
+                table.delete().where(table.c.created_at < datetime.utcnow() - self.ttl)
+            ).rowcount
+
+            excess = conn.execute(db.select(db.func.count()).select_from(table)).scalar() - self.max_rows
+            if excess > 0:
+                oldest = db.select(table.c.key).order_by(table.c.last_used_at).limit(excess)
+                deleted += conn.execute(table.delete().where(table.c.key.in_(oldest))).rowcount
+
+        self._count('db_evictions', deleted)
+        return deleted
+
+    def clear(self) -> None:
+        """Drop every cached result from both tiers."""
+        with self._lock:
+            self._memory.clear()
+        if has_app_context():
+            with db.engine.begin() as conn:
+                conn.execute(AdjudicationCacheEntry.__table__.delete())
+
+    def get_stats(self) -> Dict:
+        """Cache event totals (all processes in multiprocess mode) and this process's memory tier size."""
+        totals = counter_totals(ADJUDICATION_CACHE_EVENTS, 'event')
+        stats = {name: int(totals.get(name, 0)) for name in CACHE_EVENTS}
+        with self._lock:
+            stats['memory_entries'] = len(self._memory)
+        lookups = stats['memory_hits'] + stats['db_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['db_hits']) / lookups, 4) if lookups else 0.0
+        return stats
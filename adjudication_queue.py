@@ -0,0 +1,280 @@
+"""
+Adjudication job queue for Falsifi - runs AI adjudication outside the request cycle
+"""
+import logging
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from models import db, AdjudicationJob, JobStatus, Refutation, AdjudicationStatus
+from counters import bump_bounty_version
+from circuit_breaker import CircuitOpen
+
+logger = logging.getLogger(__name__)
+
+# Map adjudicator status strings to enum
+STATUS_MAP = {
+    'approved': AdjudicationStatus.APPROVED,
+    'rejected': AdjudicationStatus.REJECTED,
+    'flagged': AdjudicationStatus.FLAGGED
+}
+
+
+def enqueue_adjudication(refutation: Refutation, max_attempts: int = 3) -> AdjudicationJob:
+    """Add an adjudication job for a refutation. Caller commits."""
+    job = AdjudicationJob(
+        refutation=refutation,
+        status=JobStatus.QUEUED,
+        max_attempts=max_attempts,
+        available_at=datetime.utcnow()
+    )
+    db.session.add(job)
+    return job
+
+
+def apply_result(refutation: Refutation, result: Dict) -> None:
+    """Copy an adjudicator result onto a refutation. Caller commits."""
+    bump_bounty_version(refutation.bounty_id)
+    refutation.ai_score = result['score']
+    refutation.ai_feedback = result['feedback']
+    refutation.adjudication_status = STATUS_MAP.get(result['status'], AdjudicationStatus.PENDING)
+
+
+class AdjudicationWorker:
+    """
+    Polls the adjudication_jobs table and evaluates refutations on a thread pool.
+
+    Jobs are claimed with a conditional UPDATE so several worker processes can
+    share the table. A claimed job is hidden for `visibility_timeout` seconds;
+    if the worker dies mid-job it becomes claimable again after that, until it
+    has used up its attempts and is marked FAILED.
+    """
+
+    def __init__(self, app, adjudicator, concurrency: int = 4,
+                 visibility_timeout: int = 300, retry_delay: int = 30,
+                 poll_interval: float = 2.0):
+        self.app = app
+        self.adjudicator = adjudicator
+        self.concurrency = max(1, concurrency)
+        self.visibility_timeout = visibility_timeout
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self._stop = threading.Event()
+
+    def claim_jobs(self, limit: int) -> List[int]:
+        """Claim up to `limit` available jobs, returning their ids."""
+        now = datetime.utcnow()
+        # A job whose worker died on every attempt (it is still RUNNING after its
+        # visibility timeout) must not be reclaimed forever
+        AdjudicationJob.query \
+            .filter(AdjudicationJob.status == JobStatus.RUNNING) \
+            .filter(AdjudicationJob.available_at <= now) \
+            .filter(AdjudicationJob.attempts >= AdjudicationJob.max_attempts) \
+            .update({
+                'status': JobStatus.FAILED,
+                'locked_by': None,
+                'last_error': 'Abandoned: no worker finished it within the visibility timeout',
+                'updated_at': now
+            }, synchronize_session=False)
+
+        candidates = db.session.query(AdjudicationJob.id) \
+            .filter(AdjudicationJob.status.in_([JobStatus.QUEUED, JobStatus.RUNNING])) \
+            .filter(AdjudicationJob.available_at <= now) \
+            .filter(AdjudicationJob.attempts < AdjudicationJob.max_attempts) \
+            .order_by(AdjudicationJob.available_at) \
+            .limit(limit).all()
+
+        claimed = []
+        for (job_id,) in candidates:
+            # Only one worker wins the conditional update for a given job
+            updated = AdjudicationJob.query \
+                .filter(AdjudicationJob.id == job_id) \
+                .filter(AdjudicationJob.status.in_([JobStatus.QUEUED, JobStatus.RUNNING])) \
+                .filter(AdjudicationJob.available_at <= now) \
+                .filter(AdjudicationJob.attempts < AdjudicationJob.max_attempts) \
+                .update({
+                    'status': JobStatus.RUNNING,
+                    'locked_by': self.worker_id,
+                    'attempts': AdjudicationJob.attempts + 1,
+                    'available_at': now + timedelta(seconds=self.visibility_timeout),
+                    'updated_at': now
+                }, synchronize_session=False)
+            if updated:
+                claimed.append(job_id)
+        db.session.commit()
+        return claimed
+
+    def process_job(self, job_id: int) -> None:
+        """Evaluate a single claimed job inside its own app context and session."""
+        self.process_jobs([job_id])
+
+    def process_jobs(self, job_ids: List[int]) -> None:
+        """
+        Evaluate claimed jobs for the same bounty in one batched adjudicator call.
+
+        Runs inside its own app context (and therefore its own session).
+        """
+        with self.app.app_context():
+            jobs = [db.session.get(AdjudicationJob, job_id) for job_id in job_ids]
+            jobs = [job for job in jobs if job is not None and job.locked_by == self.worker_id]
+            if not jobs:
+                return
+
+            try:
+                bounty = jobs[0].refutation.bounty
+                results = self.adjudicator.evaluate_many(
+                    bounty.title,
+                    bounty.description,
+                    [(job.refutation.content, job.refutation.sources) for job in jobs],
+                    defer=True
+                )
+                for job, result in zip(jobs, results):
+                    # Only finish jobs still ours: while the model call ran, rescore_pending
+                    # may have scored the refutation or another worker reclaimed the job
+                    finished = AdjudicationJob.query \
+                        .filter(AdjudicationJob.id == job.id) \
+                        .filter(AdjudicationJob.status == JobStatus.RUNNING) \
+                        .filter(AdjudicationJob.locked_by == self.worker_id) \
+                        .update({
+                            'status': JobStatus.DONE,
+                            'locked_by': None,
+                            'last_error': None,
+                            'updated_at': datetime.utcnow()
+                        }, synchronize_session=False)
+                    if finished:
+                        apply_result(job.refutation, result)
+                db.session.commit()
+            except CircuitOpen as e:
+                db.session.rollback()
+                self._defer(job_ids, e.retry_after)
+            except Exception as e:
+                db.session.rollback()
+                for job in jobs:
+                    self._record_failure(job.id, e)
+
+    def _defer(self, job_ids: List[int], delay: float) -> None:
+        """Put jobs back until the circuit breaker lets calls through; the attempt is not counted."""
+        AdjudicationJob.query \
+            .filter(AdjudicationJob.id.in_(job_ids), AdjudicationJob.locked_by == self.worker_id) \
+            .update({
+                'status': JobStatus.QUEUED,
+                'locked_by': None,
+                'attempts': AdjudicationJob.attempts - 1,
+                'available_at': datetime.utcnow() + timedelta(seconds=max(delay, 1)),
+                'updated_at': datetime.utcnow()
+            }, synchronize_session=False)
+        db.session.commit()
+        logger.warning('AI adjudicator unavailable, deferred %d jobs for %.0fs', len(job_ids), delay)
+
+    def _record_failure(self, job_id: int, error: Exception) -> None:
+        job = db.session.get(AdjudicationJob, job_id)
+        if job is None:
+            return
+        job.last_error = f'{type(error).__name__}: {error}'
+        job.locked_by = None
+        if job.attempts >= job.max_attempts:
+            job.status = JobStatus.FAILED
+            logger.error('Adjudication job %d failed permanently: %s', job_id, error)
+        else:
+            # Back off linearly with the number of attempts so far
+            job.status = JobStatus.QUEUED
+            job.available_at = datetime.utcnow() + timedelta(seconds=self.retry_delay * job.attempts)
+            logger.warning('Adjudication job %d failed (attempt %d), retrying: %s', job_id, job.attempts, error)
+        db.session.commit()
+
+    def run_once(self) -> int:
+        """Claim and process one round of jobs. Returns the number processed."""
+        batch_size = getattr(self.adjudicator, 'max_batch_size', 1)
+        breaker = getattr(self.adjudicator, 'breaker', None)
+        if breaker is not None and breaker.is_open():
+            # Leave jobs queued rather than claiming them only to defer them
+            return 0
+        with self.app.app_context():
+            job_ids = self.claim_jobs(self.concurrency * batch_size)
+            if not job_ids:
+                return 0
+            # Group jobs by bounty so each group shares one adjudicator request
+            rows = db.session.query(AdjudicationJob.id, Refutation.bounty_id) \
+                .join(Refutation, AdjudicationJob.refutation_id == Refutation.id) \
+                .filter(AdjudicationJob.id.in_(job_ids)).all()
+
+        groups = {}
+        for job_id, bounty_id in rows:
+            groups.setdefault(bounty_id, []).append(job_id)
+        batches = []
+        for ids in groups.values():
+            for start in range(0, len(ids), batch_size):
+                batches.append(ids[start:start + batch_size])
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            list(pool.map(self.process_jobs, batches))
+        return len(job_ids)
+
+    def run_forever(self, max_idle_rounds: Optional[int] = None) -> None:
+        """Poll for jobs until stopped (or until `max_idle_rounds` empty polls)."""
+        idle_rounds = 0
+        while not self._stop.is_set():
+            processed = self.run_once()
+            if processed:
+                idle_rounds = 0
+                continue
+            idle_rounds += 1
+            if max_idle_rounds is not None and idle_rounds >= max_idle_rounds:
+                break
+            self._stop.wait(self.poll_interval)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+def rescore_pending(adjudicator, batch_size: int = 8, limit: Optional[int] = None) -> int:
+    """
+    Adjudicate PENDING refutations on auto-adjudicated bounties in per-bounty batches.
+
+    Queued and running jobs for the rescored refutations are marked done so the
+    worker neither evaluates them again nor overwrites these verdicts with a
+    result it is still waiting on. Returns the number of refutations scored.
+    """
+    from models import Bounty
+
+    query = db.session.query(Refutation.id, Refutation.bounty_id) \
+        .join(Bounty, Refutation.bounty_id == Bounty.id) \
+        .filter(Refutation.adjudication_status == AdjudicationStatus.PENDING) \
+        .filter(Bounty.auto_adjudicate == True) \
+        .order_by(Refutation.bounty_id, Refutation.id)
+    if limit:
+        query = query.limit(limit)
+
+    groups = {}
+    for refutation_id, bounty_id in query.all():
+        groups.setdefault(bounty_id, []).append(refutation_id)
+
+    scored = 0
+    for bounty_id, refutation_ids in groups.items():
+        bounty = db.session.get(Bounty, bounty_id)
+        for start in range(0, len(refutation_ids), batch_size):
+            chunk_ids = refutation_ids[start:start + batch_size]
+            refutations = Refutation.query.filter(Refutation.id.in_(chunk_ids)) \
+                .order_by(Refutation.id).all()
+            results = adjudicator.evaluate_many(
+                bounty.title,
+                bounty.description,
+                [(r.content, r.sources) for r in refutations]
+            )
+            for refutation, result in zip(refutations, results):
+                apply_result(refutation, result)
+
+            AdjudicationJob.query \
+                .filter(AdjudicationJob.refutation_id.in_(chunk_ids)) \
+                .filter(AdjudicationJob.status.in_([JobStatus.QUEUED, JobStatus.RUNNING])) \
+                .update({'status': JobStatus.DONE, 'locked_by': None, 'updated_at': datetime.utcnow()},
+                        synchronize_session=False)
+            db.session.commit()
+            scored += len(refutations)
+            logger.info('Rescored %d refutations...', scored)
+
+    return scored
@@ -2,18 +2,65 @@
 AI Adjudicator for Falsifi - LLM-based quality scoring
 """
 import os
-from openai import OpenAI
-from typing import Dict, Tuple, Optional
+import hashlib
+import logging
+import threading
+import time
+from typing import Dict, List, Tuple, Optional
 import json
+from metrics import (
+    ADJUDICATOR_EVALUATIONS, ADJUDICATOR_FALLBACKS, ADJUDICATOR_PARSE_ERRORS, record_model_call
+)
+from fallback_scorer import SPAM_PHRASES, SpamMatcher, default_matcher, score_batch
+from ensemble import JudgeEnsemble
+from circuit_breaker import CircuitBreaker, CircuitOpen, RetryPolicy, call_with_policy, retriable_errors
+from token_budget import PromptBudget, Tokenizer, log_usage
+
+logger = logging.getLogger(__name__)
 
 class AIAdjudicator:
-    def __init__(self, api_key: Optional[str] = None):
-        """Initialize the AI adjudicator with OpenAI API key."""
+    def __init__(self, api_key: Optional[str] = None, max_batch_size: int = 8,
+                 model: str = "gpt-4o-mini", cache=None, spam_phrases: Optional[List[str]] = None,
+                 base_url: Optional[str] = None, ensemble_size: int = 1, judge_timeout: float = 20.0,
+                 breaker: Optional[CircuitBreaker] = None, retry_policy: Optional[RetryPolicy] = None,
+                 budget: Optional[PromptBudget] = None):
+        """
+        Initialize the AI adjudicator with OpenAI API key.
+        
+        `base_url` points the client at any OpenAI-compatible server. With
+        `ensemble_size` > 1 every refutation is scored by that many judges
+        concurrently (see ensemble.py), each judge limited to `judge_timeout` seconds.
+        Model calls go through `retry_policy` and `breaker` (see circuit_breaker.py).
+        Prompts are kept within `budget` (see token_budget.py).
+        """
         self.api_key = api_key or os.getenv('OPENAI_API_KEY')
-        if self.api_key:
-            self.client = OpenAI(api_key=self.api_key)
-        else:
-            self.client = None
+        self.spam_phrases = tuple(spam_phrases) if spam_phrases is not None else SPAM_PHRASES
+        self.spam_matcher = default_matcher() if spam_phrases is None else SpamMatcher(self.spam_phrases)
+        self.max_batch_size = max(1, max_batch_size)
+        self.model = model
+        self.cache = cache  # Optional AdjudicationCache
+        self.base_url = base_url or os.getenv('OPENAI_BASE_URL') or None
+        self.breaker = breaker or CircuitBreaker()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.budget = budget or PromptBudget(Tokenizer(model))
+        self.ensemble = None
+        self._client = None
+        self._client_lock = threading.Lock()
+        if self.api_key and ensemble_size > 1:
+            self.ensemble = JudgeEnsemble(size=ensemble_size, timeout=judge_timeout, api_key=self.api_key,
+                                          base_url=self.base_url, model=self.model, breaker=self.breaker,
+                                          retry_policy=self.retry_policy, budget=self.budget)
+
+    @property
+    def client(self):
+        """The OpenAI client, or None without an API key. Built on first use, so importing the app stays cheap."""
+        if self._client is None and self.api_key:
+            with self._client_lock:
+                if self._client is None:
+                    from openai import OpenAI
+                    # Retries are handled by the retry policy, within its latency budget
+                    self._client = OpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+        return self._client
     
     def evaluate_refutation(self, bounty_title: str, bounty_description: str, 
                            refutation_content: str, sources: Optional[str] = None) -> Dict:
@@ -28,28 +75,248 @@ class AIAdjudicator:
         """
         if not self.client:
             # Fallback: simple heuristic if no API key
-            return self._fallback_evaluation(refutation_content)
+            return self._counted_fallback(refutation_content, 'no_client')
+        
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache_key(bounty_title, bounty_description, refutation_content, sources)
+            cached = self._lookup(cache_key)
+            if cached is not None:
+                ADJUDICATOR_EVALUATIONS.labels(source='cache').inc()
+                return cached
+        
+        return self._evaluate_single(bounty_title, bounty_description,
+                                     refutation_content, sources, cache_key)
+    
+    def _complete(self, mode: str, messages: List[Dict], max_tokens: int, omitted_tokens: int = 0):
+        """
+        One chat completion under the retry policy and circuit breaker; every
+        attempt is timed and the call's token usage logged.
+        """
+        estimated = self.budget.count_messages(messages)
+        def attempt(timeout: float):
+            started = time.perf_counter()
+            response = None
+            try:
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=0.3,
+                    max_tokens=max_tokens,
+                    timeout=timeout
+                )
+            finally:
+                record_model_call(mode, started, response)
+            return response
+        response = call_with_policy(attempt, self.breaker, self.retry_policy)
+        log_usage(mode, estimated, response, omitted_tokens)
+        return response
+    
+    def _evaluate_single(self, bounty_title: str, bounty_description: str,
+                         refutation_content: str, sources: Optional[str] = None,
+                         cache_key: Optional[str] = None, defer: bool = False) -> Dict:
+        """
+        Send one refutation to the model, caching the verdict under `cache_key`.
+        While the circuit is open this falls back, or raises CircuitOpen if `defer`;
+        with `defer` a retriable model error is raised too (see _raise_if_deferred).
+        """
+        if self.ensemble is not None:
+            return self._evaluate_ensemble(bounty_title, bounty_description,
+                                           [(refutation_content, sources)], [cache_key], defer)[0]
         
         try:
-            prompt = self._build_prompt(bounty_title, bounty_description, 
-                                       refutation_content, sources)
+            messages, omitted = self._build_messages(bounty_title, bounty_description,
+                                                     refutation_content, sources)
             
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": self._system_prompt()},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=1000
-            )
+            response = self._complete('single', messages, max_tokens=1000, omitted_tokens=omitted)
             
             result_text = response.choices[0].message.content
-            return self._parse_response(result_text)
+            result = self._parse_response(result_text)
             
+        except CircuitOpen:
+            if defer:
+                raise
+            return self._counted_fallback(refutation_content, 'circuit_open')
+        except Exception as e:
+            logger.warning('AI adjudication error: %r', e)
+            self._raise_if_deferred(e, defer)
+            return self._counted_fallback(refutation_content, 'exception')
+        
+        if 'parsing_error' in result['flags']:
+            ADJUDICATOR_PARSE_ERRORS.labels(mode='single').inc()
+        ADJUDICATOR_EVALUATIONS.labels(source='model').inc()
+        self._store(cache_key, result)
+        return result
+    
+    def _evaluate_ensemble(self, bounty_title: str, bounty_description: str,
+                           refutations: List[Tuple[str, Optional[str]]],
+                           cache_keys: List[Optional[str]], defer: bool = False) -> List[Dict]:
+        """Score refutations with the judge ensemble, all of them concurrently."""
+        if self.breaker.is_open():
+            if defer:
+                raise CircuitOpen(self.breaker.retry_after())
+            return [self._counted_fallback(content, 'circuit_open') for content, _ in refutations]
+        
+        prompts = [self._build_messages(bounty_title, bounty_description, content, sources)[0]
+                   for content, sources in refutations]
+        try:
+            verdicts = self.ensemble.evaluate_all(prompts, self._parse_response)
         except Exception as e:
-            print(f"AI Adjudication error: {e}")
-            return self._fallback_evaluation(refutation_content)
+            logger.exception('AI ensemble adjudication error: %s', e)
+            verdicts = [None] * len(refutations)
+        
+        results = []
+        refused = None
+        for (content, _), cache_key, result in zip(refutations, cache_keys, verdicts):
+            if isinstance(result, CircuitOpen):
+                # The breaker let none of its judges through: it tripped, or another judge is the half-open probe
+                refused = result
+                results.append(None)
+                continue
+            if result is None:
+                # No judge answered in time
+                results.append(self._counted_fallback(content, 'ensemble'))
+                continue
+            ADJUDICATOR_EVALUATIONS.labels(source='ensemble').inc()
+            self._store(cache_key, result)
+            results.append(result)
+        if refused is not None:
+            if defer:
+                # The verdicts that did come back are cached, so the retried jobs find them
+                raise refused
+            results = [self._counted_fallback(content, 'circuit_open') if result is None else result
+                       for (content, _), result in zip(refutations, results)]
+        return results
+    
+    def _raise_if_deferred(self, error: Exception, defer: bool) -> None:
+        """
+        With `defer`, re-raise a retriable model error instead of settling for
+        the heuristic, so the queue retries the job; as CircuitOpen if the
+        failure tripped the breaker, so the job waits out the cooldown instead.
+        """
+        if not defer or not isinstance(error, retriable_errors()):
+            return
+        if self.breaker.is_open():
+            raise CircuitOpen(self.breaker.retry_after()) from error
+        raise error
+
+    def _counted_fallback(self, refutation_content: str, reason: str) -> Dict:
+        ADJUDICATOR_FALLBACKS.labels(reason=reason).inc()
+        ADJUDICATOR_EVALUATIONS.labels(source='fallback').inc()
+        return self._fallback_evaluation(refutation_content)
+    
+    def _counted_fallbacks(self, contents: List[str], reason: str) -> List[Dict]:
+        """Batch form of _counted_fallback, scored with fallback_scorer.score_batch."""
+        ADJUDICATOR_FALLBACKS.labels(reason=reason).inc(len(contents))
+        ADJUDICATOR_EVALUATIONS.labels(source='fallback').inc(len(contents))
+        return score_batch(contents, self.spam_matcher)
+    
+    def prompt_version(self) -> str:
+        """Short digest of the system prompt and token budget; part of every cache key."""
+        version = f'{self._system_prompt()}\n{self.budget.signature()}'
+        return hashlib.sha256(version.encode('utf-8')).hexdigest()[:16]
+    
+    def cache_key(self, bounty_title: str, bounty_description: str,
+                  refutation_content: str, sources: Optional[str] = None) -> str:
+        from adjudication_cache import make_cache_key
+        # Ensemble verdicts are a different thing from single-model ones
+        model = f'{self.model}:ensemble{self.ensemble.size}' if self.ensemble else self.model
+        return make_cache_key(bounty_title, bounty_description, refutation_content,
+                              sources, model, self.prompt_version())
+    
+    def _lookup(self, cache_key: str) -> Optional[Dict]:
+        try:
+            return self.cache.get(cache_key)
+        except Exception as e:
+            logger.exception('Adjudication cache read error: %s', e)
+            return None
+    
+    def _store(self, cache_key: Optional[str], result: Dict) -> None:
+        """Cache a model verdict. Unparseable responses are not worth keeping."""
+        if cache_key is None or 'parsing_error' in result.get('flags', []):
+            return
+        try:
+            self.cache.put(cache_key, result)
+        except Exception as e:
+            logger.exception('Adjudication cache write error: %s', e)
+    
+    def evaluate_many(self, bounty_title: str, bounty_description: str,
+                      refutations: List[Tuple[str, Optional[str]]], defer: bool = False) -> List[Dict]:
+        """
+        Evaluate several refutations of the same bounty.
+        
+        `refutations` is a list of (content, sources) pairs. Refutations are
+        packed up to `max_batch_size` per request so the system prompt and
+        bounty description are only sent once per chunk, the prompt budget
+        shared between them. Items the model
+        fails to return cleanly are re-evaluated with single calls.
+        
+        While the circuit breaker is open, refutations get the heuristic
+        fallback, or with `defer` CircuitOpen is raised so the caller can
+        retry them once the breaker closes.
+        
+        Returns one result dict (see evaluate_refutation) per refutation, in order.
+        """
+        if not self.client:
+            return self._counted_fallbacks([content for content, _ in refutations], 'no_client')
+        
+        results = [None] * len(refutations)
+        keys = [None] * len(refutations)
+        if self.cache is not None:
+            for i, (content, sources) in enumerate(refutations):
+                keys[i] = self.cache_key(bounty_title, bounty_description, content, sources)
+                results[i] = self._lookup(keys[i])
+                if results[i] is not None:
+                    ADJUDICATOR_EVALUATIONS.labels(source='cache').inc()
+        
+        # Only refutations that missed the cache go to the model
+        pending = [i for i, result in enumerate(results) if result is None]
+        if pending and defer and self.breaker.is_open():
+            raise CircuitOpen(self.breaker.retry_after())
+        if self.ensemble is not None:
+            # Judges see one refutation each; the ensembles run side by side instead of batching
+            scored = self._evaluate_ensemble(bounty_title, bounty_description,
+                                             [refutations[i] for i in pending], [keys[i] for i in pending], defer)
+            for i, result in zip(pending, scored):
+                results[i] = result
+            return results
+        
+        for start in range(0, len(pending), self.max_batch_size):
+            indexes = pending[start:start + self.max_batch_size]
+            chunk = [refutations[i] for i in indexes]
+            if len(chunk) == 1:
+                content, sources = chunk[0]
+                results[indexes[0]] = self._evaluate_single(bounty_title, bounty_description,
+                                                            content, sources, keys[indexes[0]], defer)
+                continue
+            
+            try:
+                messages, omitted = self._build_batch_messages(bounty_title, bounty_description, chunk)
+                
+                response = self._complete('batch', messages, max_tokens=600 * len(chunk),
+                                          omitted_tokens=omitted)
+                
+                parsed = self._parse_batch_response(response.choices[0].message.content, len(chunk))
+                ADJUDICATOR_PARSE_ERRORS.labels(mode='batch').inc(parsed.count(None))
+            except CircuitOpen:
+                if defer:
+                    raise
+                parsed = [None] * len(chunk)
+            except Exception as e:
+                logger.warning('AI batch adjudication error: %r', e)
+                self._raise_if_deferred(e, defer)
+                parsed = [None] * len(chunk)
+            
+            for i, (content, sources), result in zip(indexes, chunk, parsed):
+                if result is None:
+                    result = self._evaluate_single(bounty_title, bounty_description, content, sources,
+                                                   keys[i], defer)
+                else:
+                    ADJUDICATOR_EVALUATIONS.labels(source='model').inc()
+                    self._store(keys[i], result)
+                results[i] = result
+        
+        return results
     
     def _system_prompt(self) -> str:
         return """You are an expert in critical thinking, logic, and debate.
@@ -73,43 +340,121 @@ Respond in JSON format:
   "flags": ["list", "of", "issues"]
 }"""
     
-    def _build_prompt(self, bounty_title: str, bounty_description: str,
-                     refutation_content: str, sources: Optional[str] = None) -> str:
-        prompt = f"""BOUNTY CLAIM:
+    def _prefix_messages(self, bounty_title: str, bounty_description: str) -> List[Dict]:
+        """
+        System prompt and bounty claim, sent as separate leading messages.
+        They are identical for every refutation of a bounty (the description
+        is cut deterministically), so providers can serve them from their
+        prompt cache; everything that varies comes after them.
+        """
+        return [
+            {"role": "system", "content": self._system_prompt()},
+            {"role": "user", "content": f"""BOUNTY CLAIM:
 Title: {bounty_title}
-Description: {bounty_description}
-
-REFUTATION SUBMITTED:
-{refutation_content}
-"""
+Description: {self.budget.fit_description(bounty_description)}"""}
+        ]
+    
+    def _available_tokens(self, prefix: List[Dict], template: str, refutations: int = 1) -> int:
+        """
+        Prompt tokens left for each refutation and its sources once the fixed
+        parts (the prefix and the last message's headings and instruction) are counted.
+        """
+        fixed = self.budget.count_messages(prefix + [{"content": template}])
+        return max(self.budget.max_prompt_tokens - fixed, 0) // refutations
+    
+    def _build_messages(self, bounty_title: str, bounty_description: str,
+                        refutation_content: str, sources: Optional[str] = None) -> Tuple[List[Dict], int]:
+        """Chat messages for one refutation within the token budget, and the tokens cut to fit."""
+        messages = self._prefix_messages(bounty_title, bounty_description)
+        instruction = "Evaluate this refutation and provide your assessment in the requested JSON format."
+        content, sources, omitted = self.budget.fit_refutation(
+            refutation_content, sources,
+            self._available_tokens(messages, f"REFUTATION SUBMITTED:\n\nSOURCES PROVIDED:\n\n{instruction}"))
+        
+        prompt = f"REFUTATION SUBMITTED:\n{content}\n"
         if sources:
             prompt += f"\nSOURCES PROVIDED:\n{sources}\n"
         
-        prompt += "\nEvaluate this refutation and provide your assessment in the requested JSON format."
-        return prompt
+        prompt += f"\n{instruction}"
+        messages.append({"role": "user", "content": prompt})
+        return messages, omitted
+    
+    def _build_batch_messages(self, bounty_title: str, bounty_description: str,
+                              refutations: List[Tuple[str, Optional[str]]]) -> Tuple[List[Dict], int]:
+        """Chat messages for several refutations, which share the budget equally."""
+        messages = self._prefix_messages(bounty_title, bounty_description)
+        instruction = (f"Evaluate each of the {len(refutations)} refutations independently. "
+                       "Respond with a JSON array containing one object per refutation, in order, "
+                       "each in the requested JSON format plus an \"id\" field with the refutation number.")
+        headings = "".join(f"REFUTATION {i}:\n\nSOURCES PROVIDED FOR REFUTATION {i}:\n\n"
+                           for i in range(1, len(refutations) + 1))
+        available = self._available_tokens(messages, headings + instruction, len(refutations))
+        
+        prompt = ""
+        omitted = 0
+        for i, (content, sources) in enumerate(refutations, 1):
+            content, sources, cut = self.budget.fit_refutation(content, sources, available)
+            omitted += cut
+            prompt += f"REFUTATION {i}:\n{content}\n\n"
+            if sources:
+                prompt += f"SOURCES PROVIDED FOR REFUTATION {i}:\n{sources}\n\n"
+        
+        prompt += instruction
+        messages.append({"role": "user", "content": prompt})
+        return messages, omitted
+    
+    def _extract_json(self, response_text: str):
+        """Extract and decode JSON from the response, which may be wrapped in markdown code blocks."""
+        if "```json" in response_text:
+            json_str = response_text.split("```json")[1].split("```")[0].strip()
+        elif "```" in response_text:
+            json_str = response_text.split("```")[1].split("```")[0].strip()
+        else:
+            json_str = response_text.strip()
+        return json.loads(json_str)
+    
+    def _normalize_result(self, result: Dict) -> Dict:
+        """Ensure required fields exist. Raises ValueError for JSON that is not an object."""
+        if not isinstance(result, dict):
+            raise ValueError(f'expected a JSON object, got {type(result).__name__}')
+        return {
+            'score': result.get('score', 50),
+            'feedback': result.get('feedback', 'No feedback provided'),
+            'status': result.get('status', 'approved'),
+            'flags': result.get('flags', [])
+        }
+    
+    def _parse_batch_response(self, response_text: str, count: int) -> List[Optional[Dict]]:
+        """
+        Parse a batch response into a per-refutation list.
+        
+        Entries the model omitted or mangled are None so the caller can
+        retry just those items.
+        """
+        results = [None] * count
+        try:
+            items = self._extract_json(response_text or "")
+        except json.JSONDecodeError:
+            return results
+        
+        if isinstance(items, dict):
+            items = items.get('results', [])
+        if not isinstance(items, list):
+            return results
+        
+        for position, item in enumerate(items):
+            if not isinstance(item, dict) or 'score' not in item:
+                continue
+            index = item.get('id', position + 1)
+            if isinstance(index, int) and 1 <= index <= count and results[index - 1] is None:
+                results[index - 1] = self._normalize_result(item)
+        return results
     
     def _parse_response(self, response_text: str) -> Dict:
         """Parse the LLM response, handling potential formatting issues."""
         try:
-            # Try to extract JSON from the response
-            # Handle cases where LLM might wrap in markdown code blocks
-            if "```json" in response_text:
-                json_str = response_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in response_text:
-                json_str = response_text.split("```")[1].split("```")[0].strip()
-            else:
-                json_str = response_text.strip()
-            
-            result = json.loads(json_str)
-            
-            # Ensure required fields exist
-            return {
-                'score': result.get('score', 50),
-                'feedback': result.get('feedback', 'No feedback provided'),
-                'status': result.get('status', 'approved'),
-                'flags': result.get('flags', [])
-            }
-        except json.JSONDecodeError:
+            return self._normalize_result(self._extract_json(response_text))
+        except ValueError:  # Includes json.JSONDecodeError
             # Fallback parsing if JSON fails
             return {
                 'score': 50,
@@ -135,8 +480,7 @@ REFUTATION SUBMITTED:
             score += 10
         
         # Check for spam indicators
-        spam_phrases = ['click here', 'buy now', 'limited time', 'make money fast']
-        if any(phrase in refutation_content.lower() for phrase in spam_phrases):
+        if any(phrase in refutation_content.lower() for phrase in self.spam_phrases):
             score = 10
             flags.append("spam_detected")
         
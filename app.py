@@ -3,10 +3,34 @@ Falsifi - Refutation Bounty Platform
 Main Flask Application
 """
 import os
+import json
+import logging
+import hashlib
+import time
+import click
 from datetime import datetime, timedelta
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
-from models import db, User, Bounty, Refutation, LeaderboardEntry, BountyStatus, AdjudicationStatus
+from flask import Flask, Response, abort, render_template, request, redirect, url_for, flash, jsonify, stream_with_context
+from sqlalchemy.orm import configure_mappers
+from models import db, User, Bounty, Refutation, LeaderboardEntry, BountyStatus, AdjudicationStatus, AdjudicationCacheEntry
 from ai_adjudicator import AIAdjudicator
+from circuit_breaker import CircuitBreaker, RetryPolicy
+from token_budget import PromptBudget
+from adjudication_cache import AdjudicationCache
+from adjudication_queue import AdjudicationWorker, enqueue_adjudication, rescore_pending
+from pagination import keyset_page, page_size
+from instrumentation import init_instrumentation
+from metrics import init_metrics
+from counters import (count_new_user, count_new_bounty, count_bounty_closed, count_new_refutation,
+                      bump_bounty_version, recount_counters, site_counters, SITE_COUNTERS)
+from migrations import run_migrations, check_query_plans
+import search
+import duplicates
+import related
+import ledger
+import expiry
+import seeder
+from importer import import_files, ImportValidationError
+from leaderboard import record_refutation, record_rating, rebuild_leaderboard, top_entries
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
@@ -15,10 +39,73 @@ if database_url.startswith("postgres:"):
     database_url = database_url.replace("postgres:", "postgresql:", 1)
 app.config["SQLALCHEMY_DATABASE_URI"] = database_url
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['ADJUDICATION_CONCURRENCY'] = int(os.getenv('ADJUDICATION_CONCURRENCY', 4))
+app.config['ADJUDICATION_MAX_ATTEMPTS'] = int(os.getenv('ADJUDICATION_MAX_ATTEMPTS', 3))
+app.config['ADJUDICATION_VISIBILITY_TIMEOUT'] = int(os.getenv('ADJUDICATION_VISIBILITY_TIMEOUT', 300))
+app.config['ADJUDICATION_BATCH_SIZE'] = int(os.getenv('ADJUDICATION_BATCH_SIZE', 8))
+app.config['ADJUDICATION_CACHE_SIZE'] = int(os.getenv('ADJUDICATION_CACHE_SIZE', 1024))
+app.config['ADJUDICATION_CACHE_TTL'] = int(os.getenv('ADJUDICATION_CACHE_TTL', 7 * 24 * 3600))
+app.config['ADJUDICATION_CACHE_MAX_ROWS'] = int(os.getenv('ADJUDICATION_CACHE_MAX_ROWS', 100000))
+app.config['ADJUDICATION_ENSEMBLE_SIZE'] = int(os.getenv('ADJUDICATION_ENSEMBLE_SIZE', 1))
+app.config['ADJUDICATION_JUDGE_TIMEOUT'] = float(os.getenv('ADJUDICATION_JUDGE_TIMEOUT', 20))
+app.config['OPENAI_BASE_URL'] = os.getenv('OPENAI_BASE_URL')
+app.config['ADJUDICATION_LATENCY_BUDGET'] = float(os.getenv('ADJUDICATION_LATENCY_BUDGET', 30))
+app.config['ADJUDICATION_MAX_RETRIES'] = int(os.getenv('ADJUDICATION_MAX_RETRIES', 2))
+app.config['ADJUDICATION_BREAKER_THRESHOLD'] = int(os.getenv('ADJUDICATION_BREAKER_THRESHOLD', 5))
+app.config['ADJUDICATION_BREAKER_WINDOW'] = float(os.getenv('ADJUDICATION_BREAKER_WINDOW', 60))
+app.config['ADJUDICATION_BREAKER_COOLDOWN'] = float(os.getenv('ADJUDICATION_BREAKER_COOLDOWN', 30))
+app.config['ADJUDICATION_MAX_PROMPT_TOKENS'] = int(os.getenv('ADJUDICATION_MAX_PROMPT_TOKENS', 4000))
+app.config['ADJUDICATION_MAX_DESCRIPTION_TOKENS'] = int(os.getenv('ADJUDICATION_MAX_DESCRIPTION_TOKENS', 1000))
+app.config['ADJUDICATION_MAX_REFUTATION_TOKENS'] = int(os.getenv('ADJUDICATION_MAX_REFUTATION_TOKENS', 2000))
+app.config['ADJUDICATION_MAX_SOURCES_TOKENS'] = int(os.getenv('ADJUDICATION_MAX_SOURCES_TOKENS', 500))
+app.config['ADJUDICATION_TRUNCATION'] = os.getenv('ADJUDICATION_TRUNCATION', 'middle')
+app.config['SQL_INSTRUMENTATION'] = os.getenv('SQL_INSTRUMENTATION', '').lower() in ('1', 'true', 'yes')
+app.config['SLOW_QUERY_MS'] = float(os.getenv('SLOW_QUERY_MS', 100))
+app.config['METRICS_ENABLED'] = os.getenv('METRICS_ENABLED', '1').lower() in ('1', 'true', 'yes')
+app.config['SITE_COUNTER_TTL'] = float(os.getenv('SITE_COUNTER_TTL', 5))
+app.config['API_CACHE_MAX_AGE'] = int(os.getenv('API_CACHE_MAX_AGE', 0))
+app.config['DUPLICATE_THRESHOLD'] = float(os.getenv('DUPLICATE_THRESHOLD', 0.8))
+app.config['RELATED_TOP_K'] = int(os.getenv('RELATED_TOP_K', 10))
+app.config['EXPIRY_BATCH_SIZE'] = int(os.getenv('EXPIRY_BATCH_SIZE', 500))
+app.config['EXPIRY_SWEEP_INTERVAL'] = float(os.getenv('EXPIRY_SWEEP_INTERVAL', 60))
+app.config['LOG_LEVEL'] = os.getenv('LOG_LEVEL', 'INFO').upper()
+
+# Without a handler on the root logger, module loggers below WARNING are dropped
+logging.basicConfig(level=app.config['LOG_LEVEL'], format='%(asctime)s %(levelname)s %(name)s %(message)s')
 
 # Initialize extensions
 db.init_app(app)
-adjudicator = AIAdjudicator()
+init_instrumentation(app)
+if app.config['METRICS_ENABLED']:
+    init_metrics(app)
+adjudication_cache = AdjudicationCache(
+    memory_size=app.config['ADJUDICATION_CACHE_SIZE'],
+    ttl=app.config['ADJUDICATION_CACHE_TTL'],
+    max_rows=app.config['ADJUDICATION_CACHE_MAX_ROWS']
+)
+adjudicator = AIAdjudicator(
+    max_batch_size=app.config['ADJUDICATION_BATCH_SIZE'],
+    cache=adjudication_cache,
+    base_url=app.config['OPENAI_BASE_URL'],
+    ensemble_size=app.config['ADJUDICATION_ENSEMBLE_SIZE'],
+    judge_timeout=app.config['ADJUDICATION_JUDGE_TIMEOUT'],
+    breaker=CircuitBreaker(
+        failure_threshold=app.config['ADJUDICATION_BREAKER_THRESHOLD'],
+        window=app.config['ADJUDICATION_BREAKER_WINDOW'],
+        cooldown=app.config['ADJUDICATION_BREAKER_COOLDOWN']
+    ),
+    retry_policy=RetryPolicy(
+        max_attempts=app.config['ADJUDICATION_MAX_RETRIES'] + 1,
+        budget=app.config['ADJUDICATION_LATENCY_BUDGET']
+    ),
+    budget=PromptBudget(
+        max_prompt_tokens=app.config['ADJUDICATION_MAX_PROMPT_TOKENS'],
+        max_description_tokens=app.config['ADJUDICATION_MAX_DESCRIPTION_TOKENS'],
+        max_refutation_tokens=app.config['ADJUDICATION_MAX_REFUTATION_TOKENS'],
+        max_sources_tokens=app.config['ADJUDICATION_MAX_SOURCES_TOKENS'],
+        policy=app.config['ADJUDICATION_TRUNCATION']
+    )
+)
 
 # Context processor for template globals
 @app.context_processor
@@ -37,11 +124,11 @@ def nl2br_filter(text):
 
 def get_current_user():
     """Get current user from session. For MVP, we use a simple user_id in session."""
-    from flask import session
-    user_id = session.get('user_id')
-    if user_id:
-        return User.query.get(user_id)
-    return None
+    from flask import session, g
+    if 'current_user' not in g:
+        user_id = session.get('user_id')
+        g.current_user = db.session.get(User, user_id) if user_id else None
+    return g.current_user
 
 def require_login():
     """Check if user is logged in."""
@@ -56,15 +143,11 @@ def require_login():
 @app.route('/')
 def index():
     """Home page with featured bounties."""
-    featured_bounties = Bounty.query.filter_by(status=BountyStatus.OPEN) \
+    featured_bounties = Bounty.query.options(db.joinedload(Bounty.creator)) \
+                                    .filter_by(status=BountyStatus.OPEN) \
                                     .order_by(Bounty.created_at.desc()) \
                                     .limit(5).all()
-    stats = {
-        'total_bounties': Bounty.query.count(),
-        'open_bounties': Bounty.query.filter_by(status=BountyStatus.OPEN).count(),
-        'total_refutations': Refutation.query.count(),
-        'total_users': User.query.count()
-    }
+    stats = site_counters(ttl=app.config['SITE_COUNTER_TTL'])
     return render_template('index.html', bounties=featured_bounties, stats=stats)
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -93,6 +176,8 @@ def logout():
     flash('Logged out successfully', 'info')
     return redirect(url_for('index'))
 
+STARTING_POINTS = 1000
+
 @app.route('/register', methods=['GET', 'POST'])
 def register():
     """Register new user."""
@@ -108,8 +193,11 @@ def register():
             flash('Email already registered', 'error')
             return render_template('register.html')
         
-        user = User(username=username, email=email, points=1000)
+        user = User(username=username, email=email, points=0)
         db.session.add(user)
+        db.session.flush()
+        ledger.credit(user.id, STARTING_POINTS, 'signup_bonus')
+        count_new_user()
         db.session.commit()
         
         from flask import session
@@ -121,12 +209,8 @@ def register():
 
 # ============== BOUNTIES ==============
 
-@app.route('/bounties')
-def list_bounties():
-    """List all bounties with filtering."""
-    status = request.args.get('status', 'all')
-    category = request.args.get('category', 'all')
-    
+def filter_bounties(status, category):
+    """Bounty query with the status/category filters used by listings."""
     query = Bounty.query
     
     if status == 'open':
@@ -137,7 +221,18 @@ def list_bounties():
     if category != 'all':
         query = query.filter_by(category=category)
     
-    bounties = query.order_by(Bounty.created_at.desc()).all()
+    return query
+
+@app.route('/bounties')
+def list_bounties():
+    """List bounties with filtering and cursor pagination."""
+    status = request.args.get('status', 'all')
+    category = request.args.get('category', 'all')
+    limit = page_size(request.args.get('limit'))
+    
+    bounties, next_cursor, prev_cursor = keyset_page(
+        filter_bounties(status, category), Bounty, request.args.get('cursor'), limit
+    )
     
     # Get unique categories for filter
     categories = db.session.query(Bounty.category).distinct().all()
@@ -145,13 +240,15 @@ def list_bounties():
     
     return render_template('bounties.html', bounties=bounties, 
                           current_status=status, current_category=category,
-                          categories=categories)
+                          categories=categories,
+                          next_cursor=next_cursor, prev_cursor=prev_cursor)
 
 @app.route('/bounties/<int:bounty_id>')
 def view_bounty(bounty_id):
     """View a single bounty with its refutations."""
     bounty = Bounty.query.get_or_404(bounty_id)
-    refutations = Refutation.query.filter_by(bounty_id=bounty_id) \
+    refutations = Refutation.query.options(db.joinedload(Refutation.author)) \
+                                  .filter_by(bounty_id=bounty_id) \
                                   .order_by(Refutation.created_at.desc()).all()
     
     # Calculate some stats
@@ -169,7 +266,8 @@ def view_bounty(bounty_id):
                           refutations=refutations,
                           avg_rating=avg_rating,
                           can_refute=can_refute,
-                          is_owner=is_owner)
+                          is_owner=is_owner,
+                          related_bounties=related.related_bounties(bounty_id, limit=5))
 
 @app.route('/bounties/create', methods=['GET', 'POST'])
 def create_bounty():
@@ -187,12 +285,9 @@ def create_bounty():
         
         user = get_current_user()
         
-        if user.points < bounty_amount:
-            flash('Insufficient points for this bounty', 'error')
-            return render_template('create_bounty.html')
-        
-        # Deduct points
-        user.points -= bounty_amount
+        if bounty_amount <= 0:
+            flash('Bounty amount must be positive', 'error')
+            return render_template('create_bounty.html', user=user)
         
         bounty = Bounty(
             title=title,
@@ -205,6 +300,18 @@ def create_bounty():
         )
         
         db.session.add(bounty)
+        db.session.flush()
+        
+        # Escrow the reward; fails without side effects if the balance is too low
+        try:
+            ledger.debit(user.id, bounty_amount, 'bounty_escrow', bounty)
+        except ledger.InsufficientPoints:
+            db.session.rollback()
+            flash('Insufficient points for this bounty', 'error')
+            return render_template('create_bounty.html', user=get_current_user())
+        
+        count_new_bounty(user.id)
+        related.index_bounty(bounty, top_k=app.config['RELATED_TOP_K'])
         db.session.commit()
         
         flash('Bounty created successfully!', 'success')
@@ -226,10 +333,21 @@ def close_bounty(bounty_id):
         flash('Only the bounty creator can close this', 'error')
         return redirect(url_for('view_bounty', bounty_id=bounty_id))
     
-    bounty.status = BountyStatus.CLOSED
+    if bounty.status != BountyStatus.OPEN:
+        flash('This bounty is already closed', 'info')
+        return redirect(url_for('view_bounty', bounty_id=bounty_id))
+    
+    # Only if still open: the expiry sweeper (or a second request) may have moved and refunded it meanwhile
+    closed = Bounty.query.filter_by(id=bounty.id, status=BountyStatus.OPEN) \
+        .update({Bounty.status: BountyStatus.CLOSED}, synchronize_session='fetch')
+    if not closed:
+        db.session.rollback()
+        flash('This bounty is already closed', 'info')
+        return redirect(url_for('view_bounty', bounty_id=bounty_id))
+    count_bounty_closed(bounty.id)
     
     # Return unclaimed bounty amount to creator
-    user.points += bounty.bounty_amount
+    ledger.credit(user.id, bounty.bounty_amount, 'bounty_refund', bounty)
     
     db.session.commit()
     
@@ -261,14 +379,10 @@ def submit_refutation(bounty_id):
         sources = request.form.get('sources', '')
         bond_amount = int(request.form.get('bond_amount', 50))
         
-        # Check if user has enough points for bond
-        if user.points < bond_amount:
-            flash(f'Insufficient points for bond. You need {bond_amount} points.', 'error')
+        if bond_amount < 0:
+            flash('Bond amount cannot be negative', 'error')
             return render_template('submit_refutation.html', bounty=bounty, user=user)
         
-        # Deduct bond
-        user.points -= bond_amount
-        
         # Create refutation
         refutation = Refutation(
             bounty_id=bounty_id,
@@ -279,36 +393,37 @@ def submit_refutation(bounty_id):
         )
         
         db.session.add(refutation)
+        db.session.flush()
+        
+        # Deduct bond
+        try:
+            ledger.debit(user.id, bond_amount, 'refutation_bond', refutation)
+        except ledger.InsufficientPoints:
+            db.session.rollback()
+            flash(f'Insufficient points for bond. You need {bond_amount} points.', 'error')
+            return render_template('submit_refutation.html', bounty=bounty, user=get_current_user())
+        
+        count_new_refutation(bounty_id, user.id)
+        record_refutation(user.id)
+        db.session.flush()
+        
+        # Near-duplicates of earlier refutations are settled without the LLM;
+        # on other bounties the creator judges them like any refutation
+        duplicate = duplicates.check_and_index(refutation, app.config['DUPLICATE_THRESHOLD'])
+        if not bounty.auto_adjudicate:
+            duplicate = None
+        if duplicate:
+            duplicates.apply_duplicate_verdict(refutation, duplicate)
+        elif bounty.auto_adjudicate:
+            # AI Adjudication runs in the background worker (flask adjudication-worker)
+            enqueue_adjudication(refutation, max_attempts=app.config['ADJUDICATION_MAX_ATTEMPTS'])
+        
         db.session.commit()
         
-        # AI Adjudication
-        if bounty.auto_adjudicate:
-            result = adjudicator.evaluate_refutation(
-                bounty.title,
-                bounty.description,
-                content,
-                sources
-            )
-            
-            refutation.ai_score = result['score']
-            refutation.ai_feedback = result['feedback']
-            
-            # Map status string to enum
-            status_map = {
-                'approved': AdjudicationStatus.APPROVED,
-                'rejected': AdjudicationStatus.REJECTED,
-                'flagged': AdjudicationStatus.FLAGGED
-            }
-            refutation.adjudication_status = status_map.get(result['status'], AdjudicationStatus.PENDING)
-            
-            db.session.commit()
-            
-            if result['status'] == 'rejected':
-                flash('Your refutation was auto-rejected for low quality. Bond forfeited.', 'warning')
-            elif result['status'] == 'flagged':
-                flash('Your refutation has been flagged for human review.', 'warning')
-            else:
-                flash('Refutation submitted! AI pre-screening passed.', 'success')
+        if duplicate:
+            flash('Refutation submitted. It closely matches an earlier refutation and was not sent for AI review.', 'info')
+        elif bounty.auto_adjudicate:
+            flash('Refutation submitted! AI pre-screening is in progress.', 'success')
         else:
             flash('Refutation submitted and awaiting review!', 'success')
         
@@ -333,34 +448,93 @@ def rate_refutation(refutation_id):
     
     rating = int(request.form.get('rating', 5))
     feedback = request.form.get('feedback', '')
+    previous_rating = refutation.creator_rating
+    previous_reward = refutation.reward_earned or 0
     
-    refutation.creator_rating = rating
-    refutation.creator_feedback = feedback
-    
-    # Calculate and award reward
+    # Calculate reward
     reward = adjudicator.calculate_reward(
         refutation.ai_score or 50,
         rating,
         bounty.bounty_amount
     )
-    refutation.reward_earned = reward
+    return_bond = adjudicator.should_return_bond(refutation.ai_score or 50, rating) and not refutation.bond_returned
+    
+    # Compare-and-set against the values read above, so two ratings submitted
+    # at once cannot both pay out against the same previous reward
+    rated = Refutation.query.filter_by(id=refutation.id, creator_rating=previous_rating,
+                                       reward_earned=refutation.reward_earned,
+                                       bond_returned=refutation.bond_returned) \
+        .update({Refutation.creator_rating: rating,
+                 Refutation.creator_feedback: feedback,
+                 Refutation.reward_earned: reward,
+                 Refutation.bond_returned: bool(refutation.bond_returned or return_bond)},
+                synchronize_session='fetch')
+    if not rated:
+        db.session.rollback()
+        flash('This refutation was rated again in the meantime. Please check the rating and try again.', 'error')
+        return redirect(url_for('view_bounty', bounty_id=bounty.id))
     
-    # Award points to refutation author
-    refutation.author.points += reward
+    # Only the change in reward moves points, so a re-rating never pays twice
+    try:
+        if reward > previous_reward:
+            ledger.credit(refutation.author_id, reward - previous_reward, 'reward', refutation)
+        elif reward < previous_reward:
+            ledger.debit(refutation.author_id, previous_reward - reward, 'reward_adjustment', refutation)
+    except ledger.InsufficientPoints:
+        db.session.rollback()
+        flash(f'Rating not changed: the author no longer has the {previous_reward - reward} points '
+              f'it would take back.', 'error')
+        return redirect(url_for('view_bounty', bounty_id=bounty.id))
     
     # Return bond if rated well
-    if adjudicator.should_return_bond(refutation.ai_score or 50, rating):
-        refutation.author.points += refutation.bond_amount
-        refutation.bond_returned = True
+    if return_bond:
+        ledger.credit(refutation.author_id, refutation.bond_amount, 'bond_return', refutation)
     
-    # Update author reputation
+    # Update author reputation and leaderboard standing
     update_user_reputation(refutation.author)
+    bump_bounty_version(bounty.id)
+    record_rating(refutation.author_id, rating, reward, previous_rating, previous_reward)
     
     db.session.commit()
     
     flash(f'Rating submitted! Author earned {reward} points.', 'success')
     return redirect(url_for('view_bounty', bounty_id=bounty.id))
 
+# ============== SEARCH ==============
+
+SEARCH_TYPES = ('bounties', 'refutations')
+
+def run_search():
+    """Parse search query args and return (query, kind, page, limit, results)."""
+    query = request.args.get('q', '').strip()
+    kind = request.args.get('type', 'bounties')
+    if kind not in SEARCH_TYPES:
+        kind = 'bounties'
+    limit = page_size(request.args.get('limit'))
+    page = max(1, min(request.args.get('page', 1, type=int) or 1, 50))
+    results = search.search(query, kind=kind, limit=limit + 1, offset=(page - 1) * limit)
+    return query, kind, page, limit, results
+
+@app.route('/search')
+def search_page():
+    """Full-text search over bounties and refutations."""
+    query, kind, page, limit, results = run_search()
+    return render_template('search.html', query=query, kind=kind, page=page,
+                          results=results[:limit], has_next=len(results) > limit)
+
+@app.route('/api/search')
+def api_search():
+    """API endpoint for ranked full-text search."""
+    query, kind, page, limit, results = run_search()
+    return jsonify({
+        'query': query,
+        'type': kind,
+        'page': page,
+        'limit': limit,
+        'results': results[:limit],
+        'has_next': len(results) > limit
+    })
+
 # ============== DASHBOARD & LEADERBOARD ==============
 
 @app.route('/dashboard')
@@ -387,8 +561,8 @@ def dashboard():
     stats = {
         'total_earned': total_earned,
         'avg_rating': round(avg_received_rating, 2) if avg_received_rating else None,
-        'refutations_submitted': len(my_refutations),
-        'bounties_created': len(my_bounties),
+        'refutations_submitted': user.refutation_count,
+        'bounties_created': user.bounty_count,
         'current_points': user.points
     }
     
@@ -401,40 +575,7 @@ def dashboard():
 @app.route('/leaderboard')
 def leaderboard():
     """Show leaderboard of top refutation providers."""
-    # Update leaderboard cache
-    update_leaderboard()
-    
-    top_users = LeaderboardEntry.query \
-        .join(User) \
-        .order_by(LeaderboardEntry.total_earned.desc()) \
-        .limit(20).all()
-    
-    return render_template('leaderboard.html', entries=top_users)
-
-def update_leaderboard():
-    """Update the leaderboard cache."""
-    # Clear old entries
-    LeaderboardEntry.query.delete()
-    
-    # Calculate stats for each user with refutations
-    users_with_refutations = db.session.query(User.id).join(Refutation).distinct().all()
-    
-    for (user_id,) in users_with_refutations:
-        stats = db.session.query(
-            db.func.count(Refutation.id).label('count'),
-            db.func.avg(Refutation.creator_rating).label('avg_rating'),
-            db.func.sum(Refutation.reward_earned).label('total_earned')
-        ).filter_by(author_id=user_id).first()
-        
-        entry = LeaderboardEntry(
-            user_id=user_id,
-            total_refutations=stats.count or 0,
-            avg_rating=stats.avg_rating or 0,
-            total_earned=stats.total_earned or 0
-        )
-        db.session.add(entry)
-    
-    db.session.commit()
+    return render_template('leaderboard.html', entries=top_entries(20))
 
 def update_user_reputation(user):
     """Update a user's reputation score based on their refutations."""
@@ -449,19 +590,126 @@ def update_user_reputation(user):
 
 # ============== API ENDPOINTS ==============
 
+def etag_response(etag):
+    """
+    Return a 304 if the client already has `etag`, else None. The caller
+    builds the full response and passes it through cacheable().
+    """
+    if etag in request.if_none_match:
+        return cacheable(Response(status=304), etag)
+    return None
+
+def cacheable(response, etag):
+    """Attach a strong ETag and Cache-Control suitable for shared caches."""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f"public, max-age={app.config['API_CACHE_MAX_AGE']}, must-revalidate"
+    return response
+
+def page_etag(rows, next_cursor, prev_cursor):
+    """
+    ETag for one page of bounties: the (id, version) of each row plus the
+    cursors, so it changes when a bounty on the page changes or the page's
+    membership does, and not on writes elsewhere in the table.
+    """
+    stamps = [[row.id, row.version] for row in rows]
+    payload = json.dumps([stamps, next_cursor, prev_cursor, sorted(request.args.items(multi=True))])
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
 @app.route('/api/bounties')
 def api_bounties():
-    """API endpoint for bounties."""
-    bounties = Bounty.query.order_by(Bounty.created_at.desc()).all()
-    return jsonify([b.to_dict() for b in bounties])
+    """API endpoint for bounties, paginated with opaque cursors."""
+    limit = page_size(request.args.get('limit'))
+    query = filter_bounties(request.args.get('status', 'all'), request.args.get('category', 'all'))
+    # Revalidation reads only the page's ids and versions
+    stamps, next_cursor, prev_cursor = keyset_page(
+        query.with_entities(Bounty.id, Bounty.version, Bounty.created_at), Bounty, request.args.get('cursor'), limit
+    )
+    not_modified = etag_response(page_etag(stamps, next_cursor, prev_cursor))
+    if not_modified:
+        return not_modified
+    
+    bounties, next_cursor, prev_cursor = keyset_page(
+        query.options(db.joinedload(Bounty.creator)), Bounty, request.args.get('cursor'), limit
+    )
+    # Built from the loaded rows in case the page changed since the check above
+    return cacheable(jsonify({
+        'bounties': [b.to_dict() for b in bounties],
+        'next_cursor': next_cursor,
+        'prev_cursor': prev_cursor,
+        'limit': limit
+    }), page_etag(bounties, next_cursor, prev_cursor))
 
 @app.route('/api/bounties/<int:bounty_id>')
 def api_bounty(bounty_id):
     """API endpoint for single bounty."""
-    bounty = Bounty.query.get_or_404(bounty_id)
+    version = db.session.query(Bounty.version).filter_by(id=bounty_id).scalar()
+    if version is None:
+        abort(404)
+    etag = f'bounty-{bounty_id}-v{version}'
+    not_modified = etag_response(etag)
+    if not_modified:
+        return not_modified
+    
+    bounty = Bounty.query.options(db.joinedload(Bounty.creator)).get_or_404(bounty_id)
     data = bounty.to_dict()
-    data['refutations'] = [r.to_dict() for r in bounty.refutations]
-    return jsonify(data)
+    refutations = Refutation.query.options(db.joinedload(Refutation.author)) \
+                                  .filter_by(bounty_id=bounty_id).all()
+    data['refutations'] = [r.to_dict() for r in refutations]
+    # Use the loaded row's version in case it changed since the check above
+    return cacheable(jsonify(data), f'bounty-{bounty_id}-v{bounty.version}')
+
+@app.route('/api/bounties/<int:bounty_id>/related')
+def api_related_bounties(bounty_id):
+    """Most similar bounties by title and description, precomputed."""
+    if not db.session.query(Bounty.id).filter_by(id=bounty_id).scalar():
+        abort(404)
+    limit = min(page_size(request.args.get('limit'), default=app.config['RELATED_TOP_K']),
+                app.config['RELATED_TOP_K'])
+    return jsonify({
+        'bounty_id': bounty_id,
+        'related': [
+            {'id': b.id, 'title': b.title, 'category': b.category, 'status': b.status.value,
+             'score': round(score, 4)}
+            for b, score in related.related_bounties(bounty_id, limit=limit)
+        ]
+    })
+
+EXPORT_BATCH_SIZE = 1000
+
+def ndjson_export(model, relationship):
+    """
+    Stream every row of `model` as newline-delimited JSON, oldest first.
+    
+    Rows are fetched EXPORT_BATCH_SIZE at a time (a server-side cursor on
+    Postgres), so memory use stays flat regardless of table size. The
+    optional `since` ISO timestamp limits the export to rows created at or
+    after it, for incremental pulls.
+    """
+    since = request.args.get('since')
+    query = db.select(model).options(db.selectinload(relationship))
+    if since:
+        try:
+            query = query.where(model.created_at >= datetime.fromisoformat(since))
+        except ValueError:
+            return jsonify({'error': 'since must be an ISO 8601 timestamp'}), 400
+    query = query.order_by(model.created_at, model.id) \
+                 .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    
+    def generate():
+        for row in db.session.scalars(query):
+            yield json.dumps(row.to_dict()) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/export/bounties.ndjson')
+def export_bounties():
+    """Stream all bounties as NDJSON."""
+    return ndjson_export(Bounty, Bounty.creator)
+
+@app.route('/api/export/refutations.ndjson')
+def export_refutations():
+    """Stream all refutations as NDJSON."""
+    return ndjson_export(Refutation, Refutation.author)
 
 # ============== INITIALIZATION ==============
 
@@ -644,22 +892,259 @@ The low-fat recommendation may have CAUSED the obesity epidemic by promoting hig
     users[2].points += 75   # bond returned
     
     db.session.commit()
+    ledger.record_opening_balances()
+    db.session.commit()
+    recount_counters()
+    rebuild_leaderboard()
+    # Migrations built the indexes before these rows existed
+    duplicates.rebuild()
+    related.rebuild(top_k=app.config['RELATED_TOP_K'])
     print("Sample data created successfully!")
 
+def setup_database(sample_data=True):
+    """
+    Create missing tables, apply pending migrations and, with `sample_data`,
+    fill an empty database with the sample data. Importing this module never
+    touches the database; this runs from `flask init-db`, `python app.py` and,
+    without the sample data, once per deploy rather than once per worker from
+    the gunicorn on_starting hook in gunicorn.conf.py.
+    """
+    with app.app_context():
+        applied = run_migrations()
+        if sample_data:
+            create_sample_data()
+    return applied
+
+def warm_up():
+    """
+    Configure the ORM mappers and compile every template, without touching
+    the database. A preloading gunicorn master runs this once, so forked
+    workers do not pay for it on their first requests.
+    """
+    configure_mappers()
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
 @app.cli.command('init-db')
 def init_db():
     """Initialize the database."""
-    with app.app_context():
-        db.create_all()
-        create_sample_data()
-        print("Database initialized!")
+    setup_database()
+    print("Database initialized!")
 
-# Create tables on startup (but don't create sample data automatically)
-with app.app_context():
-    db.create_all()
-    # Only create sample data if no users exist
-    if not User.query.first():
-        create_sample_data()
+@app.cli.command('migrate')
+def migrate_command():
+    """Create missing tables and apply pending schema migrations."""
+    applied = run_migrations()
+    print(f"Applied {len(applied)} migrations" if applied else "Database is up to date")
+
+@app.cli.command('check-indexes')
+@click.option('--verbose', is_flag=True, help='Print the full plan for every query.')
+def check_indexes_command(verbose):
+    """Verify the hot queries are served by their indexes."""
+    failures = 0
+    for name, uses_index, plan in check_query_plans():
+        print(f"{'OK  ' if uses_index else 'FAIL'} {name}")
+        if verbose or not uses_index:
+            print('     ' + plan.replace('\n', '\n     '))
+        failures += not uses_index
+    if failures:
+        raise SystemExit(1)
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Rebuild the full-text search indexes from bounties and refutations."""
+    search.rebuild()
+    print("Search index rebuilt!")
+
+@app.cli.command('recount')
+def recount_command():
+    """Backfill or repair the denormalized counters and site-wide totals."""
+    before = site_counters(ttl=0)
+    recount_counters()
+    after = site_counters(ttl=0)
+    for name in SITE_COUNTERS:
+        drift = f" (was {before[name]})" if before[name] != after[name] else ""
+        print(f"  {name}: {after[name]}{drift}")
+    print("Counters recomputed!")
+
+@app.cli.command('rebuild-leaderboard')
+def rebuild_leaderboard_command():
+    """Recompute all leaderboard entries from refutations."""
+    print(f"Rebuilt leaderboard with {rebuild_leaderboard()} entries")
+
+@app.cli.command('import')
+@click.argument('paths', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('--type', 'default_type', type=click.Choice(['user', 'bounty', 'refutation']), default=None,
+              help='Record type for lines without a "type" field.')
+@click.option('--chunk-size', type=int, default=5000, help='Rows per INSERT batch.')
+@click.option('--dry-run', is_flag=True, help='Validate the input without writing anything.')
+def import_command(paths, default_type, chunk_size, dry_run):
+    """Bulk import users, bounties and refutations from JSONL files."""
+    try:
+        result = import_files(list(paths), chunk_size=chunk_size, default_type=default_type, dry_run=dry_run)
+    except ImportValidationError as e:
+        for error in e.errors[:20]:
+            print(error)
+        if len(e.errors) > 20:
+            print(f"... and {len(e.errors) - 20} more")
+        print(f"Import aborted: {len(e.errors)} invalid records, nothing was written")
+        raise SystemExit(1)
+
+    counts = result['counts']
+    summary = f"{counts['user']} users, {counts['bounty']} bounties, {counts['refutation']} refutations"
+    if dry_run:
+        print(f"Validated {summary} in {result['validate_seconds']:.2f}s")
+        return
+    print(f"Imported {summary} in {result['load_seconds']:.2f}s "
+          f"({result['rows_per_second']:.0f} rows/s, validation {result['validate_seconds']:.2f}s)")
+    if counts['bounty']:
+        print("Run `flask rebuild-related-bounties` to include the new bounties in related-bounty suggestions")
+
+@app.cli.command('adjudication-worker')
+@click.option('--concurrency', type=int, default=None, help='Parallel adjudications per round.')
+@click.option('--visibility-timeout', type=int, default=None, help='Seconds before an unfinished job is retried.')
+@click.option('--poll-interval', type=float, default=2.0, help='Seconds to sleep when the queue is empty.')
+@click.option('--once', is_flag=True, help='Process one round of jobs and exit.')
+def adjudication_worker(concurrency, visibility_timeout, poll_interval, once):
+    """Run the background adjudication worker."""
+    worker = AdjudicationWorker(
+        app,
+        adjudicator,
+        concurrency=concurrency or app.config['ADJUDICATION_CONCURRENCY'],
+        visibility_timeout=visibility_timeout or app.config['ADJUDICATION_VISIBILITY_TIMEOUT'],
+        poll_interval=poll_interval
+    )
+    if once:
+        print(f"Processed {worker.run_once()} adjudication jobs")
+        return
+    
+    print(f"Adjudication worker {worker.worker_id} started (concurrency={worker.concurrency})")
+    try:
+        worker.run_forever()
+    except KeyboardInterrupt:
+        worker.stop()
+
+@app.cli.command('rescore-pending')
+@click.option('--batch-size', type=int, default=None, help='Refutations per adjudicator request.')
+@click.option('--limit', type=int, default=None, help='Maximum number of refutations to rescore.')
+def rescore_pending_command(batch_size, limit):
+    """Adjudicate the backlog of PENDING refutations in batches."""
+    scored = rescore_pending(adjudicator,
+                             batch_size=batch_size or app.config['ADJUDICATION_BATCH_SIZE'],
+                             limit=limit)
+    print(f"Rescored {scored} pending refutations")
+
+@app.cli.command('adjudication-cache')
+@click.argument('action', type=click.Choice(['stats', 'prune', 'clear']))
+def adjudication_cache_command(action):
+    """Inspect or maintain the adjudication result cache."""
+    if action == 'prune':
+        print(f"Evicted {adjudication_cache.prune()} cache entries")
+    elif action == 'clear':
+        adjudication_cache.clear()
+        print("Adjudication cache cleared")
+    rows, hits = db.session.query(db.func.count(AdjudicationCacheEntry.key),
+                                  db.func.coalesce(db.func.sum(AdjudicationCacheEntry.hit_count), 0)).one()
+    print(f"Cached results: {rows}, database hits on them: {hits} (prompt version {adjudicator.prompt_version()})")
+    if not os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        print("PROMETHEUS_MULTIPROC_DIR is not set, so the counters below cover only this command")
+    for name, value in adjudication_cache.get_stats().items():
+        print(f"  {name}: {value}")
+
+@app.cli.command('rebuild-related-bounties')
+@click.option('--top-k', type=int, default=None, help='Neighbours stored per bounty.')
+def rebuild_related_command(top_k):
+    """Rebuild the TF-IDF related-bounties index from scratch."""
+    count = related.rebuild(top_k=top_k or app.config['RELATED_TOP_K'])
+    print(f"Indexed {count} bounties")
+
+@app.cli.command('duplicates')
+@click.argument('action', type=click.Choice(['clusters', 'rebuild']))
+@click.option('--min-size', type=int, default=2, help='Smallest cluster to list.')
+@click.option('--limit', type=int, default=50, help='Maximum number of clusters to list.')
+def duplicates_command(action, min_size, limit):
+    """List near-duplicate refutation clusters or rebuild the MinHash index."""
+    if action == 'rebuild':
+        print(f"Indexed {duplicates.rebuild()} refutations")
+        return
+    found = duplicates.clusters(min_size=min_size, limit=limit)
+    for cluster in found:
+        print(f"#{cluster['original_id']} by {cluster['author']} on bounty {cluster['bounty_id']}: "
+              f"{cluster['size']} refutations (min similarity {cluster['min_similarity']})")
+        print(f"    duplicates: {', '.join(str(i) for i in cluster['duplicate_ids'])}")
+    print(f"{len(found)} clusters")
+
+@app.cli.command('expire-bounties')
+@click.option('--batch-size', type=int, default=None, help='Bounties expired per transaction.')
+@click.option('--max-batches', type=int, default=None, help='Stop after this many batches; the next run resumes.')
+@click.option('--loop', is_flag=True, help='Keep sweeping every --interval seconds.')
+@click.option('--interval', type=float, default=None, help='Seconds between sweeps with --loop.')
+def expire_bounties_command(batch_size, max_batches, loop, interval):
+    """Expire open bounties past their deadline and refund their creators."""
+    batch_size = batch_size or app.config['EXPIRY_BATCH_SIZE']
+    if loop:
+        print(f"Expiry sweeper started (every {interval or app.config['EXPIRY_SWEEP_INTERVAL']:g}s)")
+        try:
+            expiry.sweep_forever(interval=interval or app.config['EXPIRY_SWEEP_INTERVAL'], batch_size=batch_size)
+        except KeyboardInterrupt:
+            pass
+        return
+    result = expiry.sweep(batch_size=batch_size, max_batches=max_batches)
+    state = 'done' if result['finished'] else 'paused, run again to resume'
+    print(f"{'Resumed sweep: ' if result['resumed'] else ''}expired {result['expired']} bounties due by "
+          f"{result['cutoff']:%Y-%m-%d %H:%M:%S} in {result['batches']} batches ({state})")
+
+@app.cli.command('points-ledger')
+@click.argument('action', type=click.Choice(['snapshot', 'reconcile']))
+@click.option('--fix', is_flag=True, help='Reset mismatched balances to the ledger figure.')
+def points_ledger_command(action, fix):
+    """Snapshot ledger balances or reconcile user points against the ledger."""
+    if action == 'snapshot':
+        print(f"Recorded {ledger.snapshot()} balance snapshots")
+        return
+    mismatches = ledger.reconcile(fix=fix)
+    for row in mismatches:
+        print(f"{row['username']} (#{row['user_id']}): balance {row['balance']}, "
+              f"ledger {row['ledger_balance']} ({row['difference']:+d})")
+    if not mismatches:
+        print("All balances match the ledger")
+    elif fix:
+        print(f"Reset {len(mismatches)} balances to the ledger figure")
+    else:
+        raise SystemExit(1)
+
+@app.cli.command('seed')
+@click.option('--users', type=int, default=1000, help='Users to create.')
+@click.option('--bounties', type=int, default=5000, help='Bounties to create.')
+@click.option('--refutations', type=int, default=50000, help='Refutations to create.')
+@click.option('--seed', 'random_seed', type=int, default=42, help='Random seed; the same seed gives the same data.')
+@click.option('--chunk-size', type=int, default=seeder.CHUNK_SIZE, help='Rows per INSERT batch.')
+@click.option('--days', type=int, default=365, help='Days of history to spread the data over.')
+@click.option('--prefix', default='seed', help='Username prefix for the generated users.')
+def seed_command(users, bounties, refutations, random_seed, chunk_size, days, prefix):
+    """Generate synthetic users, bounties and refutations for scale testing."""
+    if User.query.filter_by(username=f'{prefix}_0').first():
+        print(f"Users named {prefix}_* already exist; pass a different --prefix")
+        raise SystemExit(1)
+    
+    started = time.perf_counter()
+    def progress(kind, done, total):
+        if done == total or done % (chunk_size * 20) == 0:
+            elapsed = time.perf_counter() - started
+            print(f"  {kind}: {done}/{total} ({elapsed:.0f}s)")
+    
+    try:
+        result = seeder.generate(users, bounties, refutations, seed=random_seed, chunk_size=chunk_size,
+                                 days=days, prefix=prefix, progress=progress)
+    except ValueError as e:
+        print(f"Cannot seed: {e}")
+        raise SystemExit(1)
+    print(f"Seeded {result['users']} users, {result['bounties']} bounties and {result['refutations']} refutations "
+          f"in {result['insert_seconds']:.1f}s ({result['rows_per_second']:.0f} rows/s, "
+          f"generation {result['generate_seconds']:.1f}s, indexing {result['index_seconds']:.1f}s)")
+    print("Run `flask rebuild-related-bounties` and `flask duplicates rebuild` to index the new rows "
+          "for related-bounty suggestions and duplicate checks")
 
 if __name__ == '__main__':
+    setup_database()
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,130 @@
+"""
+Points ledger stress test
+
+Runs many threads doing random transfers between a small set of users, then
+checks that no points were created or lost, no balance went negative, and
+every balance matches the ledger:
+
+    python benchmarks/ledger_stress.py --threads 16 --transfers 500
+    DATABASE_URL=postgresql://... python benchmarks/ledger_stress.py
+
+--naive swaps the ledger for a read-modify-write update (read the balance,
+check it, write it back) to show the lost updates the ledger prevents.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite:///ledger_stress.db')
+
+from sqlalchemy.exc import OperationalError
+
+from app import app, setup_database
+from models import db, User
+import ledger
+
+STARTING_BALANCE = 1000
+
+_stats_lock = threading.Lock()
+
+
+def count(stats, key):
+    with _stats_lock:
+        stats[key] += 1
+
+
+def create_users(count):
+    tag = int(time.time())
+    users = [User(username=f'stress_{tag}_{i}', email=f'stress_{tag}_{i}@example.com', points=0)
+             for i in range(count)]
+    db.session.add_all(users)
+    db.session.flush()
+    for user in users:
+        ledger.credit(user.id, STARTING_BALANCE, 'stress_seed')
+    db.session.commit()
+    return [user.id for user in users]
+
+
+def naive_transfer(from_id, to_id, amount):
+    sender = db.session.get(User, from_id)
+    receiver = db.session.get(User, to_id)
+    if sender.points < amount:
+        raise ledger.InsufficientPoints(from_id, amount)
+    time.sleep(0)  # let another thread read the same balance
+    sender.points = sender.points - amount
+    receiver.points = receiver.points + amount
+
+
+def worker(user_ids, transfers, naive, seed, stats):
+    rng = random.Random(seed)
+    with app.app_context():
+        for _ in range(transfers):
+            from_id, to_id = rng.sample(user_ids, 2)
+            amount = rng.randint(1, 200)
+            while True:
+                try:
+                    if naive:
+                        naive_transfer(from_id, to_id, amount)
+                    else:
+                        ledger.transfer(from_id, to_id, amount, 'stress_transfer')
+                    db.session.commit()
+                    count(stats, 'ok')
+                    break
+                except ledger.InsufficientPoints:
+                    db.session.rollback()
+                    count(stats, 'insufficient')
+                    break
+                except OperationalError as e:
+                    db.session.rollback()
+                    # SQLite allows one writer at a time; Postgres never gets here
+                    if 'locked' not in str(e):
+                        raise
+                    count(stats, 'retries')
+        db.session.remove()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--transfers', type=int, default=200, help='Transfers per thread.')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--naive', action='store_true', help='Use read-modify-write updates instead of the ledger.')
+    args = parser.parse_args()
+
+    setup_database(sample_data=False)
+    with app.app_context():
+        user_ids = create_users(args.users)
+
+    stats = {'ok': 0, 'insufficient': 0, 'retries': 0}
+    threads = [threading.Thread(target=worker, args=(user_ids, args.transfers, args.naive, args.seed + i, stats))
+               for i in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        balances = [points for (points,) in db.session.query(User.points).filter(User.id.in_(user_ids))]
+        # Naive transfers bypass the ledger, so only the totals can be compared
+        mismatches = [] if args.naive else [row for row in ledger.reconcile() if row['user_id'] in user_ids]
+
+    expected = args.users * STARTING_BALANCE
+    print(f"{stats['ok']} transfers, {stats['insufficient']} refused, {stats['retries']} lock retries "
+          f"in {elapsed:.2f}s ({stats['ok'] / elapsed:.0f}/s)")
+    print(f"Total points: {sum(balances)} (expected {expected}); lowest balance {min(balances)}; "
+          f"{len(mismatches)} ledger mismatches")
+    if sum(balances) != expected or min(balances) < 0 or mismatches:
+        print("FAIL")
+        raise SystemExit(1)
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,443 @@
+"""
+Load test for the Falsifi web app
+
+Seeds a database with seeder.py, starts fake_llm.py in place of OpenAI and the
+adjudication worker on a background thread, boots the app, then drives mixed
+traffic from `--concurrency` simulated users for `--duration` seconds:
+
+    python benchmarks/load_test.py --concurrency 16 --duration 30
+    python benchmarks/load_test.py --workers 4 --llm-latency 1.5      # under gunicorn
+    python benchmarks/load_test.py --mix browse=1,view=1,api=8         # mostly API clients
+    python benchmarks/load_test.py --compare benchmarks/results/<earlier run>.json
+
+Without --workers the app runs on a threaded werkzeug server in this process;
+with it, under gunicorn with that many worker processes, which is how the
+Dockerfile's --workers setting can be sized. The database is a fresh SQLite
+file unless DATABASE_URL is set.
+
+Each simulated user logs in once and then picks actions at random by weight:
+browse the bounty list (following cursors), view a bounty, submit a
+refutation (queued for the worker, so it reaches the fake LLM), rate a
+refutation as the bounty's creator, view the leaderboard, or page through
+/api/bounties with If-None-Match. Redirects count as successes; 5xx
+responses and connection errors as errors.
+
+Throughput and p50/p95/p99 latency per route are printed and written as JSON
+to benchmarks/results/ (or --output), tagged with the git commit, so runs
+can be compared across commits with --compare.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.cookies import SimpleCookie
+from urllib.parse import unquote, urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_llm import FakeLLM
+
+OLDER_LINK = re.compile(r'cursor=([^"&]+)" class="btn-secondary">Older')
+ROUTES = ('browse', 'view', 'refute', 'rate', 'leaderboard', 'api')
+DEFAULT_MIX = 'browse=25,view=30,refute=10,rate=5,leaderboard=10,api=20'
+WORDS = ('evidence claim study data argument model effect cause result trend sample analysis theory '
+         'assumption measure rate growth risk policy outcome survey report source review bias error '
+         'signal noise population period region market price cost benefit impact factor correlation '
+         'mechanism experiment control baseline estimate range variance consensus record history').split()
+
+
+def sentence(rng, words=12):
+    text = ' '.join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + '.'
+
+
+def paragraphs(rng, count, sentences=6):
+    return '\n\n'.join(' '.join(sentence(rng, rng.randint(8, 18)) for _ in range(sentences)) for _ in range(count))
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))]
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in ROUTES:
+            raise SystemExit(f'unknown route {name!r} in --mix; use {", ".join(ROUTES)}')
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+# ============== SEEDING ==============
+
+def seed(args, tag):
+    """
+    Generate users, bounties and refutations with seeder.py and build the
+    related-bounties index. Returns what the simulated users need to know.
+    """
+    from models import db, User, Bounty, Refutation, BountyStatus
+    import related
+    import seeder
+
+    refutations = args.bounties * args.refutations_per_bounty
+    result = seeder.generate(args.users, args.bounties, refutations, seed=args.seed, prefix=f'load_{tag}')
+    related.rebuild()
+    print(f"Seeded {args.users} users, {args.bounties} bounties, {refutations} refutations "
+          f"in {result['insert_seconds'] + result['index_seconds']:.1f}s")
+    usernames = [f'load_{tag}_{i}' for i in range(args.users)]
+
+    prefix = f'load_{tag}_%'
+    open_bounties = db.session.query(Bounty.id, User.username) \
+        .join(User, Bounty.creator_id == User.id) \
+        .filter(User.username.like(prefix), Bounty.status == BountyStatus.OPEN).all()
+    rateable = db.session.query(Refutation.id, User.username) \
+        .join(Bounty, Refutation.bounty_id == Bounty.id) \
+        .join(User, Bounty.creator_id == User.id) \
+        .filter(User.username.like(prefix)).all()
+    db.session.remove()
+    return {'usernames': usernames, 'bounties': [tuple(row) for row in open_bounties],
+            'refutations': [tuple(row) for row in rateable]}
+
+
+# ============== TRAFFIC ==============
+
+class Client:
+    """One simulated browser: a keep-alive connection and a session cookie per user."""
+
+    def __init__(self, host, port, timeout):
+        self.host, self.port, self.timeout = host, port, timeout
+        self.conn = None
+        self.cookies = {}
+        self.etags = {}
+        self.login_seconds = 0.0  # Logins happen inside actions but are not part of their latency
+
+    def request(self, method, path, form=None, username=None, headers=None):
+        headers = dict(headers or {})
+        body = None
+        if form is not None:
+            body = urlencode(form)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        if username is not None:
+            headers['Cookie'] = f'session={self.login(username)}'
+        for retry in (False, True):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.conn.request(method, path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                response.data = response.read()
+                return response
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # The server closed an idle keep-alive connection; reconnect once
+                self.conn.close()
+                self.conn = None
+                if retry:
+                    raise
+
+    def login(self, username):
+        if username not in self.cookies:
+            started = time.perf_counter()
+            response = self.request('POST', '/login', {'username': username})
+            self.login_seconds += time.perf_counter() - started
+            cookie = SimpleCookie(response.getheader('Set-Cookie') or '')
+            self.cookies[username] = cookie['session'].value if 'session' in cookie else ''
+        return self.cookies[username]
+
+
+class Traffic:
+    """Picks and performs actions; shared, read-only state plus a per-thread Client."""
+
+    def __init__(self, seeded, weights, rng_seed):
+        self.seeded = seeded
+        self.routes = list(weights)
+        self.weights = [weights[route] for route in self.routes]
+        self.rng_seed = rng_seed
+
+    def run(self, client, rng, route):
+        if route == 'browse':
+            # Most visitors stop at the first page; some click "Older" a few times
+            query = {'status': rng.choice(['all', 'open'])}
+            response = client.request('GET', f'/bounties?{urlencode(query)}')
+            while rng.random() < 0.3:
+                match = OLDER_LINK.search(response.data.decode('utf-8', 'replace'))
+                if not match:
+                    break
+                response = client.request('GET', f"/bounties?{urlencode({**query, 'cursor': unquote(match.group(1))})}")
+            return response
+        if route == 'view':
+            # A few bounties get most of the views
+            bounty_id, _ = self.seeded['bounties'][int(rng.paretovariate(1.2)) % len(self.seeded['bounties'])]
+            return client.request('GET', f'/bounties/{bounty_id}', username=rng.choice(self.seeded['usernames']))
+        if route == 'refute':
+            bounty_id, creator = rng.choice(self.seeded['bounties'])
+            author = rng.choice(self.seeded['usernames'])
+            if author == creator:
+                author = self.seeded['usernames'][(self.seeded['usernames'].index(author) + 1) % len(self.seeded['usernames'])]
+            return client.request('POST', f'/bounties/{bounty_id}/refute', {
+                'content': paragraphs(rng, rng.randint(1, 3)),
+                'sources': f'https://example.com/{rng.randint(1, 10 ** 6)}',
+                'bond_amount': 10
+            }, username=author)
+        if route == 'rate':
+            refutation_id, creator = rng.choice(self.seeded['refutations'])
+            return client.request('POST', f'/refutations/{refutation_id}/rate',
+                                  {'rating': rng.randint(1, 10), 'feedback': sentence(rng)}, username=creator)
+        if route == 'leaderboard':
+            return client.request('GET', '/leaderboard')
+        if route == 'api':
+            path = f"/api/bounties?status={rng.choice(['all', 'open'])}"
+            headers = {'If-None-Match': client.etags[path]} if path in client.etags else None
+            response = client.request('GET', path, headers=headers)
+            if response.getheader('ETag'):
+                client.etags[path] = response.getheader('ETag')
+            return response
+        raise ValueError(route)
+
+    def worker(self, index, host, port, timeout, warmup_until, deadline, samples, errors):
+        rng = random.Random(f'{self.rng_seed}:{index}')
+        client = Client(host, port, timeout)
+        while time.perf_counter() < deadline:
+            route = rng.choices(self.routes, self.weights)[0]
+            begin = time.perf_counter()
+            login_seconds = client.login_seconds
+            try:
+                response = self.run(client, rng, route)
+                ok = response.status < 500
+            except Exception as e:
+                ok = False
+                client.conn = None
+                if errors[route] == 0:
+                    print(f'{route}: {e!r}')
+            elapsed = time.perf_counter() - begin - (client.login_seconds - login_seconds)
+            if begin >= warmup_until:
+                samples[route].append(elapsed)
+                if not ok:
+                    errors[route] += 1
+
+
+def drive(seeded, args, host, port):
+    """Run the simulated users; returns per-route latencies and error counts, and the measured seconds."""
+    traffic = Traffic(seeded, parse_mix(args.mix), args.seed)
+    warmup_until = time.perf_counter() + args.warmup
+    deadline = warmup_until + args.duration
+    per_thread = []
+    threads = []
+    for i in range(args.concurrency):
+        samples = {route: [] for route in ROUTES}
+        errors = {route: 0 for route in ROUTES}
+        per_thread.append((samples, errors))
+        thread = threading.Thread(target=traffic.worker, name=f'user-{i}',
+                                  args=(i, host, port, args.timeout, warmup_until, deadline, samples, errors))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+
+    samples = {route: sorted(s for thread_samples, _ in per_thread for s in thread_samples[route]) for route in ROUTES}
+    errors = {route: sum(thread_errors[route] for _, thread_errors in per_thread) for route in ROUTES}
+    return samples, errors, args.duration
+
+
+def summarize(samples, errors, seconds):
+    routes = {}
+    for route in ROUTES:
+        ordered = samples[route]
+        if not ordered:
+            continue
+        routes[route] = {
+            'requests': len(ordered),
+            'errors': errors[route],
+            'throughput_rps': round(len(ordered) / seconds, 2),
+            'mean_ms': round(1000 * sum(ordered) / len(ordered), 2),
+            'p50_ms': round(1000 * percentile(ordered, 0.50), 2),
+            'p95_ms': round(1000 * percentile(ordered, 0.95), 2),
+            'p99_ms': round(1000 * percentile(ordered, 0.99), 2),
+            'max_ms': round(1000 * ordered[-1], 2),
+        }
+    everything = sorted(s for route in ROUTES for s in samples[route])
+    total = {
+        'requests': len(everything),
+        'errors': sum(errors.values()),
+        'throughput_rps': round(len(everything) / seconds, 2),
+        'p50_ms': round(1000 * percentile(everything, 0.50), 2) if everything else None,
+        'p95_ms': round(1000 * percentile(everything, 0.95), 2) if everything else None,
+        'p99_ms': round(1000 * percentile(everything, 0.99), 2) if everything else None,
+    }
+    return routes, total
+
+
+def print_table(routes, total, baseline=None):
+    print(f"{'route':<12}{'requests':>10}{'errors':>8}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    rows = list(routes.items()) + [('total', total)]
+    for route, stats in rows:
+        print(f"{route:<12}{stats['requests']:>10}{stats['errors']:>8}{stats['throughput_rps']:>9.1f}"
+              f"{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}")
+        if baseline is not None:
+            before = baseline['total'] if route == 'total' else baseline['routes'].get(route)
+            if before:
+                print(f"{'  vs base':<12}{'':>10}{'':>8}" + ''.join(
+                    f"{change(before[key], stats[key]):>{width}}"
+                    for key, width in (('throughput_rps', 9), ('p50_ms', 10), ('p95_ms', 10), ('p99_ms', 10))))
+
+
+def change(before, after):
+    if not before:
+        return '-'
+    return f'{100 * (after - before) / before:+.0f}%'
+
+
+# ============== SERVERS ==============
+
+def start_werkzeug(app):
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, name='werkzeug', daemon=True).start()
+    return server, server.server_port
+
+
+def start_gunicorn(workers, env):
+    import socket
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}',
+                                '--workers', str(workers), '--threads', '1', '--log-level', 'warning', 'app:app'],
+                               cwd=ROOT, env=env)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit('gunicorn exited during startup')
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/leaderboard')
+            conn.getresponse().read()
+            conn.close()
+            return process, port
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise SystemExit('gunicorn did not start within 60s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mixed-traffic load test against a seeded database and a fake LLM.')
+    parser.add_argument('--concurrency', type=int, default=8, help='Simulated users sending requests at once.')
+    parser.add_argument('--duration', type=float, default=20.0, help='Seconds of measured traffic.')
+    parser.add_argument('--warmup', type=float, default=3.0, help='Seconds of unmeasured traffic first.')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Route weights (default {DEFAULT_MIX}).')
+    parser.add_argument('--workers', type=int, default=0, help='Run under gunicorn with this many workers.')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--bounties', type=int, default=500)
+    parser.add_argument('--refutations-per-bounty', type=int, default=3, help='Average seeded refutations per bounty.')
+    parser.add_argument('--llm-latency', type=float, default=0.5, help='Seconds the fake LLM takes per call.')
+    parser.add_argument('--llm-error-rate', type=float, default=0.0, help='Fraction of fake LLM calls that fail.')
+    parser.add_argument('--timeout', type=float, default=30.0, help='Seconds before a request counts as failed.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Results file (default benchmarks/results/load_test-<commit>-<time>.json).')
+    parser.add_argument('--compare', help='Earlier results file to show changes against.')
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    fake = FakeLLM(latency=args.llm_latency, error_rate=args.llm_error_rate, seed=args.seed).start()
+    database_url = os.getenv('DATABASE_URL') or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='falsifi-load-'), 'load_test.db')}"
+    # The app reads these at import time
+    os.environ.update({'DATABASE_URL': database_url, 'OPENAI_API_KEY': 'fake', 'OPENAI_BASE_URL': fake.base_url,
+                       'METRICS_ENABLED': os.getenv('METRICS_ENABLED', '0')})
+
+    from app import app, adjudicator, setup_database
+    from adjudication_queue import AdjudicationWorker
+    from models import db, AdjudicationJob, JobStatus
+
+    setup_database(sample_data=False)
+    tag = int(time.time())
+    with app.app_context():
+        seeded = seed(args, tag)
+
+    worker = AdjudicationWorker(app, adjudicator, concurrency=app.config['ADJUDICATION_CONCURRENCY'], poll_interval=0.5)
+    threading.Thread(target=worker.run_forever, name='adjudication-worker', daemon=True).start()
+
+    process = server = None
+    if args.workers:
+        process, port = start_gunicorn(args.workers, dict(os.environ))
+        server_desc = f'gunicorn --workers {args.workers}'
+    else:
+        server, port = start_werkzeug(app)
+        server_desc = 'werkzeug (threaded, in process)'
+
+    print(f'Driving {args.concurrency} users for {args.warmup:.0f}s warmup + {args.duration:.0f}s against {server_desc}')
+    try:
+        samples, errors, seconds = drive(seeded, args, '127.0.0.1', port)
+    finally:
+        worker.stop()
+        if process is not None:
+            process.terminate()
+            process.wait()
+        if server is not None:
+            server.shutdown()
+        fake.stop()
+
+    with app.app_context():
+        jobs = dict(db.session.query(AdjudicationJob.status, db.func.count(AdjudicationJob.id))
+                    .group_by(AdjudicationJob.status).all())
+    routes, total = summarize(samples, errors, seconds)
+    print_table(routes, total, baseline)
+    print(f"Fake LLM: {fake.requests} calls, {fake.errors} injected errors; adjudication jobs done "
+          f"{jobs.get(JobStatus.DONE, 0)}, still queued {jobs.get(JobStatus.QUEUED, 0)}")
+
+    commit = git_commit()
+    results = {
+        'commit': commit,
+        'timestamp': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'server': server_desc,
+        'database': database_url.split('://', 1)[0],
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'total': total,
+        'routes': routes,
+        'adjudication': {
+            'llm_calls': fake.requests,
+            'llm_errors': fake.errors,
+            'jobs': {status.value: count for status, count in jobs.items()},
+        },
+    }
+    output = args.output or os.path.join(
+        ROOT, 'benchmarks', 'results', f"load_test-{commit}-{datetime.utcnow():%Y%m%dT%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f'Results written to {output}')
+    if total['errors']:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+"""
+Startup benchmark for the Falsifi web app
+
+Measures what every process pays before it serves traffic, each run in a
+fresh interpreter:
+
+    python benchmarks/startup.py --runs 10
+    python benchmarks/startup.py --workers 4                         # also time gunicorn boot
+    python benchmarks/startup.py --compare benchmarks/results/<earlier run>.json
+
+- import: `import app`, i.e. the cost of booting one worker without --preload
+- first requests: the first GET of each --paths entry (templates compiled,
+  first database connection, caches cold), then the first path again warm;
+  and the first GET after app.warm_up(), as a preloaded worker serves it
+- gunicorn: with --workers, seconds from launching gunicorn to its first
+  response, with and without preloading the app in the master
+
+The database is a fresh SQLite file with the sample data, set up once before
+the runs (unless DATABASE_URL is set). The slowest modules by cumulative
+import time and any heavy dependency imported at startup are listed too.
+Results are written as JSON to benchmarks/results/ (or --output), tagged
+with the git commit, so runs can be compared across commits with --compare.
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_PATHS = '/,/bounties,/api/bounties,/leaderboard'
+# Only the code paths that need them should pay for these
+HEAVY_MODULES = ('openai', 'httpx', 'scipy', 'tiktoken')
+
+CHILD = '''
+import json, sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+import app
+timings = {{'import_ms': 1000 * (time.perf_counter() - started), 'requests': {{}}}}
+paths = {paths!r}
+if {warm!r}:
+    # What a preloading gunicorn master does before forking (see gunicorn.conf.py)
+    started = time.perf_counter()
+    app.warm_up()
+    timings['warm_up_ms'] = 1000 * (time.perf_counter() - started)
+    paths = paths[:1]
+client = app.app.test_client()
+for path in paths + paths[:1]:
+    started = time.perf_counter()
+    status = client.get(path).status_code
+    key = path if path not in timings['requests'] else path + ' (warm)'
+    timings['requests'][key] = 1000 * (time.perf_counter() - started)
+    if status >= 500:
+        raise SystemExit(f'GET {{path}} returned {{status}}')
+timings['heavy_modules'] = [name for name in {heavy!r} if name in sys.modules]
+timings['modules'] = len(sys.modules)
+print(json.dumps(timings))
+'''
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run_child(env, paths, warm=False):
+    code = CHILD.format(root=ROOT, paths=paths, heavy=HEAVY_MODULES, warm=warm)
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env, capture_output=True, text=True)
+    if result.returncode:
+        raise SystemExit(f'startup run failed:\n{result.stderr}')
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(env, count):
+    """Top-level modules imported by app.py, by cumulative import time (from -X importtime)."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import sys; sys.path.insert(0, {ROOT!r}); import app'],
+                            cwd=ROOT, env=env, capture_output=True, text=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        # Direct imports of app.py are indented by exactly three spaces
+        if name.startswith('   ') and not name.startswith('    ') and cumulative.strip().isdigit():
+            modules.append((name.strip(), int(cumulative) / 1000))
+    return sorted(modules, key=lambda item: -item[1])[:count]
+
+
+def gunicorn_boot(workers, preload, env):
+    """Seconds from launching gunicorn to its first successful response."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    env = dict(env, GUNICORN_PRELOAD='1' if preload else '0')
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}',
+                                '--workers', str(workers), '--log-level', 'warning', 'app:app'], cwd=ROOT, env=env)
+    try:
+        while time.perf_counter() - started < 60:
+            if process.poll() is not None:
+                raise SystemExit('gunicorn exited during startup')
+            try:
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+                conn.request('GET', '/')
+                status = conn.getresponse().status
+                conn.close()
+                if status < 500:
+                    return time.perf_counter() - started
+            except OSError:
+                pass
+            time.sleep(0.02)
+        raise SystemExit('gunicorn did not start within 60s')
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def summarize(values):
+    ordered = sorted(values)
+    return {'median_ms': round(statistics.median(ordered), 1), 'min_ms': round(ordered[0], 1),
+            'max_ms': round(ordered[-1], 1)}
+
+
+def change(before, after):
+    if not before:
+        return '-'
+    return f'{100 * (after - before) / before:+.0f}%'
+
+
+def print_table(metrics, baseline=None):
+    print(f"{'':<28}{'median ms':>11}{'min ms':>10}{'max ms':>10}")
+    for name, stats in metrics.items():
+        line = f"{name:<28}{stats['median_ms']:>11.1f}{stats['min_ms']:>10.1f}{stats['max_ms']:>10.1f}"
+        before = (baseline or {}).get('metrics', {}).get(name)
+        if before:
+            line += f"   {change(before['median_ms'], stats['median_ms'])} vs base"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold import and first-request latency of the app.')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters to time.')
+    parser.add_argument('--paths', default=DEFAULT_PATHS, help=f'Comma-separated paths to request (default {DEFAULT_PATHS}).')
+    parser.add_argument('--workers', type=int, default=0, help='Also time gunicorn boot with this many workers.')
+    parser.add_argument('--top', type=int, default=10, help='Slowest imports to list.')
+    parser.add_argument('--output', help='Results file (default benchmarks/results/startup-<commit>-<time>.json).')
+    parser.add_argument('--compare', help='Earlier results file to show changes against.')
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    database_url = os.getenv('DATABASE_URL') or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='falsifi-startup-'), 'startup.db')}"
+    # With a key set the adjudicator is fully configured; its OpenAI client must still not be built at startup
+    env = dict(os.environ, DATABASE_URL=database_url, OPENAI_API_KEY=os.getenv('OPENAI_API_KEY', 'startup-benchmark'),
+               OPENAI_BASE_URL=os.getenv('OPENAI_BASE_URL', 'http://127.0.0.1:9/v1'), METRICS_ENABLED=os.getenv('METRICS_ENABLED', '1'))
+    setup = subprocess.run([sys.executable, '-c', f'import sys; sys.path.insert(0, {ROOT!r}); import app; app.setup_database()'],
+                           cwd=ROOT, env=env, capture_output=True, text=True)
+    if setup.returncode:
+        raise SystemExit(f'database setup failed:\n{setup.stderr}')
+
+    paths = [path.strip() for path in args.paths.split(',') if path.strip()]
+    runs = [run_child(env, paths) for _ in range(args.runs)]
+    metrics = {'import': summarize([run['import_ms'] for run in runs])}
+    for key in runs[0]['requests']:
+        metrics[f'first GET {key}'] = summarize([run['requests'][key] for run in runs])
+    metrics['import + first request'] = summarize([run['import_ms'] + run['requests'][paths[0]] for run in runs])
+    warm_runs = [run_child(env, paths, warm=True) for _ in range(args.runs)]
+    metrics['warm_up (preload)'] = summarize([run['warm_up_ms'] for run in warm_runs])
+    metrics[f'first GET {paths[0]} after warm_up'] = summarize([run['requests'][paths[0]] for run in warm_runs])
+    if args.workers:
+        for preload in (True, False):
+            boots = [1000 * gunicorn_boot(args.workers, preload, env) for _ in range(args.runs)]
+            metrics[f"gunicorn boot{' --preload' if preload else ''}"] = summarize(boots)
+
+    print(f"{args.runs} runs, {runs[0]['modules']} modules loaded by `import app`")
+    print_table(metrics, baseline)
+    heavy = runs[0]['heavy_modules']
+    print(f"Heavy modules imported at startup: {', '.join(heavy) if heavy else 'none'}")
+    imports = slowest_imports(env, args.top)
+    print('Slowest imports: ' + ', '.join(f'{name} {ms:.0f}ms' for name, ms in imports))
+
+    commit = git_commit()
+    results = {
+        'commit': commit,
+        'timestamp': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'python': sys.version.split()[0],
+        'database': database_url.split('://', 1)[0],
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'metrics': metrics,
+        'modules': runs[0]['modules'],
+        'heavy_modules': heavy,
+        'slowest_imports': [{'module': name, 'cumulative_ms': round(ms, 1)} for name, ms in imports],
+    }
+    output = args.output or os.path.join(
+        ROOT, 'benchmarks', 'results', f"startup-{commit}-{datetime.utcnow():%Y%m%dT%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f'Results written to {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+"""
+Circuit breaker and retry policy for AI adjudicator calls
+
+call_with_policy() wraps one model request (acall_with_policy() one
+awaited by the judge ensemble):
+
+- the request gets a latency budget; every attempt is given only the time
+  that is left of it as its timeout, and backoff sleeps count against it
+- timeouts, connection errors, 429s and 5xx responses are retried with
+  exponential backoff and full jitter (honouring Retry-After when the budget
+  allows), each retry only if the breaker still lets calls through; other
+  errors are raised at once and count neither for nor against the provider
+- every failed attempt is reported to a CircuitBreaker shared by all
+  threads of the process. After `failure_threshold` failures within `window`
+  seconds it opens and calls fail fast with CircuitOpen for `cooldown`
+  seconds, so callers go straight to the heuristic fallback or defer the job
+  instead of each waiting out the provider. One probe call is then let
+  through (half-open); its outcome closes or re-opens the breaker.
+
+State transitions are counted in falsifi_adjudicator_breaker_transitions and
+logged as JSON lines on the `falsifi.adjudicator` logger.
+"""
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional, Tuple, TypeVar
+
+from metrics import ADJUDICATOR_BREAKER_TRANSITIONS, ADJUDICATOR_RETRIES
+
+breaker_logger = logging.getLogger('falsifi.adjudicator')
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+def retriable_errors() -> Tuple[type, ...]:
+    """Exception types worth retrying. openai is imported on the first model call, not at startup."""
+    import openai
+    return (
+        openai.APIConnectionError,  # Includes APITimeoutError
+        openai.RateLimitError,
+        openai.InternalServerError,
+        asyncio.TimeoutError,
+    )
+
+# An attempt with less time than this left in the budget is not worth starting
+MIN_ATTEMPT_SECONDS = 0.25
+
+T = TypeVar('T')
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling the model while the breaker is open."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f'AI adjudicator circuit open, retry in {retry_after:.0f}s')
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Thread-safe closed / open / half-open breaker over a sliding failure window."""
+
+    def __init__(self, failure_threshold: int = 5, window: float = 60.0, cooldown: float = 30.0,
+                 name: str = 'openai', clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = max(1, failure_threshold)
+        self.window = window
+        self.cooldown = cooldown
+        self.name = name
+        self.clock = clock
+        self.transitions = deque(maxlen=100)  # (unix time, from state, to state)
+        self._state = CLOSED
+        self._failures = deque()
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._check_cooldown()
+            return self._state
+
+    def is_open(self) -> bool:
+        """True while calls are being refused (a half-open breaker with its probe out counts as open)."""
+        with self._lock:
+            self._check_cooldown()
+            return self._state == OPEN or (self._state == HALF_OPEN and self._probe_in_flight)
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker lets a probe through."""
+        with self._lock:
+            if self._state != OPEN:
+                return 0.0
+            return max(0.0, self._opened_at + self.cooldown - self.clock())
+
+    def allow(self) -> bool:
+        """May a call go ahead? In half-open state only one probe at a time is allowed."""
+        with self._lock:
+            self._check_cooldown()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._probe_in_flight = False
+            self._failures.clear()
+            if self._state != CLOSED:
+                self._transition(CLOSED)
+
+    def release(self) -> None:
+        """End a call without an outcome (e.g. a 400 or a cancelled call), freeing the half-open probe."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            now = self.clock()
+            self._probe_in_flight = False
+            if self._state == HALF_OPEN:
+                self._open(now)
+                return
+            self._failures.append(now)
+            while self._failures and self._failures[0] <= now - self.window:
+                self._failures.popleft()
+            if self._state == CLOSED and len(self._failures) >= self.failure_threshold:
+                self._open(now)
+
+    def _open(self, now: float) -> None:
+        self._opened_at = now
+        self._failures.clear()
+        self._transition(OPEN)
+
+    def _check_cooldown(self) -> None:
+        if self._state == OPEN and self.clock() >= self._opened_at + self.cooldown:
+            self._transition(HALF_OPEN)
+
+    def _transition(self, state: str) -> None:
+        previous, self._state = self._state, state
+        self.transitions.append((time.time(), previous, state))
+        ADJUDICATOR_BREAKER_TRANSITIONS.labels(from_state=previous, to_state=state).inc()
+        breaker_logger.warning(json.dumps({
+            'event': 'circuit_breaker',
+            'breaker': self.name,
+            'from': previous,
+            'to': state,
+            'cooldown_seconds': self.cooldown if state == OPEN else None
+        }))
+
+
+class RetryPolicy:
+    """Attempt limit, latency budget and full-jitter exponential backoff."""
+
+    def __init__(self, max_attempts: int = 3, budget: float = 30.0, base_delay: float = 0.5,
+                 max_delay: float = 8.0, rng: Optional[random.Random] = None):
+        self.max_attempts = max(1, max_attempts)
+        self.budget = budget
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rng = rng or random.Random()
+
+    def backoff(self, retry: int, error: Optional[Exception] = None) -> float:
+        """Delay before retry number `retry` (0-based); at least the server's Retry-After."""
+        delay = self.rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+        response = getattr(error, 'response', None)
+        retry_after = response.headers.get('retry-after') if response is not None else None
+        try:
+            return max(delay, float(retry_after)) if retry_after else delay
+        except ValueError:
+            return delay
+
+
+def _retry_delay(error: Exception, retry: int, breaker: CircuitBreaker, policy: RetryPolicy,
+                 deadline: float) -> Optional[float]:
+    """Record a failed attempt; the backoff before the next one, or None to give up."""
+    breaker.record_failure()
+    delay = policy.backoff(retry, error)
+    if (retry + 1 >= policy.max_attempts or time.monotonic() + delay + MIN_ATTEMPT_SECONDS > deadline
+            or not breaker.allow()):
+        return None
+    ADJUDICATOR_RETRIES.labels(reason=type(error).__name__).inc()
+    return delay
+
+
+def call_with_policy(attempt: Callable[[float], T], breaker: CircuitBreaker, policy: RetryPolicy) -> T:
+    """
+    Run `attempt(timeout)` under the retry policy and breaker. Raises
+    CircuitOpen without calling if the breaker is open, otherwise the last
+    error once retries or the latency budget run out.
+    """
+    if not breaker.allow():
+        raise CircuitOpen(breaker.retry_after())
+
+    deadline = time.monotonic() + policy.budget
+    retry = 0
+    while True:
+        try:
+            result = attempt(max(deadline - time.monotonic(), MIN_ATTEMPT_SECONDS))
+        except retriable_errors() as e:
+            delay = _retry_delay(e, retry, breaker, policy, deadline)
+            if delay is None:
+                raise
+            retry += 1
+            time.sleep(delay)
+            continue
+        except Exception:
+            # The provider answered (e.g. a 400); that says nothing about its health either way
+            breaker.release()
+            raise
+        breaker.record_success()
+        return result
+
+
+async def acall_with_policy(attempt: Callable[[float], Awaitable[T]], breaker: CircuitBreaker,
+                            policy: RetryPolicy, budget: Optional[float] = None) -> T:
+    """
+    call_with_policy() for a coroutine function, backing off without blocking
+    the event loop. `budget` caps the policy's latency budget.
+    """
+    if not breaker.allow():
+        raise CircuitOpen(breaker.retry_after())
+
+    deadline = time.monotonic() + min(policy.budget, budget if budget is not None else policy.budget)
+    retry = 0
+    while True:
+        try:
+            result = await attempt(max(deadline - time.monotonic(), MIN_ATTEMPT_SECONDS))
+        except retriable_errors() as e:
+            delay = _retry_delay(e, retry, breaker, policy, deadline)
+            if delay is None:
+                raise
+            retry += 1
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+            continue
+        except BaseException:
+            # Non-retriable errors and cancelled calls (CancelledError is not an Exception) are neutral
+            breaker.release()
+            raise
+        breaker.record_success()
+        return result
@@ -0,0 +1,143 @@
+"""
+Denormalized counters for Falsifi
+
+Bounty.refutation_count, User.bounty_count and User.refutation_count are
+bumped with SQL-side increments in the transaction that creates the row
+they count, and can be recomputed from scratch with `flask recount`.
+
+Site-wide totals shown on the home page live in the site_counters table,
+maintained the same way, and are read through a short-TTL in-process cache
+so the home page never counts rows. Every counter is striped over
+SITE_COUNTER_SHARDS rows and each session bumps one stripe, so concurrent
+writes on Postgres do not all queue behind a single row lock; reads sum the
+stripes.
+
+Bounty.version is bumped on every change to a bounty or its refutations;
+the JSON API derives its ETags from the versions of the bounties it returns.
+"""
+import random
+import threading
+import time
+from typing import Dict
+
+from models import db, User, Bounty, Refutation, SiteCounter, BountyStatus
+
+SITE_COUNTERS = ('total_bounties', 'open_bounties', 'total_refutations', 'total_users')
+SITE_COUNTER_SHARDS = 16
+
+_site_cache = {'values': None, 'fetched_at': 0.0}
+_site_cache_lock = threading.Lock()
+
+
+def _session_shard() -> int:
+    """The stripe this session writes to; one per session, so a transaction locks one row per counter."""
+    info = db.session.info
+    if 'site_counter_shard' not in info:
+        info['site_counter_shard'] = random.randrange(SITE_COUNTER_SHARDS)
+    return info['site_counter_shard']
+
+
+def bump_site_counters(**deltas: int) -> None:
+    """Add to site counters in the current transaction, e.g. bump_site_counters(total_users=1)."""
+    shard = _session_shard()
+    # Sorted so transactions sharing a stripe lock its rows in the same order
+    for name in sorted(deltas):
+        if deltas[name]:
+            SiteCounter.query.filter_by(name=name, shard=shard) \
+                .update({SiteCounter.value: SiteCounter.value + deltas[name]})
+
+
+def site_counter(name: str) -> int:
+    """Read one site counter directly, bypassing the cache."""
+    return db.session.query(db.func.sum(SiteCounter.value)).filter_by(name=name).scalar() or 0
+
+
+def bump_bounty_version(bounty_id):
+    """Mark a bounty as changed in the current transaction."""
+    Bounty.query.filter_by(id=bounty_id) \
+        .update({Bounty.version: Bounty.version + 1})
+
+
+def count_new_user():
+    """Bump the user total in the current transaction."""
+    bump_site_counters(total_users=1)
+
+
+def count_new_bounty(user_id):
+    """Bump the creator's bounty counter in the current transaction."""
+    User.query.filter_by(id=user_id) \
+        .update({User.bounty_count: User.bounty_count + 1})
+    bump_site_counters(total_bounties=1, open_bounties=1)
+
+
+def count_bounty_closed(bounty_id):
+    """Record an open bounty leaving the OPEN status in the current transaction."""
+    bump_bounty_version(bounty_id)
+    bump_site_counters(open_bounties=-1)
+
+
+def count_new_refutation(bounty_id, author_id):
+    """Bump the bounty and author refutation counters in the current transaction."""
+    Bounty.query.filter_by(id=bounty_id) \
+        .update({Bounty.refutation_count: Bounty.refutation_count + 1,
+                 Bounty.version: Bounty.version + 1})
+    User.query.filter_by(id=author_id) \
+        .update({User.refutation_count: User.refutation_count + 1})
+    bump_site_counters(total_refutations=1)
+
+
+def site_counters(ttl: float = 5.0) -> Dict[str, int]:
+    """Site-wide totals, served from memory for up to `ttl` seconds."""
+    now = time.monotonic()
+    with _site_cache_lock:
+        if _site_cache['values'] is not None and now - _site_cache['fetched_at'] < ttl:
+            return dict(_site_cache['values'])
+
+    values = {name: 0 for name in SITE_COUNTERS}
+    values.update({name: value or 0 for name, value in
+                   db.session.query(SiteCounter.name, db.func.sum(SiteCounter.value))
+                   .group_by(SiteCounter.name)})
+    with _site_cache_lock:
+        _site_cache['values'] = values
+        _site_cache['fetched_at'] = now
+    return dict(values)
+
+
+def invalidate_site_counters() -> None:
+    """Drop this process's cached totals so the next read hits the table."""
+    with _site_cache_lock:
+        _site_cache['values'] = None
+
+
+def recount_site_counters() -> Dict[str, int]:
+    """Recompute the site-wide totals from the base tables (does not commit)."""
+    values = {
+        'total_bounties': db.session.query(db.func.count(Bounty.id)).scalar(),
+        'open_bounties': db.session.query(db.func.count(Bounty.id))
+            .filter(Bounty.status == BountyStatus.OPEN).scalar(),
+        'total_refutations': db.session.query(db.func.count(Refutation.id)).scalar(),
+        'total_users': db.session.query(db.func.count(User.id)).scalar(),
+    }
+    db.session.execute(db.delete(SiteCounter))
+    db.session.execute(db.insert(SiteCounter), [
+        {'name': name, 'shard': shard, 'value': value if shard == 0 else 0}
+        for name, value in values.items() for shard in range(SITE_COUNTER_SHARDS)
+    ])
+    invalidate_site_counters()
+    return values
+
+
+def recount_counters():
+    """Recompute all denormalized counters from the child tables."""
+    db.session.execute(db.update(Bounty).values(
+        refutation_count=db.select(db.func.count(Refutation.id))
+            .where(Refutation.bounty_id == Bounty.id).scalar_subquery()
+    ))
+    db.session.execute(db.update(User).values(
+        bounty_count=db.select(db.func.count(Bounty.id))
+            .where(Bounty.creator_id == User.id).scalar_subquery(),
+        refutation_count=db.select(db.func.count(Refutation.id))
+            .where(Refutation.author_id == User.id).scalar_subquery()
+    ))
+    recount_site_counters()
+    db.session.commit()
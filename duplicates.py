@@ -0,0 +1,213 @@
+"""
+Near-duplicate refutation detection for Falsifi
+
+Each refutation's content is reduced to word 3-gram shingles and a MinHash
+signature of NUM_PERM values, whose agreement rate estimates the Jaccard
+similarity of two shingle sets. Signatures are split into BANDS bands of
+ROWS values; each band is hashed into a bucket stored in lsh_buckets, so
+candidates for a new refutation are found with an indexed lookup of its
+BANDS buckets rather than a scan. Candidates are then confirmed against
+the similarity threshold using their stored signatures.
+
+With 16 bands of 8 rows, pairs above ~0.8 similarity share a bucket with
+probability > 0.99 and pairs below ~0.5 almost never do.
+"""
+import hashlib
+import re
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from models import db, Refutation, RefutationSignature, LshBucket, DuplicateMatch, AdjudicationStatus
+
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+MAX_CANDIDATES = 50
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+# Fixed seed: signatures are persisted, so the permutations must never change
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, (1 << 61) - 1, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, (1 << 61) - 1, size=NUM_PERM, dtype=np.uint64)
+
+
+def shingles(content: str) -> set:
+    """Lower-cased word 3-grams; shorter texts give a single shingle of all their words."""
+    words = re.findall(r'\w+', (content or '').lower())
+    if len(words) < SHINGLE_SIZE:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def signature(content: str) -> Optional[np.ndarray]:
+    """MinHash signature (NUM_PERM uint32 values), or None for text without words."""
+    items = shingles(content)
+    if not items:
+        return None
+    hashes = np.fromiter((zlib.crc32(item.encode('utf-8')) for item in items),
+                         dtype=np.uint64, count=len(items))
+    # Multiplication wraps modulo 2**64; that is fine for a fixed hash family
+    with np.errstate(over='ignore'):
+        permuted = (hashes[:, None] * _PERM_A + _PERM_B) % _MERSENNE_PRIME & _MAX_HASH
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of the texts behind two signatures."""
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+def band_buckets(sig: np.ndarray) -> List[Tuple[int, int]]:
+    """(band, bucket) pairs for a signature; buckets are signed 64-bit hashes."""
+    return [
+        (band, int.from_bytes(
+            hashlib.blake2b(sig[band * ROWS:(band + 1) * ROWS].tobytes(), digest_size=8).digest(),
+            'little', signed=True))
+        for band in range(BANDS)
+    ]
+
+
+def _load_signature(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype='<u4')
+
+
+def find_duplicate(sig: np.ndarray, threshold: float) -> Optional[Tuple[int, float]]:
+    """Most similar indexed refutation at or above `threshold`, as (id, similarity)."""
+    conditions = [db.and_(LshBucket.band == band, LshBucket.bucket == bucket)
+                  for band, bucket in band_buckets(sig)]
+    candidates = [refutation_id for (refutation_id,) in
+                  db.session.query(LshBucket.refutation_id).filter(db.or_(*conditions))
+                  .distinct().order_by(LshBucket.refutation_id).limit(MAX_CANDIDATES)]
+    if not candidates:
+        return None
+
+    best = None
+    for refutation_id, data in db.session.query(RefutationSignature.refutation_id,
+                                                RefutationSignature.signature) \
+            .filter(RefutationSignature.refutation_id.in_(candidates)):
+        score = similarity(sig, _load_signature(data))
+        if score >= threshold and (best is None or (score, -refutation_id) > (best[1], -best[0])):
+            best = (refutation_id, score)
+    return best
+
+
+def index_many(rows: Iterable[Tuple[int, str]]) -> int:
+    """Add (refutation id, content) pairs to the index. Caller commits. Returns rows indexed."""
+    signatures, buckets = [], []
+    for refutation_id, content in rows:
+        sig = signature(content)
+        if sig is None:
+            continue
+        signatures.append({'refutation_id': refutation_id, 'signature': sig.astype('<u4').tobytes()})
+        buckets.extend({'band': band, 'bucket': bucket, 'refutation_id': refutation_id}
+                       for band, bucket in band_buckets(sig))
+    if signatures:
+        db.session.execute(db.insert(RefutationSignature), signatures)
+        db.session.execute(db.insert(LshBucket), buckets)
+    return len(signatures)
+
+
+def check_and_index(refutation: Refutation, threshold: float = 0.8) -> Optional[DuplicateMatch]:
+    """
+    Look up near-duplicates of a new (flushed) refutation, then index it.
+    A match is recorded against the earliest refutation of its cluster and
+    returned. Caller commits.
+    """
+    sig = signature(refutation.content)
+    if sig is None:
+        return None
+
+    found = find_duplicate(sig, threshold)
+    index_many([(refutation.id, refutation.content)])
+    if found is None:
+        return None
+
+    match_id, score = found
+    root_id = db.session.query(DuplicateMatch.duplicate_of_id) \
+        .filter_by(refutation_id=match_id).scalar() or match_id
+    match = DuplicateMatch(refutation_id=refutation.id, duplicate_of_id=root_id, similarity=score)
+    db.session.add(match)
+    return match
+
+
+def apply_duplicate_verdict(refutation: Refutation, match: DuplicateMatch) -> bool:
+    """
+    Settle a duplicate on an auto-adjudicated bounty without the LLM. The
+    original's verdict is reused only for a resubmission (same bounty, same
+    author) of an already judged refutation; a copy of someone else's work
+    or of a refutation on another bounty is flagged for human review, as is
+    anything whose original is still pending. Refutations on bounties the
+    creator adjudicates are left alone. Returns True if a verdict was reused.
+    """
+    if not refutation.bounty.auto_adjudicate:
+        return False
+    original = db.session.get(Refutation, match.duplicate_of_id)
+    note = f'Near-duplicate of refutation #{original.id} ({match.similarity:.0%} similar).'
+    if original.author_id != refutation.author_id:
+        reason = "Copies another user's refutation; flagged for review."
+    elif original.bounty_id != refutation.bounty_id:
+        reason = 'Copied from a refutation on another bounty; flagged for review.'
+    elif original.adjudication_status != AdjudicationStatus.PENDING and original.ai_score is not None:
+        refutation.ai_score = original.ai_score
+        refutation.ai_feedback = f'{note} Verdict reused. {original.ai_feedback or ""}'.strip()
+        refutation.adjudication_status = original.adjudication_status
+        return True
+    else:
+        reason = 'Flagged without AI review.'
+    refutation.ai_feedback = f'{note} {reason}'
+    refutation.adjudication_status = AdjudicationStatus.FLAGGED
+    return False
+
+
+def rebuild(batch_size: int = 1000) -> int:
+    """Re-index every refutation from scratch. Recorded duplicate matches are kept."""
+    db.session.execute(db.delete(LshBucket))
+    db.session.execute(db.delete(RefutationSignature))
+    indexed, last_id = 0, 0
+    while True:
+        rows = db.session.query(Refutation.id, Refutation.content) \
+            .filter(Refutation.id > last_id).order_by(Refutation.id).limit(batch_size).all()
+        if not rows:
+            break
+        indexed += index_many(rows)
+        last_id = rows[-1][0]
+    db.session.commit()
+    return indexed
+
+
+def clusters(min_size: int = 2, limit: int = 50) -> List[Dict]:
+    """Duplicate clusters, largest first: the original refutation and its duplicates."""
+    groups = db.session.query(
+        DuplicateMatch.duplicate_of_id,
+        db.func.count(DuplicateMatch.refutation_id),
+        db.func.min(DuplicateMatch.similarity)
+    ).group_by(DuplicateMatch.duplicate_of_id) \
+     .having(db.func.count(DuplicateMatch.refutation_id) + 1 >= min_size) \
+     .order_by(db.func.count(DuplicateMatch.refutation_id).desc(), DuplicateMatch.duplicate_of_id) \
+     .limit(limit).all()
+
+    root_ids = [root_id for root_id, _, _ in groups]
+    members = {}
+    for root_id, refutation_id in db.session.query(DuplicateMatch.duplicate_of_id,
+                                                   DuplicateMatch.refutation_id) \
+            .filter(DuplicateMatch.duplicate_of_id.in_(root_ids)) \
+            .order_by(DuplicateMatch.refutation_id):
+        members.setdefault(root_id, []).append(refutation_id)
+    roots = {r.id: r for r in Refutation.query.options(db.joinedload(Refutation.author))
+             .filter(Refutation.id.in_(root_ids))}
+
+    return [
+        {
+            'original_id': root_id,
+            'author': roots[root_id].author.username if root_id in roots else None,
+            'bounty_id': roots[root_id].bounty_id if root_id in roots else None,
+            'size': count + 1,
+            'min_similarity': round(min_similarity, 2),
+            'duplicate_ids': members.get(root_id, [])
+        }
+        for root_id, count, min_similarity in groups
+    ]
@@ -0,0 +1,207 @@
+"""
+Multi-judge ensemble adjudication for Falsifi
+
+Instead of one model call, a refutation is put to `size` judges at once,
+each asked to weigh a different aspect (JUDGE_FOCUSES). The calls run
+concurrently on a private asyncio event loop with a per-call timeout, so
+an ensemble takes about as long as its slowest needed judge rather than
+the sum of all of them.
+
+Verdicts are combined with aggregate(): median score, majority status
+(a tie goes to human review as 'flagged') and the union of flags. As soon
+as the leading status is ahead of the runner-up by more than the number of
+judges still thinking, the majority can no longer change and the remaining
+calls are cancelled. Judges that time out, fail or return unparseable
+output are left out; if none answer, the caller falls back. Each judge
+call goes through the adjudicator's retry policy and circuit breaker
+(circuit_breaker.acall_with_policy), retrying within the judge's timeout.
+While the breaker is half-open only the judge that gets the probe is asked;
+a prompt none of whose judges were let through comes back as CircuitOpen.
+
+Judges get the adjudicator's messages unchanged except for their focus,
+appended to the last message, so all of them share one cacheable prefix.
+"""
+import asyncio
+import logging
+import statistics
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Union
+
+from metrics import ADJUDICATOR_PARSE_ERRORS, record_model_call
+from circuit_breaker import CircuitBreaker, CircuitOpen, RetryPolicy, acall_with_policy
+from token_budget import log_usage
+
+logger = logging.getLogger(__name__)
+
+# Appended to the last message (not the system prompt) so every judge shares the same prefix
+JUDGE_FOCUSES = (
+    'Weigh logical validity most heavily.',
+    'Weigh the quality and relevance of the evidence most heavily.',
+    'Be a skeptical reviewer: look hard for bad faith, spam, nonsense or irrelevance.',
+    'Weigh how directly the refutation addresses the core claim.',
+    'Weigh clarity, structure and constructive tone.',
+)
+
+
+def aggregate(results: List[Dict], judges: int) -> Dict:
+    """Combine judge verdicts: median score, majority status, union of flags."""
+    ranked = Counter(result['status'] for result in results).most_common()
+    if len(ranked) == 1 or ranked[0][1] > ranked[1][1]:
+        status = ranked[0][0]
+    else:
+        status = 'flagged'
+    score = int(round(statistics.median(result['score'] for result in results)))
+    flags = list(dict.fromkeys(flag for result in results for flag in result['flags']))
+
+    # Quote the judge closest to the median among those who voted with the majority
+    majority = [result for result in results if result['status'] == status] or results
+    spokesman = min(majority, key=lambda result: abs(result['score'] - score))
+    scores = ', '.join(str(result['score']) for result in results)
+    return {
+        'score': score,
+        'feedback': f"Ensemble of {len(results)}/{judges} judges (scores {scores}). {spokesman['feedback']}",
+        'status': status,
+        'flags': flags
+    }
+
+
+def is_decided(results: List[Dict], pending: int) -> bool:
+    """True once no combination of the pending judges' votes can change the majority status."""
+    ranked = Counter(result['status'] for result in results).most_common(2)
+    if not ranked:
+        return False
+    runner_up = ranked[1][1] if len(ranked) > 1 else 0
+    return ranked[0][1] - runner_up > pending
+
+
+class JudgeEnsemble:
+    """
+    Fans judge prompts out concurrently through AsyncOpenAI.
+
+    Callers are synchronous (request handlers, worker threads), so the calls
+    run on one event loop in a daemon thread, started on first use and shared
+    with its connection pool by every caller in the process.
+    """
+
+    def __init__(self, size: int = 3, timeout: float = 20.0, api_key: Optional[str] = None,
+                 base_url: Optional[str] = None, model: str = 'gpt-4o-mini',
+                 temperature: float = 0.3, max_tokens: int = 1000, breaker: Optional[CircuitBreaker] = None,
+                 retry_policy: Optional[RetryPolicy] = None, budget=None):
+        self.size = max(1, min(size, len(JUDGE_FOCUSES)))
+        self.timeout = timeout
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.breaker = breaker or CircuitBreaker(name='judges')
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.budget = budget  # Optional token_budget.PromptBudget, for token estimates
+        self._loop = None
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                from openai import AsyncOpenAI
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='judge-ensemble', daemon=True).start()
+                # Retries are the caller's business; a judge that misses its timeout is just dropped
+                self._client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url,
+                                           timeout=self.timeout, max_retries=0)
+                self._loop = loop
+            return self._loop
+
+    def evaluate(self, messages: List[Dict], parse: Callable[[str], Dict]) -> Union[Dict, CircuitOpen, None]:
+        """Aggregated verdict for one chat prompt; see evaluate_all()."""
+        return self.evaluate_all([messages], parse)[0]
+
+    def evaluate_all(self, prompts: List[List[Dict]],
+                     parse: Callable[[str], Dict]) -> List[Union[Dict, CircuitOpen, None]]:
+        """
+        Run the ensembles for several chat prompts (message lists) concurrently.
+
+        Each entry is the aggregated verdict, None if no judge answered, or the
+        CircuitOpen error if the breaker let none of that prompt's judges through.
+        """
+        async def verdict(messages):
+            try:
+                return await self.judge(messages, parse)
+            except CircuitOpen as e:
+                return e
+
+        async def run():
+            return await asyncio.gather(*(verdict(messages) for messages in prompts))
+        return asyncio.run_coroutine_threadsafe(run(), self._ensure_loop()).result()
+
+    async def judge(self, messages: List[Dict], parse: Callable[[str], Dict]) -> Optional[Dict]:
+        """Ask every judge, stopping as soon as the majority status is settled."""
+        *prefix, last = messages
+        pending = {asyncio.ensure_future(self._call(
+                       prefix + [{**last, 'content': f"{last['content']}\n\nJudge focus: {focus}"}], parse))
+                   for focus in JUDGE_FOCUSES[:self.size]}
+        results = []
+        refused = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if isinstance(task.exception(), CircuitOpen):
+                        refused = task.exception()
+                    elif task.result() is not None:
+                        results.append(task.result())
+                if is_decided(results, len(pending)):
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+        if results:
+            return aggregate(results, self.size)
+        if refused is not None:
+            raise refused
+        return None
+
+    async def _call(self, messages: List[Dict], parse: Callable[[str], Dict]) -> Optional[Dict]:
+        """One judge's verdict, None if it failed. Raises CircuitOpen if the breaker refused the call."""
+        async def attempt(timeout: float):
+            started = time.perf_counter()
+            try:
+                response = await asyncio.wait_for(self._client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens
+                ), timeout)
+            except asyncio.CancelledError:
+                # Cancelled because the verdict was already settled; not an error
+                raise
+            except Exception as e:
+                logger.warning('AI judge error: %r', e)
+                record_model_call('judge', started)
+                raise
+            record_model_call('judge', started, response)
+            return response
+
+        try:
+            response = await acall_with_policy(attempt, self.breaker, self.retry_policy, budget=self.timeout)
+        except (CircuitOpen, asyncio.CancelledError):
+            raise
+        except Exception:
+            return None
+        text = response.choices[0].message.content or ''
+        log_usage('judge', self.budget.count_messages(messages) if self.budget is not None else 0, response)
+
+        try:
+            result = parse(text)
+        except Exception as e:
+            # One unreadable judge must not take the other judges' verdicts down with it
+            logger.warning('AI judge response unreadable: %r', e)
+            ADJUDICATOR_PARSE_ERRORS.labels(mode='judge').inc()
+            return None
+        if 'parsing_error' in result['flags'] or not isinstance(result['score'], (int, float)):
+            ADJUDICATOR_PARSE_ERRORS.labels(mode='judge').inc()
+            return None
+        return result
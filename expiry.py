@@ -0,0 +1,124 @@
+"""
+Bounty expiry sweeper for Falsifi
+
+Open bounties past their expires_at are moved to EXPIRED and their creators
+refunded, BATCH_SIZE bounties per transaction:
+
+    SELECT id, expires_at FROM bounties
+     WHERE status = 'OPEN' AND expires_at <= :cutoff AND (expires_at, id) > (:last_expires_at, :last_id)
+     ORDER BY expires_at, id LIMIT :batch_size
+
+reads a short range of ix_bounties_status_expires_at, and the conditional
+UPDATE ... WHERE status = 'OPEN' RETURNING that follows only refunds bounties
+this batch actually moved, so a creator closing a bounty at the same moment
+(or a second sweeper) cannot cause a double refund. Each transaction holds
+its row locks for one batch only.
+
+The sweep's cutoff and keyset position are stored in sweep_checkpoints in
+the same transaction as each batch, so a sweep interrupted by a crash or
+--max-batches resumes from where it stopped on the next run.
+"""
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+from models import db, Bounty, BountyStatus, SweepCheckpoint
+from counters import bump_site_counters
+import ledger
+
+logger = logging.getLogger(__name__)
+
+SWEEP_NAME = 'bounty_expiry'
+BATCH_SIZE = 500
+
+
+def _checkpoint() -> SweepCheckpoint:
+    checkpoint = db.session.get(SweepCheckpoint, SWEEP_NAME)
+    if checkpoint is None:
+        checkpoint = SweepCheckpoint(name=SWEEP_NAME, last_id=0, processed=0)
+        db.session.add(checkpoint)
+    return checkpoint
+
+
+def expire_batch(checkpoint: SweepCheckpoint, batch_size: int = BATCH_SIZE) -> int:
+    """
+    Expire the next batch of due bounties after the checkpoint's position,
+    refund their creators and advance the checkpoint, all in one transaction.
+    Returns the number of due bounties read (less than batch_size when done).
+    """
+    query = db.session.query(Bounty.id, Bounty.expires_at) \
+        .filter(Bounty.status == BountyStatus.OPEN, Bounty.expires_at <= checkpoint.cutoff)
+    if checkpoint.last_expires_at is not None:
+        query = query.filter(db.tuple_(Bounty.expires_at, Bounty.id) >
+                             (checkpoint.last_expires_at, checkpoint.last_id))
+    due = query.order_by(Bounty.expires_at, Bounty.id).limit(batch_size).all()
+    if not due:
+        return 0
+
+    expired = db.session.execute(
+        db.update(Bounty)
+        .where(Bounty.id.in_([bounty_id for bounty_id, _ in due]), Bounty.status == BountyStatus.OPEN)
+        .values(status=BountyStatus.EXPIRED, version=Bounty.version + 1)
+        .returning(Bounty.id, Bounty.creator_id, Bounty.bounty_amount)
+        .execution_options(synchronize_session=False)
+    ).all()
+    ledger.credit_many(((creator_id, amount, bounty_id) for bounty_id, creator_id, amount in expired),
+                       'bounty_expired', 'bounty')
+    bump_site_counters(open_bounties=-len(expired))
+
+    checkpoint.last_id, checkpoint.last_expires_at = due[-1]
+    checkpoint.processed += len(expired)
+    checkpoint.updated_at = datetime.utcnow()
+    db.session.commit()
+    return len(due)
+
+
+def sweep(batch_size: int = BATCH_SIZE, max_batches: Optional[int] = None,
+          now: Optional[datetime] = None) -> Dict:
+    """
+    Expire every open bounty due by `now`, resuming an unfinished sweep if
+    there is one. Stops early after `max_batches` batches; the next call
+    carries on. Returns the sweep's progress.
+    """
+    checkpoint = _checkpoint()
+    resumed = checkpoint.cutoff is not None
+    if not resumed:
+        checkpoint.cutoff = now or datetime.utcnow()
+        checkpoint.last_expires_at = None
+        checkpoint.last_id = 0
+        checkpoint.processed = 0
+        checkpoint.started_at = datetime.utcnow()
+        checkpoint.finished_at = None
+        checkpoint.updated_at = datetime.utcnow()
+        db.session.commit()
+
+    batches = 0
+    finished = False
+    while max_batches is None or batches < max_batches:
+        read = expire_batch(checkpoint, batch_size)
+        batches += read > 0
+        if read < batch_size:
+            finished = True
+            break
+
+    result = {'expired': checkpoint.processed, 'batches': batches, 'resumed': resumed,
+              'finished': finished, 'cutoff': checkpoint.cutoff}
+    if finished:
+        checkpoint.cutoff = None
+        checkpoint.finished_at = datetime.utcnow()
+        checkpoint.updated_at = checkpoint.finished_at
+        db.session.commit()
+    return result
+
+
+def sweep_forever(interval: float = 60.0, batch_size: int = BATCH_SIZE,
+                  stop: Optional[threading.Event] = None) -> None:
+    """Run a sweep every `interval` seconds until `stop` is set."""
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        result = sweep(batch_size=batch_size)
+        if result['expired']:
+            logger.info('Expired %d bounties in %d batches', result['expired'], result['batches'])
+        db.session.remove()
+        stop.wait(interval)
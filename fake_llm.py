@@ -0,0 +1,204 @@
+"""
+Fake OpenAI-compatible chat completions server for local testing
+
+    python fake_llm.py --port 8089 --latency 0.2
+    python fake_llm.py --error-rate 0.3 --error-status 503   # a degraded provider
+    OPENAI_API_KEY=fake OPENAI_BASE_URL=http://127.0.0.1:8089/v1 flask adjudication-worker
+
+POST /v1/chat/completions answers with a verdict in the adjudicator's JSON
+format, derived from a hash of the messages so the same prompt always gets
+the same score. From Python, FakeLLM runs the server on a background thread;
+`latency` and `verdict` may be callables of the request body, so a test can
+slow down or steer individual judges. Errors are injected at random with
+`error_rate`, or per request with `error`, a callable returning an HTTP
+status (or None to answer normally); 429s carry a Retry-After header.
+
+Prompt caching is imitated: a request whose leading messages (all but the
+last) were seen before reports their tokens as
+usage.prompt_tokens_details.cached_tokens. Tokens are counted as words.
+"""
+import argparse
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Union
+
+
+def default_verdict(body: Dict) -> Dict:
+    """Deterministic verdict for a request: score 20-95 from a hash of its messages."""
+    digest = hashlib.sha256(json.dumps(body.get('messages', []), sort_keys=True).encode('utf-8')).digest()
+    score = 20 + digest[0] % 76
+    status = 'approved' if score >= 60 else 'rejected' if score < 30 else 'flagged'
+    return {
+        'score': score,
+        'feedback': f'Fake evaluation ({score}/100).',
+        'status': status,
+        'flags': [] if score >= 60 else ['weak_evidence']
+    }
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Ensembles and load tests open many connections at once
+    request_queue_size = 256
+
+    def handle_error(self, request, client_address):
+        # Clients hang up on purpose (cancelled judges, timeouts); only report real errors
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FakeLLM:
+    """An OpenAI-compatible server on a background thread; use as a context manager."""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0,
+                 latency: Union[float, Callable[[Dict], float]] = 0.0,
+                 verdict: Optional[Callable[[Dict], Dict]] = None,
+                 error_rate: float = 0.0, error_status: int = 500,
+                 error: Optional[Callable[[Dict], Optional[int]]] = None, seed: Optional[int] = None):
+        self.latency = latency
+        self.verdict = verdict or default_verdict
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.error = error
+        self.retry_after = 1
+        self.requests = 0
+        self.errors = 0
+        self._prefixes = set()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.server = _Server((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def start(self) -> 'FakeLLM':
+        self._thread = threading.Thread(target=self.server.serve_forever, name='fake-llm', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def injected_error(self, body: Dict) -> Optional[int]:
+        """HTTP status to fail this request with, if any."""
+        if self.error is not None:
+            status = self.error(body)
+        else:
+            with self._lock:
+                status = self.error_status if self._rng.random() < self.error_rate else None
+        if status is not None:
+            with self._lock:
+                self.errors += 1
+        return status
+
+    def completion(self, body: Dict, request_id: int = 0) -> Dict:
+        """Response body for one chat completion request."""
+        delay = self.latency(body) if callable(self.latency) else self.latency
+        if delay:
+            time.sleep(delay)
+        content = json.dumps(self.verdict(body))
+        messages = body.get('messages', [])
+        prompt_tokens = sum(len(str(m.get('content', '')).split()) for m in messages)
+        prefix = hashlib.sha256(json.dumps(messages[:-1], sort_keys=True).encode('utf-8')).hexdigest()
+        with self._lock:
+            cached = prefix in self._prefixes
+            self._prefixes.add(prefix)
+        cached_tokens = sum(len(str(m.get('content', '')).split()) for m in messages[:-1]) if cached else 0
+        completion_tokens = len(content.split())
+        return {
+            'id': f'chatcmpl-fake-{request_id}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'fake'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop'
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+                'prompt_tokens_details': {'cached_tokens': cached_tokens}
+            }
+        }
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b'{}')
+                except json.JSONDecodeError:
+                    return self._send(400, {'error': {'message': 'invalid JSON', 'type': 'invalid_request_error'}})
+                if not self.path.rstrip('/').endswith('/chat/completions'):
+                    return self._send(404, {'error': {'message': f'unknown path {self.path}', 'type': 'not_found'}})
+                with fake._lock:
+                    fake.requests += 1
+                    request_id = fake.requests
+                status = fake.injected_error(body)
+                if status is not None:
+                    delay = fake.latency(body) if callable(fake.latency) else fake.latency
+                    if delay:
+                        time.sleep(delay)
+                    headers = {'Retry-After': str(fake.retry_after)} if status == 429 else {}
+                    return self._send(status, {'error': {'message': f'injected error {status}', 'type': 'server_error'}},
+                                      headers)
+                self._send(200, fake.completion(body, request_id))
+
+            def _send(self, status: int, payload: Dict, headers: Optional[Dict] = None):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake OpenAI-compatible chat completions server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to wait before each response.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests that fail.')
+    parser.add_argument('--error-status', type=int, default=500, help='HTTP status of injected failures.')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    fake = FakeLLM(host=args.host, port=args.port, latency=args.latency,
+                   error_rate=args.error_rate, error_status=args.error_status, seed=args.seed)
+    print(f'Fake LLM listening on {fake.base_url}')
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+"""
+Batch heuristic scoring for the no-API-key path
+
+score_batch() gives the same scores, flags, statuses and feedback as
+AIAdjudicator._fallback_evaluation, but for a whole list of refutations at
+once: the texts are concatenated into one array of code points, word counts
+and capital-letter counts are computed with NumPy, and long spam phrase
+lists are matched with one trie-shaped regular expression, so the cost
+barely grows with the number of phrases.
+"""
+import re
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+SPAM_PHRASES = ('click here', 'buy now', 'limited time', 'make money fast')
+
+# Below this many phrases, plain substring tests beat the combined regex
+REGEX_MIN_PHRASES = 16
+
+BMP_SIZE = 0x10000
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def _bmp_tables():
+    """
+    str.isspace() and str.isupper() for every Basic Multilingual Plane code
+    point, so NumPy classifies non-ASCII text exactly as Python does.
+    Built on first use.
+    """
+    with _tables_lock:
+        if not _tables:
+            chars = [chr(i) for i in range(BMP_SIZE)]
+            _tables['space'] = np.fromiter((c.isspace() for c in chars), dtype=bool, count=BMP_SIZE)
+            _tables['upper'] = np.fromiter((c.isupper() for c in chars), dtype=bool, count=BMP_SIZE)
+        return _tables['space'], _tables['upper']
+
+
+def _classify(text: str):
+    """Boolean arrays (is space, is upper) for every character of `text`."""
+    if text.isascii():
+        codes = np.frombuffer(text.encode('ascii'), dtype=np.uint8)
+    else:
+        codes = np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+
+    space = (codes == 32) | ((codes >= 9) & (codes <= 13)) | ((codes >= 28) & (codes <= 31))
+    upper = (codes >= 65) & (codes <= 90)
+
+    if codes.dtype != np.uint8:
+        wide = np.flatnonzero(codes >= 128)
+        if len(wide):
+            space_table, upper_table = _bmp_tables()
+            wide_codes = codes[wide]
+            bmp = wide_codes < BMP_SIZE
+            space[wide[bmp]] = space_table[wide_codes[bmp]]
+            upper[wide[bmp]] = upper_table[wide_codes[bmp]]
+            # Astral characters are rare; ask Python about each distinct one
+            for code in np.unique(wide_codes[~bmp]):
+                positions = wide[~bmp][wide_codes[~bmp] == code]
+                space[positions] = chr(code).isspace()
+                upper[positions] = chr(code).isupper()
+    return space, upper
+
+
+class SpamMatcher:
+    """
+    Tests many texts against many phrases at once. The phrases are merged
+    into a trie and compiled to a single regular expression shaped like it,
+    so `re` scans each text once in C and at every position only follows
+    the branch for the characters seen so far (Aho-Corasick style, without
+    the failure links, which finding any match does not need).
+    """
+
+    def __init__(self, phrases: Sequence[str]):
+        self.phrases = tuple(phrases)
+        # An empty phrase is a substring of everything, as with `'' in text`
+        self.matches_everything = '' in self.phrases
+
+        trie: Dict = {}
+        for phrase in self.phrases:
+            node = trie
+            for char in phrase:
+                node = node.setdefault(char, {})
+            node[''] = True
+        self.regex = None
+        if len(self.phrases) >= REGEX_MIN_PHRASES and not self.matches_everything:
+            self.regex = re.compile(self._pattern(trie))
+
+    @classmethod
+    def _pattern(cls, node: Dict) -> str:
+        # A phrase ending here already matches; longer phrases through this node add nothing
+        if '' in node:
+            return ''
+        branches = [re.escape(char) + cls._pattern(child) for char, child in sorted(node.items())]
+        return branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+
+    def contains_any(self, text: str) -> bool:
+        return bool(self.scan([text])[0])
+
+    def scan(self, texts: Sequence[str]) -> np.ndarray:
+        """Boolean array: does texts[i] contain any phrase?"""
+        if self.matches_everything or not self.phrases:
+            return np.full(len(texts), self.matches_everything, dtype=bool)
+        if self.regex is None:
+            phrases = self.phrases
+            hits = (any(phrase in text for phrase in phrases) for text in texts)
+        else:
+            search = self.regex.search
+            hits = (search(text) is not None for text in texts)
+        return np.fromiter(hits, dtype=bool, count=len(texts))
+
+
+_default_matcher: Optional[SpamMatcher] = None
+
+
+def default_matcher() -> SpamMatcher:
+    global _default_matcher
+    if _default_matcher is None:
+        _default_matcher = SpamMatcher(SPAM_PHRASES)
+    return _default_matcher
+
+
+def score_batch(contents: Sequence[str], matcher: Optional[SpamMatcher] = None) -> List[Dict]:
+    """Heuristic evaluation of many refutations; see AIAdjudicator._fallback_evaluation."""
+    if not contents:
+        return []
+    matcher = matcher or default_matcher()
+
+    lengths = np.fromiter((len(text) for text in contents), dtype=np.int64, count=len(contents))
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    is_space, is_upper = _classify(''.join(contents))
+
+    # A word starts at a non-space character that follows a space or begins a text
+    nonspace = ~is_space
+    word_start = nonspace.copy()
+    word_start[1:] &= is_space[:-1]
+    first = starts[lengths > 0]
+    word_start[first] = nonspace[first]
+
+    def per_text(flags):
+        positions = np.flatnonzero(flags)
+        return np.searchsorted(positions, ends) - np.searchsorted(positions, starts)
+
+    word_counts = per_text(word_start)
+    caps_ratio = per_text(is_upper) / np.maximum(lengths, 1)
+    spam = matcher.scan([text.lower() for text in contents])
+
+    score = np.full(len(contents), 50, dtype=np.int64)
+    score[word_counts < 20] -= 20
+    score[word_counts > 100] += 10
+    score[spam] = 10
+    shouting = caps_ratio > 0.5
+    score[shouting] -= 10
+    score = np.clip(score, 0, 100)
+
+    results = []
+    for i in range(len(contents)):
+        flags = []
+        if word_counts[i] < 20:
+            flags.append("too_short")
+        if spam[i]:
+            flags.append("spam_detected")
+        if shouting[i]:
+            flags.append("excessive_caps")
+        item_score = int(score[i])
+        status = 'flagged' if flags else 'approved'
+        if item_score < 30:
+            status = 'rejected'
+        results.append({
+            'score': item_score,
+            'feedback': f'Automated evaluation (AI unavailable). Length: {int(word_counts[i])} words. Issues: {", ".join(flags) if flags else "None"}',
+            'status': status,
+            'flags': flags
+        })
+    return results
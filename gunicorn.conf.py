@@ -0,0 +1,49 @@
+"""
+Gunicorn configuration for Falsifi (loaded automatically from the working directory)
+
+The app is imported once in the master (preload_app) and forked into the
+workers, so they boot without repeating the imports and share that memory.
+Importing app.py has no side effects: on_starting creates the tables and
+applies migrations once, before any worker exists (it never adds the sample
+data; that is `flask init-db`'s job), and compiles templates
+and ORM mappers in the master; post_fork discards the database connections
+a worker inherits so no two processes share one.
+"""
+import os
+import sys
+
+preload_app = os.getenv('GUNICORN_PRELOAD', '1').lower() in ('1', 'true', 'yes')
+
+
+def on_starting(server):
+    """
+    Migrate the database once per start instead of in every worker
+    (AUTO_MIGRATE=0 to skip) and, when preloading, warm the app up for all
+    workers at once.
+    """
+    if os.getenv('AUTO_MIGRATE', '1').lower() in ('1', 'true', 'yes'):
+        from app import app, setup_database
+        from models import db
+        # Production databases start empty rather than with the demo users and bounties
+        applied = setup_database(sample_data=False)
+        server.log.info("Database ready (%d migrations applied)", len(applied))
+        with app.app_context():
+            db.engine.dispose()
+    if server.cfg.preload_app:
+        from app import warm_up
+        warm_up()
+
+
+def post_fork(server, worker):
+    """Start each worker with an empty connection pool rather than the master's."""
+    if 'app' in sys.modules:
+        from models import db
+        with sys.modules['app'].app.app_context():
+            db.engine.dispose(close=False)
+
+
+def child_exit(server, worker):
+    """Drop an exited worker's live metric files so /metrics stays accurate."""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,412 @@
+"""
+Bulk JSONL import for Falsifi
+
+Each input line is a JSON object with a "type" of "user", "bounty" or
+"refutation" (or pass a default type for single-kind files):
+
+    {"type": "user", "username": "alice", "email": "alice@example.com", "points": 5000}
+    {"type": "bounty", "ref": "pos", "creator": "alice", "title": "...", "description": "...", "bounty_amount": 500}
+    {"type": "refutation", "bounty_ref": "pos", "author": "bob", "content": "...", "bond_amount": 50}
+
+Users are referenced by username. Refutations point at a bounty either by
+the "ref" of a bounty in the same import or by an existing "bounty_id".
+Points follow the same rules as the web app: creating a bounty debits its
+amount, submitting a refutation debits its bond, and imported rewards and
+returned bonds are credited back, as is the amount of a bounty imported as
+closed or expired. Imported balances and each chunk's net change per user
+are recorded in the points ledger.
+
+Input is validated in one pass before anything is written, including that
+every debit is covered by the user's balance at that point in the input.
+It is then loaded in chunks with multi-row INSERT ... RETURNING, all in one
+transaction: an import either lands completely or not at all.
+"""
+import json
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from models import db, User, Bounty, Refutation, PointsTransaction, BountyStatus, AdjudicationStatus
+from counters import bump_site_counters
+import duplicates
+
+RECORD_TYPES = ('user', 'bounty', 'refutation')
+
+REQUIRED_FIELDS = {
+    'user': ('username', 'email'),
+    'bounty': ('creator', 'title', 'description', 'bounty_amount'),
+    'refutation': ('author', 'content'),
+}
+
+INTEGER_FIELDS = ('points', 'bounty_amount', 'bond_amount', 'reward_earned', 'creator_rating', 'bounty_id')
+FLOAT_FIELDS = ('reputation_score', 'ai_score')
+TEXT_FIELDS = ('username', 'email', 'creator', 'author', 'title', 'description', 'category', 'content',
+               'sources', 'ai_feedback', 'creator_feedback', 'status', 'adjudication_status')
+DATETIME_FIELDS = ('created_at', 'expires_at')
+
+# A bounty imported in one of these states has had its amount returned to its creator
+REFUNDED_STATUSES = (BountyStatus.CLOSED, BountyStatus.EXPIRED)
+
+
+class ImportValidationError(Exception):
+    """Raised when validation finds problems in the input."""
+
+    def __init__(self, errors: List[str]):
+        super().__init__(f'{len(errors)} invalid records')
+        self.errors = errors
+
+
+def read_records(paths: List[str], default_type: Optional[str] = None) -> Iterator[Tuple[str, int, Dict]]:
+    """Yield (path, line number, record) for every non-blank line."""
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    record = {'type': '__invalid__', 'error': str(e)}
+                if isinstance(record, dict) and default_type and 'type' not in record:
+                    record['type'] = default_type
+                yield path, line_no, record
+
+
+def _parse_datetime(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+def _check_types(record: Dict) -> None:
+    """Raise ValueError naming the first field whose value has the wrong type."""
+    for field in INTEGER_FIELDS:
+        value = record.get(field)
+        if value is None:
+            continue
+        # bool is an int subclass, and int('1.5') / int([1]) fail with unhelpful messages
+        if isinstance(value, bool) or not isinstance(value, (int, str)) or not str(value).strip().lstrip('-').isdigit():
+            raise ValueError(f'{field} must be an integer, got {value!r}')
+        if int(value) < 0 or (field == 'bounty_amount' and int(value) == 0):
+            raise ValueError(f'{field} must be {"positive" if field == "bounty_amount" else "non-negative"}, got {value!r}')
+    for field in FLOAT_FIELDS:
+        value = record.get(field)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+            raise ValueError(f'{field} must be a number, got {value!r}')
+    for field in TEXT_FIELDS:
+        value = record.get(field)
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f'{field} must be a string, got {value!r}')
+    for field in DATETIME_FIELDS:
+        value = record.get(field)
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f'{field} must be an ISO 8601 string, got {value!r}')
+        _parse_datetime(value)
+
+
+def validate(paths: List[str], default_type: Optional[str] = None) -> Dict[str, int]:
+    """
+    Check every record in a single pass: known type, required fields, value
+    types, unique usernames and emails (against the database too), that
+    referenced users and bounties exist either earlier in the input or in
+    the database, and that no bounty or bond takes its user's balance below
+    zero. Raises ImportValidationError listing every problem.
+    """
+    errors = []
+    counts = {kind: 0 for kind in RECORD_TYPES}
+    usernames = set()
+    emails = set()
+    bounty_refs = set()
+    bounty_ids = set()
+    existing_users = dict(db.session.query(User.username, User.points))
+    existing_emails = {email for (email,) in db.session.query(User.email)}
+    # Running balance of every user the input touches, in input order
+    balances = {}
+
+    def spend(username: str, amount: int, what: str) -> bool:
+        if username not in balances:
+            balances[username] = existing_users[username] or 0
+        if amount > balances[username]:
+            errors.append(f'{where}: {username!r} cannot afford {what} of {amount} (balance {balances[username]})')
+            return False
+        balances[username] -= amount
+        return True
+
+    for path, line_no, record in read_records(paths, default_type):
+        where = f'{path}:{line_no}'
+        if not isinstance(record, dict) or record.get('type') not in RECORD_TYPES:
+            detail = record.get('error') if isinstance(record, dict) else None
+            errors.append(f'{where}: ' + (f'invalid JSON ({detail})' if detail else 'unknown record type'))
+            continue
+
+        kind = record['type']
+        missing = [field for field in REQUIRED_FIELDS[kind] if record.get(field) in (None, '')]
+        if missing:
+            errors.append(f'{where}: missing {", ".join(missing)}')
+            continue
+
+        try:
+            _check_types(record)
+            if record.get('status'):
+                BountyStatus(record['status'])
+            if record.get('adjudication_status'):
+                AdjudicationStatus(record['adjudication_status'])
+        except ValueError as e:
+            errors.append(f'{where}: {e}')
+            continue
+
+        if kind == 'user':
+            if record['username'] in usernames or record['username'] in existing_users:
+                errors.append(f'{where}: duplicate username {record["username"]!r}')
+                continue
+            if record['email'] in emails or record['email'] in existing_emails:
+                errors.append(f'{where}: duplicate email {record["email"]!r}')
+                continue
+            usernames.add(record['username'])
+            emails.add(record['email'])
+            balances[record['username']] = int(record.get('points', 1000))
+        else:
+            person = record['creator'] if kind == 'bounty' else record['author']
+            if person not in usernames and person not in existing_users:
+                errors.append(f'{where}: unknown user {person!r}')
+                continue
+            if kind == 'bounty':
+                if record.get('ref') is not None and record['ref'] in bounty_refs:
+                    errors.append(f'{where}: duplicate bounty ref {record["ref"]!r}')
+                    continue
+                amount = int(record['bounty_amount'])
+                if not spend(person, amount, 'a bounty'):
+                    continue
+                if BountyStatus(record.get('status', 'open')) in REFUNDED_STATUSES:
+                    balances[person] += amount
+                if record.get('ref') is not None:
+                    bounty_refs.add(record['ref'])
+            if kind == 'refutation':
+                if record.get('bounty_ref') is not None:
+                    if record['bounty_ref'] not in bounty_refs:
+                        errors.append(f'{where}: unknown bounty_ref {record["bounty_ref"]!r}')
+                        continue
+                elif record.get('bounty_id') is None:
+                    errors.append(f'{where}: missing bounty_ref or bounty_id')
+                    continue
+                bond = int(record.get('bond_amount', 50))
+                if not spend(person, bond, 'a bond'):
+                    continue
+                balances[person] += int(record.get('reward_earned', 0)) + (bond if record.get('bond_returned') else 0)
+                if record.get('bounty_ref') is None:
+                    bounty_ids.add(int(record['bounty_id']))
+
+        counts[kind] += 1
+
+    # Existing bounty ids are checked in one query rather than per record
+    if bounty_ids:
+        found = {bid for (bid,) in db.session.query(Bounty.id).filter(Bounty.id.in_(bounty_ids))}
+        for bid in sorted(bounty_ids - found):
+            errors.append(f'unknown bounty_id {bid}')
+
+    if errors:
+        raise ImportValidationError(errors)
+    return counts
+
+
+class BulkImporter:
+    """
+    Loads validated records in chunks and applies the points bookkeeping.
+
+    Nothing is committed here; import_files commits once everything is loaded.
+    """
+
+    def __init__(self, chunk_size: int = 5000):
+        self.chunk_size = max(1, chunk_size)
+        self.buffers = {kind: [] for kind in RECORD_TYPES}
+        self.user_ids = {}
+        self.bounty_refs = {}
+        # Per-user/per-bounty adjustments, applied in one executemany per flush
+        self.points = {}
+        self.user_bounties = {}
+        self.user_refutations = {}
+        self.bounty_refutations = {}
+        self.touched = set()
+        self.inserted = {kind: 0 for kind in RECORD_TYPES}
+
+    def _user_id(self, username: str) -> int:
+        if username not in self.user_ids:
+            self.user_ids[username] = db.session.query(User.id).filter_by(username=username).scalar()
+        return self.user_ids[username]
+
+    def _bump(self, counter: Dict, key: int, amount: int) -> None:
+        counter[key] = counter.get(key, 0) + amount
+
+    def add(self, record: Dict) -> None:
+        kind = record['type']
+        self.buffers[kind].append(record)
+        if len(self.buffers[kind]) >= self.chunk_size:
+            self.flush(kind)
+
+    def flush(self, kind: str) -> None:
+        # Parents first, so their ids are known when children are inserted
+        for parent in RECORD_TYPES[:RECORD_TYPES.index(kind)]:
+            if self.buffers[parent]:
+                self.flush(parent)
+        records, self.buffers[kind] = self.buffers[kind], []
+        if records:
+            getattr(self, f'_insert_{kind}s')(records)
+            self.inserted[kind] += len(records)
+            self._apply_adjustments()
+            self._count_site_totals(kind, records)
+
+    def finish(self) -> None:
+        self.flush('refutation')
+        # Validation checked balances before the load; points spent in the web app since then could still overdraw
+        overdrawn = db.session.query(User.username, User.points) \
+            .filter(User.id.in_(self.touched), User.points < 0).limit(20).all()
+        if overdrawn:
+            raise ImportValidationError([f'{username!r} would be left with {points} points'
+                                         for username, points in overdrawn])
+
+    def _insert_users(self, records: List[Dict]) -> None:
+        rows = [{
+            'username': r['username'],
+            'email': r['email'],
+            'points': int(r.get('points', 1000)),
+            'reputation_score': float(r.get('reputation_score', 0.0)),
+            'created_at': _parse_datetime(r.get('created_at')) or datetime.utcnow(),
+        } for r in records]
+        ids = db.session.execute(
+            db.insert(User).returning(User.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+        for row, user_id in zip(rows, ids):
+            self.user_ids[row['username']] = user_id
+        db.session.execute(db.insert(PointsTransaction), [
+            {'user_id': user_id, 'amount': row['points'], 'balance_after': row['points'],
+             'reason': 'opening_balance', 'created_at': row['created_at']}
+            for row, user_id in zip(rows, ids)
+        ])
+
+    def _insert_bountys(self, records: List[Dict]) -> None:
+        rows = []
+        for r in records:
+            creator_id = self._user_id(r['creator'])
+            amount = int(r['bounty_amount'])
+            rows.append({
+                'title': r['title'],
+                'description': r['description'],
+                'category': r.get('category', 'general'),
+                'bounty_amount': amount,
+                'creator_id': creator_id,
+                'status': BountyStatus(r.get('status', 'open')),
+                'auto_adjudicate': bool(r.get('auto_adjudicate', True)),
+                'created_at': _parse_datetime(r.get('created_at')) or datetime.utcnow(),
+                'expires_at': _parse_datetime(r.get('expires_at')),
+            })
+            refunded = rows[-1]['status'] in REFUNDED_STATUSES
+            self._bump(self.points, creator_id, 0 if refunded else -amount)
+            self._bump(self.user_bounties, creator_id, 1)
+            self.touched.add(creator_id)
+        ids = db.session.execute(
+            db.insert(Bounty).returning(Bounty.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+        for record, bounty_id in zip(records, ids):
+            if record.get('ref') is not None:
+                self.bounty_refs[record['ref']] = bounty_id
+
+    def _insert_refutations(self, records: List[Dict]) -> None:
+        rows = []
+        for r in records:
+            author_id = self._user_id(r['author'])
+            bounty_id = self.bounty_refs[r['bounty_ref']] if r.get('bounty_ref') is not None else int(r['bounty_id'])
+            bond = int(r.get('bond_amount', 50))
+            reward = int(r.get('reward_earned', 0))
+            bond_returned = bool(r.get('bond_returned', False))
+            rows.append({
+                'bounty_id': bounty_id,
+                'author_id': author_id,
+                'content': r['content'],
+                'sources': r.get('sources'),
+                'bond_amount': bond,
+                'ai_score': r.get('ai_score'),
+                'ai_feedback': r.get('ai_feedback'),
+                'adjudication_status': AdjudicationStatus(r.get('adjudication_status', 'pending')),
+                'creator_rating': r.get('creator_rating'),
+                'creator_feedback': r.get('creator_feedback'),
+                'reward_earned': reward,
+                'bond_returned': bond_returned,
+                'created_at': _parse_datetime(r.get('created_at')) or datetime.utcnow(),
+            })
+            self._bump(self.points, author_id, -bond + reward + (bond if bond_returned else 0))
+            self._bump(self.user_refutations, author_id, 1)
+            self._bump(self.bounty_refutations, bounty_id, 1)
+            self.touched.add(author_id)
+        ids = db.session.execute(
+            db.insert(Refutation).returning(Refutation.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+        # Historical rows are indexed for future duplicate checks but not flagged themselves
+        duplicates.index_many(zip(ids, (row['content'] for row in rows)))
+
+    def _count_site_totals(self, kind: str, records: List[Dict]) -> None:
+        if kind == 'user':
+            bump_site_counters(total_users=len(records))
+        elif kind == 'bounty':
+            open_count = sum(1 for r in records if r.get('status', 'open') == 'open')
+            bump_site_counters(total_bounties=len(records), open_bounties=open_count)
+        else:
+            bump_site_counters(total_refutations=len(records))
+
+    def _apply_adjustments(self) -> None:
+        """Apply accumulated points and counter deltas with one executemany each."""
+        # The chunk's net change per user goes into the ledger as one entry each;
+        # balance_after is left unset since the running balance isn't read back
+        now = datetime.utcnow()
+        entries = [{'user_id': user_id, 'amount': delta, 'reason': 'import', 'created_at': now}
+                   for user_id, delta in self.points.items() if delta]
+        if entries:
+            db.session.execute(db.insert(PointsTransaction), entries)
+        updates = [
+            (User, ('points',), self.points),
+            (User, ('bounty_count',), self.user_bounties),
+            (User, ('refutation_count',), self.user_refutations),
+            (Bounty, ('refutation_count', 'version'), self.bounty_refutations),
+        ]
+        for model, columns, deltas in updates:
+            rows = [{'row_id': key, 'delta': delta} for key, delta in deltas.items() if delta]
+            deltas.clear()
+            if not rows:
+                continue
+            table = model.__table__
+            db.session.execute(
+                table.update().where(table.c.id == db.bindparam('row_id'))
+                .values({column: table.c[column] + db.bindparam('delta') for column in columns}),
+                rows
+            )
+
+
+def import_files(paths: List[str], chunk_size: int = 5000, default_type: Optional[str] = None,
+                 dry_run: bool = False) -> Dict:
+    """Validate, then load the files. Returns counts and throughput."""
+    started = time.perf_counter()
+    counts = validate(paths, default_type)
+    validated_at = time.perf_counter()
+    if dry_run:
+        return {'counts': counts, 'validate_seconds': validated_at - started, 'load_seconds': 0.0, 'rows_per_second': 0.0}
+
+    importer = BulkImporter(chunk_size)
+    try:
+        for _, _, record in read_records(paths, default_type):
+            importer.add(record)
+        importer.finish()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if importer.inserted['refutation']:
+        from leaderboard import rebuild_leaderboard
+        rebuild_leaderboard()
+
+    load_seconds = time.perf_counter() - validated_at
+    total = sum(importer.inserted.values())
+    return {
+        'counts': importer.inserted,
+        'validate_seconds': validated_at - started,
+        'load_seconds': load_seconds,
+        'rows_per_second': total / load_seconds if load_seconds else 0.0
+    }
@@ -0,0 +1,145 @@
+"""
+Opt-in SQL instrumentation for Falsifi
+
+Hooks SQLAlchemy engine events on the shared `db` to record, per request,
+how many statements ran, total database time and the slowest statements.
+Results are returned in a Server-Timing header and statements slower than
+SLOW_QUERY_MS are written to the `falsifi.slow_sql` logger as JSON lines.
+"""
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Tuple
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+from models import db
+
+slow_query_logger = logging.getLogger('falsifi.slow_sql')
+
+# Thread-local stack of active count_queries() collectors
+_collectors = threading.local()
+
+
+def _active_collectors() -> List[list]:
+    if not hasattr(_collectors, 'stack'):
+        _collectors.stack = []
+    return _collectors.stack
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_start_time'].pop()
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    for collector in _active_collectors():
+        collector.append((statement, elapsed_ms))
+
+    if not has_request_context() or 'sql_stats' not in g:
+        return
+
+    stats = g.sql_stats
+    stats['count'] += 1
+    stats['total_ms'] += elapsed_ms
+    stats['statements'].append((elapsed_ms, statement))
+    stats['statements'].sort(key=lambda item: item[0], reverse=True)
+    del stats['statements'][stats['keep']:]
+
+    if elapsed_ms >= stats['slow_ms']:
+        slow_query_logger.warning(json.dumps({
+            'event': 'slow_query',
+            'endpoint': request.endpoint,
+            'method': request.method,
+            'path': request.path,
+            'duration_ms': round(elapsed_ms, 2),
+            'statement': ' '.join(statement.split())
+        }))
+
+
+def init_instrumentation(app) -> None:
+    """
+    Attach query listeners to the app's engine. Per-request totals are
+    collected when SQL_INSTRUMENTATION or METRICS_ENABLED is set; headers and
+    the slow-query log only with SQL_INSTRUMENTATION. count_queries() always works.
+    """
+    with app.app_context():
+        engine = db.engine
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+    # Metrics also consume the per-request totals, so collect them if either is on
+    emit = bool(app.config.get('SQL_INSTRUMENTATION'))
+    if not emit and not app.config.get('METRICS_ENABLED'):
+        return
+
+    slow_ms = app.config.get('SLOW_QUERY_MS', 100) if emit else float('inf')
+    keep = app.config.get('SQL_INSTRUMENTATION_TOP', 3)
+
+    @app.before_request
+    def _start_sql_stats():
+        g.sql_stats = {
+            'count': 0,
+            'total_ms': 0.0,
+            'statements': [],
+            'slow_ms': slow_ms,
+            'keep': keep
+        }
+
+    @app.after_request
+    def _emit_sql_stats(response):
+        stats = g.get('sql_stats')
+        if stats is None or not emit:
+            return response
+        response.headers['Server-Timing'] = \
+            f'db;dur={stats["total_ms"]:.2f};desc="{stats["count"]} queries"'
+        response.headers['X-DB-Query-Count'] = str(stats['count'])
+        if stats['total_ms'] >= slow_ms:
+            slow_query_logger.warning(json.dumps({
+                'event': 'slow_request_db',
+                'endpoint': request.endpoint,
+                'method': request.method,
+                'path': request.path,
+                'query_count': stats['count'],
+                'db_ms': round(stats['total_ms'], 2),
+                'slowest': [
+                    {'duration_ms': round(ms, 2), 'statement': ' '.join(sql.split())}
+                    for ms, sql in stats['statements']
+                ]
+            }))
+        return response
+
+
+@contextmanager
+def count_queries():
+    """
+    Collect (statement, duration_ms) for every query run by this thread
+    inside the block:
+
+        with count_queries() as queries:
+            client.get('/bounties')
+        assert len(queries) <= 3
+    """
+    collected: List[Tuple[str, float]] = []
+    stack = _active_collectors()
+    stack.append(collected)
+    try:
+        yield collected
+    finally:
+        stack.remove(collected)
+
+
+@contextmanager
+def assert_max_queries(max_count: int):
+    """Fail with the offending statements if the block runs more than `max_count` queries."""
+    with count_queries() as queries:
+        yield queries
+    if len(queries) > max_count:
+        listing = '\n'.join(f'  {" ".join(sql.split())}' for sql, _ in queries)
+        raise AssertionError(f'Expected at most {max_count} queries, got {len(queries)}:\n{listing}')
@@ -0,0 +1,112 @@
+"""
+Leaderboard maintenance for Falsifi
+
+LeaderboardEntry rows are kept current with single-statement updates at the
+points where their inputs change (a refutation is submitted or rated), so
+the leaderboard page is a plain top-N read.
+"""
+from datetime import datetime
+from typing import Optional
+
+from models import db, LeaderboardEntry, Refutation
+
+
+def _upsert(user_id: int, values: dict, increments: dict) -> None:
+    """
+    Insert a leaderboard row for `user_id`, or apply `increments` to the
+    existing one. Uses INSERT ... ON CONFLICT where the dialect supports it.
+    """
+    table = LeaderboardEntry.__table__
+    now = datetime.utcnow()
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table).values(user_id=user_id, updated_at=now, **values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id],
+            set_=dict(increments, updated_at=now)
+        )
+        db.session.execute(stmt)
+        return
+
+    updated = db.session.execute(
+        table.update().where(table.c.user_id == user_id).values(updated_at=now, **increments)
+    ).rowcount
+    if not updated:
+        db.session.execute(table.insert().values(user_id=user_id, updated_at=now, **values))
+
+
+def record_refutation(user_id: int) -> None:
+    """Count a newly submitted refutation. Caller commits."""
+    table = LeaderboardEntry.__table__
+    _upsert(
+        user_id,
+        values={'total_refutations': 1, 'rated_refutations': 0, 'avg_rating': 0.0, 'total_earned': 0},
+        increments={'total_refutations': table.c.total_refutations + 1}
+    )
+
+
+def record_rating(user_id: int, rating: int, reward: int,
+                  previous_rating: Optional[int] = None, previous_reward: int = 0) -> None:
+    """
+    Fold a creator rating and its reward into the author's running average
+    and earnings. Pass the previous rating/reward when a rating is revised.
+    Caller commits.
+    """
+    table = LeaderboardEntry.__table__
+    if previous_rating is None:
+        increments = {
+            'rated_refutations': table.c.rated_refutations + 1,
+            'avg_rating': (table.c.avg_rating * table.c.rated_refutations + rating)
+                          / (table.c.rated_refutations + 1),
+            'total_earned': table.c.total_earned + reward
+        }
+    else:
+        increments = {
+            'avg_rating': table.c.avg_rating
+                          + (rating - previous_rating) * 1.0
+                          / db.case((table.c.rated_refutations > 0, table.c.rated_refutations), else_=1),
+            'total_earned': table.c.total_earned + (reward - previous_reward)
+        }
+    _upsert(
+        user_id,
+        values={'total_refutations': 1, 'rated_refutations': 1, 'avg_rating': float(rating), 'total_earned': reward},
+        increments=increments
+    )
+
+
+def rebuild_leaderboard() -> int:
+    """
+    Recompute every leaderboard row from the refutations table with a single
+    GROUP BY INSERT ... SELECT. Returns the number of rows written.
+    """
+    table = LeaderboardEntry.__table__
+    now = datetime.utcnow()
+    aggregate = db.select(
+        Refutation.author_id,
+        db.func.count(Refutation.id),
+        db.func.count(Refutation.creator_rating),
+        db.func.coalesce(db.func.avg(Refutation.creator_rating), 0.0),
+        db.func.coalesce(db.func.sum(Refutation.reward_earned), 0),
+        db.literal(now)
+    ).group_by(Refutation.author_id)
+
+    db.session.execute(table.delete())
+    result = db.session.execute(table.insert().from_select(
+        ['user_id', 'total_refutations', 'rated_refutations', 'avg_rating', 'total_earned', 'updated_at'],
+        aggregate
+    ))
+    db.session.commit()
+    return result.rowcount
+
+
+def top_entries(limit: int = 20):
+    """Top leaderboard entries by points earned, with their users eager-loaded."""
+    return LeaderboardEntry.query \
+        .options(db.joinedload(LeaderboardEntry.user)) \
+        .order_by(LeaderboardEntry.total_earned.desc()) \
+        .limit(limit).all()
@@ -0,0 +1,198 @@
+"""
+Points ledger for Falsifi
+
+Balances live in users.points but are only ever changed here, with a single
+SQL statement per change:
+
+    UPDATE users SET points = points - :x WHERE id = :id AND points >= :x RETURNING points
+
+so concurrent requests cannot lose updates or overdraw an account, and no
+row is locked for longer than the transaction that changes it. Every change
+appends a row to points_ledger in the same transaction.
+
+Periodic snapshots (`flask points-ledger snapshot`) record each user's
+ledger balance, so `flask points-ledger reconcile` only has to sum entries
+newer than the last snapshot to check that users.points matches the ledger.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+from models import db, User, PointsTransaction, PointsSnapshot
+
+# Entries younger than this are left out of snapshots, so a transaction that
+# took its ledger id earlier but commits later is never skipped over
+SNAPSHOT_LAG = timedelta(minutes=1)
+
+
+class InsufficientPoints(Exception):
+    """Raised when a debit would take a balance below zero."""
+
+    def __init__(self, user_id: int, amount: int):
+        super().__init__(f'User {user_id} has fewer than {amount} points')
+        self.user_id = user_id
+        self.amount = amount
+
+
+def _ref(ref) -> Dict:
+    if ref is None:
+        return {'ref_type': None, 'ref_id': None}
+    return {'ref_type': type(ref).__name__.lower(), 'ref_id': ref.id}
+
+
+def _apply(user_id: int, amount: int, reason: str, ref=None) -> int:
+    statement = db.update(User).where(User.id == user_id)
+    if amount < 0:
+        statement = statement.where(User.points >= -amount)
+    statement = statement.values(points=User.points + amount).returning(User.points) \
+        .execution_options(synchronize_session='fetch')
+    balance = db.session.execute(statement).scalar_one_or_none()
+    if balance is None:
+        raise InsufficientPoints(user_id, -amount)
+    db.session.add(PointsTransaction(user_id=user_id, amount=amount, balance_after=balance,
+                                     reason=reason, **_ref(ref)))
+    return balance
+
+
+def debit(user_id: int, amount: int, reason: str, ref=None) -> int:
+    """
+    Take `amount` points from a user in the current transaction and return the
+    new balance. Raises InsufficientPoints (nothing changes) if the balance is
+    too low. Caller commits, or rolls back on error.
+    """
+    if amount < 0:
+        raise ValueError('debit amount must not be negative')
+    if amount == 0:
+        return db.session.query(User.points).filter_by(id=user_id).scalar()
+    return _apply(user_id, -amount, reason, ref)
+
+
+def credit(user_id: int, amount: int, reason: str, ref=None) -> int:
+    """Give `amount` points to a user in the current transaction. Caller commits."""
+    if amount < 0:
+        raise ValueError('credit amount must not be negative')
+    if amount == 0:
+        return db.session.query(User.points).filter_by(id=user_id).scalar()
+    return _apply(user_id, amount, reason, ref)
+
+
+def credit_many(credits: Iterable[Tuple[int, int, int]], reason: str, ref_type: str) -> int:
+    """
+    Credit many (user id, amount, ref id) entries in the current transaction
+    with one executemany per table; amounts for the same user are summed.
+    balance_after is not recorded. Caller commits. Returns entries written.
+    """
+    entries = [{'user_id': user_id, 'amount': amount, 'reason': reason, 'ref_type': ref_type,
+                'ref_id': ref_id, 'created_at': datetime.utcnow()}
+               for user_id, amount, ref_id in credits if amount]
+    if any(entry['amount'] < 0 for entry in entries):
+        raise ValueError('credit amount must not be negative')
+    if not entries:
+        return 0
+
+    totals: Dict[int, int] = {}
+    for entry in entries:
+        totals[entry['user_id']] = totals.get(entry['user_id'], 0) + entry['amount']
+
+    # Users are updated in id order so concurrent batches cannot deadlock on Postgres
+    table = User.__table__
+    db.session.execute(
+        table.update().where(table.c.id == db.bindparam('row_id'))
+        .values(points=table.c.points + db.bindparam('delta')),
+        [{'row_id': user_id, 'delta': total} for user_id, total in sorted(totals.items())]
+    )
+    db.session.execute(db.insert(PointsTransaction), entries)
+    return len(entries)
+
+
+def transfer(from_user_id: int, to_user_id: int, amount: int, reason: str, ref=None) -> None:
+    """
+    Move points between users in the current transaction. Rows are updated in
+    id order so opposing transfers cannot deadlock on Postgres.
+    """
+    if from_user_id < to_user_id:
+        debit(from_user_id, amount, reason, ref)
+        credit(to_user_id, amount, reason, ref)
+    else:
+        credit(to_user_id, amount, reason, ref)
+        debit(from_user_id, amount, reason, ref)
+
+
+def record_opening_balances(reason: str = 'opening_balance') -> int:
+    """
+    Give every user without ledger entries one entry for their current
+    balance, so the ledger explains all existing points. Caller commits.
+    """
+    has_entries = db.select(PointsTransaction.id).where(PointsTransaction.user_id == User.id).exists()
+    result = db.session.execute(
+        db.insert(PointsTransaction).from_select(
+            ['user_id', 'amount', 'balance_after', 'reason', 'created_at'],
+            db.select(User.id, User.points, User.points, db.literal(reason), db.literal(datetime.utcnow()))
+            .where(~has_entries)
+        )
+    )
+    return result.rowcount
+
+
+def _latest_snapshots():
+    latest = db.select(PointsSnapshot.user_id, db.func.max(PointsSnapshot.id).label('snapshot_id')) \
+        .group_by(PointsSnapshot.user_id).subquery()
+    return db.select(PointsSnapshot.user_id, PointsSnapshot.ledger_id, PointsSnapshot.balance) \
+        .join(latest, PointsSnapshot.id == latest.c.snapshot_id).subquery()
+
+
+def snapshot(lag: timedelta = SNAPSHOT_LAG) -> int:
+    """
+    Record a new snapshot for every user with ledger entries since their last
+    one. Balances come from the ledger itself (previous snapshot plus newer
+    entries), not from users.points. Returns the number of snapshots written.
+    """
+    snapshots = _latest_snapshots()
+    cutoff = datetime.utcnow() - lag
+    new_rows = db.select(
+        PointsTransaction.user_id,
+        db.func.max(PointsTransaction.id),
+        db.func.coalesce(db.func.max(snapshots.c.balance), 0) + db.func.sum(PointsTransaction.amount),
+        db.literal(datetime.utcnow())
+    ).outerjoin(snapshots, snapshots.c.user_id == PointsTransaction.user_id) \
+     .where(PointsTransaction.id > db.func.coalesce(snapshots.c.ledger_id, 0),
+            PointsTransaction.created_at <= cutoff) \
+     .group_by(PointsTransaction.user_id)
+    result = db.session.execute(
+        db.insert(PointsSnapshot).from_select(['user_id', 'ledger_id', 'balance', 'created_at'], new_rows)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def reconcile(fix: bool = False) -> List[Dict]:
+    """
+    Compare every user's balance with the ledger (latest snapshot plus newer
+    entries). Returns the mismatches; with `fix`, resets those balances to
+    the ledger's figure.
+    """
+    snapshots = _latest_snapshots()
+    ledger_total = db.select(db.func.coalesce(db.func.sum(PointsTransaction.amount), 0)) \
+        .where(PointsTransaction.user_id == User.id,
+               PointsTransaction.id > db.func.coalesce(snapshots.c.ledger_id, 0)) \
+        .scalar_subquery()
+    rows = db.session.execute(
+        db.select(User.id, User.username, User.points,
+                  db.func.coalesce(snapshots.c.balance, 0) + ledger_total)
+        .outerjoin(snapshots, snapshots.c.user_id == User.id)
+        .order_by(User.id)
+    ).all()
+
+    mismatches = [
+        {'user_id': user_id, 'username': username, 'balance': balance, 'ledger_balance': expected,
+         'difference': balance - expected}
+        for user_id, username, balance, expected in rows if balance != expected
+    ]
+    if fix:
+        for row in mismatches:
+            db.session.execute(db.update(User).where(User.id == row['user_id'])
+                               .values(points=row['ledger_balance']))
+        db.session.commit()
+    else:
+        db.session.rollback()
+    return mismatches
+
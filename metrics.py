@@ -0,0 +1,146 @@
+"""
+Prometheus metrics for Falsifi
+
+Exposes request latency, per-request DB time and AI adjudicator behaviour at
+/metrics in the Prometheus text format. Under gunicorn, set
+PROMETHEUS_MULTIPROC_DIR to an empty writable directory before the workers
+start; every worker then writes its samples there and /metrics aggregates
+them (see gunicorn.conf.py for cleanup of exited workers).
+"""
+import os
+import time
+from typing import Dict
+
+from flask import Response, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+
+REQUEST_LATENCY = Histogram(
+    'falsifi_http_request_duration_seconds',
+    'HTTP request latency by endpoint',
+    ['endpoint', 'method', 'status'],
+    buckets=LATENCY_BUCKETS
+)
+REQUEST_DB_TIME = Histogram(
+    'falsifi_http_request_db_seconds',
+    'Time spent in the database per HTTP request',
+    ['endpoint'],
+    buckets=LATENCY_BUCKETS
+)
+REQUEST_DB_QUERIES = Histogram(
+    'falsifi_http_request_db_queries',
+    'SQL statements executed per HTTP request',
+    ['endpoint'],
+    buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+)
+
+ADJUDICATOR_CALL_LATENCY = Histogram(
+    'falsifi_adjudicator_call_duration_seconds',
+    'Latency of AI adjudicator model calls',
+    ['mode', 'outcome'],
+    buckets=LLM_BUCKETS
+)
+ADJUDICATOR_TOKENS = Counter(
+    'falsifi_adjudicator_tokens',
+    'Tokens reported by the model API',
+    ['kind']
+)
+ADJUDICATOR_EVALUATIONS = Counter(
+    'falsifi_adjudicator_evaluations',
+    'Refutations evaluated, by how the verdict was produced',
+    ['source']
+)
+ADJUDICATOR_FALLBACKS = Counter(
+    'falsifi_adjudicator_fallbacks',
+    'Heuristic fallback evaluations, by reason',
+    ['reason']
+)
+ADJUDICATOR_PARSE_ERRORS = Counter(
+    'falsifi_adjudicator_parse_errors',
+    'Model responses that could not be parsed',
+    ['mode']
+)
+ADJUDICATOR_RETRIES = Counter(
+    'falsifi_adjudicator_retries',
+    'Model calls retried after a retriable error, by error type',
+    ['reason']
+)
+ADJUDICATOR_BREAKER_TRANSITIONS = Counter(
+    'falsifi_adjudicator_breaker_transitions',
+    'Circuit breaker state changes for model calls',
+    ['from_state', 'to_state']
+)
+ADJUDICATION_CACHE_EVENTS = Counter(
+    'falsifi_adjudication_cache_events',
+    'Adjudication cache lookups and evictions, by event',
+    ['event']
+)
+
+
+def counter_totals(counter, label: str) -> Dict[str, float]:
+    """
+    Current values of a counter keyed by one of its labels.
+
+    With PROMETHEUS_MULTIPROC_DIR set this sums every process writing to
+    that directory, so a CLI command sees the web and worker processes.
+    """
+    registry = REGISTRY
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    totals = {}
+    for metric in registry.collect():
+        if metric.name != counter._name:
+            continue
+        for sample in metric.samples:
+            if sample.name.endswith('_total'):
+                key = sample.labels[label]
+                totals[key] = totals.get(key, 0) + sample.value
+    return totals
+
+
+def record_model_call(mode: str, started: float, response=None) -> None:
+    """Observe one chat completion call and the token usage it reported."""
+    outcome = 'ok' if response is not None else 'error'
+    ADJUDICATOR_CALL_LATENCY.labels(mode=mode, outcome=outcome).observe(time.perf_counter() - started)
+    usage = getattr(response, 'usage', None)
+    if usage is not None:
+        ADJUDICATOR_TOKENS.labels(kind='prompt').inc(getattr(usage, 'prompt_tokens', 0) or 0)
+        ADJUDICATOR_TOKENS.labels(kind='completion').inc(getattr(usage, 'completion_tokens', 0) or 0)
+
+
+def init_metrics(app) -> None:
+    """Time every request and register the /metrics endpoint."""
+
+    @app.before_request
+    def _start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        started = g.get('request_started')
+        if started is None or request.endpoint == 'metrics':
+            return response
+        endpoint = request.endpoint or 'unmatched'
+        REQUEST_LATENCY.labels(
+            endpoint=endpoint, method=request.method, status=response.status_code
+        ).observe(time.perf_counter() - started)
+
+        stats = g.get('sql_stats')
+        if stats is not None:
+            REQUEST_DB_TIME.labels(endpoint=endpoint).observe(stats['total_ms'] / 1000)
+            REQUEST_DB_QUERIES.labels(endpoint=endpoint).observe(stats['count'])
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        """Prometheus scrape endpoint."""
+        if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+            return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+        return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
@@ -0,0 +1,232 @@
+"""
+Schema migrations for Falsifi
+
+db.create_all() only creates missing tables; it never adds columns or
+indexes to tables that already exist. Each migration below brings an
+existing SQLite or Postgres database up to date with models.py, is
+idempotent (a fresh database created by create_all already has
+everything), and is recorded in schema_migrations once applied.
+
+Run with `flask migrate`; `flask check-indexes` verifies the hot queries
+are served by their indexes.
+"""
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy import inspect
+
+from models import db, SchemaMigration, SiteCounter, User, Bounty, Refutation, LeaderboardEntry, BountyStatus, \
+    BountyTermWeight
+
+MIGRATIONS: List[Tuple[str, str, Callable[[], None]]] = []
+
+
+def migration(version: str, description: str):
+    """Register a migration. Migrations run in registration order."""
+    def decorator(fn):
+        MIGRATIONS.append((version, description, fn))
+        return fn
+    return decorator
+
+
+def add_column(model, name: str) -> bool:
+    """ALTER TABLE ... ADD COLUMN for a model column missing from the database."""
+    conn = db.session.connection()
+    table = model.__table__
+    existing = {c['name'] for c in inspect(conn).get_columns(table.name)}
+    if name in existing:
+        return False
+
+    column = table.c[name]
+    preparer = conn.dialect.identifier_preparer
+    ddl = f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN ' \
+          f'{preparer.format_column(column)} {column.type.compile(dialect=conn.dialect)}'
+    if column.server_default is not None:
+        ddl += f' DEFAULT {column.server_default.arg}'
+        if not column.nullable:
+            ddl += ' NOT NULL'
+    conn.exec_driver_sql(ddl)
+    return True
+
+
+def create_indexes() -> None:
+    """Create any index declared in models.py that the database lacks."""
+    conn = db.session.connection()
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=conn, checkfirst=True)
+
+
+@migration('0000_leaderboard_rating_count', 'Add the leaderboard rating count and earnings index')
+def _leaderboard_rating_count():
+    from leaderboard import rebuild_leaderboard
+
+    add_column(LeaderboardEntry, 'rated_refutations')
+    conn = db.session.connection()
+    for index in LeaderboardEntry.__table__.indexes:
+        index.create(bind=conn, checkfirst=True)
+    db.session.commit()
+
+    rebuild_leaderboard()
+
+
+@migration('0001_denormalized_counters', 'Add and backfill counter columns')
+def _denormalized_counters():
+    add_column(User, 'bounty_count')
+    add_column(User, 'refutation_count')
+    add_column(Bounty, 'refutation_count')
+    db.session.commit()
+
+    # Backfilled here rather than with counters.recount_counters(), which later
+    # migrations extend to columns this database may not have yet
+    db.session.execute(db.update(Bounty).values(
+        refutation_count=db.select(db.func.count(Refutation.id))
+            .where(Refutation.bounty_id == Bounty.id).scalar_subquery()
+    ))
+    db.session.execute(db.update(User).values(
+        bounty_count=db.select(db.func.count(Bounty.id))
+            .where(Bounty.creator_id == User.id).scalar_subquery(),
+        refutation_count=db.select(db.func.count(Refutation.id))
+            .where(Refutation.author_id == User.id).scalar_subquery()
+    ))
+    db.session.commit()
+
+
+@migration('0002_hot_query_indexes', 'Create indexes for listing, detail, aggregate and leaderboard queries')
+def _hot_query_indexes():
+    create_indexes()
+
+
+@migration('0003_full_text_search', 'Create full-text search indexes and sync triggers')
+def _full_text_search():
+    import search
+    search.install()
+    search.rebuild()
+
+
+@migration('0004_export_order_index', 'Index refutations by creation order for streaming exports')
+def _export_order_index():
+    create_indexes()
+
+
+@migration('0005_site_counters', 'Create the striped site counters and backfill the home page totals')
+def _site_counters():
+    from counters import recount_site_counters
+    SiteCounter.__table__.create(bind=db.session.connection(), checkfirst=True)
+    recount_site_counters()
+    db.session.commit()
+
+
+@migration('0006_bounty_versions', 'Add bounty version stamps for API ETags')
+def _bounty_versions():
+    add_column(Bounty, 'version')
+    db.session.commit()
+
+
+@migration('0007_duplicate_index', 'Build the MinHash/LSH near-duplicate index')
+def _duplicate_index():
+    import duplicates
+    duplicates.rebuild()
+
+
+@migration('0008_related_bounties', 'Build the TF-IDF related-bounties index')
+def _related_bounties():
+    import related
+    create_indexes()
+    related.rebuild()
+
+
+@migration('0009_points_ledger', 'Record opening balances in the points ledger')
+def _points_ledger():
+    import ledger
+    ledger.record_opening_balances()
+
+
+@migration('0010_bounty_expiry', 'Create the index used by the bounty expiry sweeper')
+def _bounty_expiry():
+    create_indexes()
+
+
+def pending_migrations() -> List[str]:
+    applied = {version for (version,) in db.session.query(SchemaMigration.version)}
+    return [version for version, _, _ in MIGRATIONS if version not in applied]
+
+
+def run_migrations() -> List[str]:
+    """Create missing tables, then apply pending migrations. Returns versions applied."""
+    db.create_all()
+    pending = set(pending_migrations())
+    applied = []
+    for version, description, fn in MIGRATIONS:
+        if version not in pending:
+            continue
+        print(f"Applying {version}: {description}")
+        fn()
+        db.session.add(SchemaMigration(version=version))
+        db.session.commit()
+        applied.append(version)
+    return applied
+
+
+# ============== QUERY PLAN CHECKS ==============
+
+def hot_queries():
+    """(name, statement, expected index) for each hot access path."""
+    return [
+        ('bounties_newest',
+         db.select(Bounty.id).order_by(Bounty.created_at.desc(), Bounty.id.desc()).limit(20),
+         'ix_bounties_created_at_id'),
+        ('bounties_by_status',
+         db.select(Bounty.id).where(Bounty.status == BountyStatus.OPEN)
+           .order_by(Bounty.created_at.desc(), Bounty.id.desc()).limit(20),
+         'ix_bounties_status_created_at'),
+        ('bounties_due_to_expire',
+         db.select(Bounty.id).where(Bounty.status == BountyStatus.OPEN, Bounty.expires_at <= datetime(2000, 1, 1))
+           .order_by(Bounty.expires_at, Bounty.id).limit(500),
+         'ix_bounties_status_expires_at'),
+        ('bounties_by_category',
+         db.select(Bounty.id).where(Bounty.category == 'science')
+           .order_by(Bounty.created_at.desc(), Bounty.id.desc()).limit(20),
+         'ix_bounties_category_created_at'),
+        ('refutations_by_bounty',
+         db.select(Refutation.id).where(Refutation.bounty_id == 1)
+           .order_by(Refutation.created_at.desc()),
+         'ix_refutations_bounty_created_at'),
+        ('author_rating_aggregate',
+         db.select(db.func.avg(Refutation.creator_rating), db.func.count(Refutation.id))
+           .where(Refutation.author_id == 1, Refutation.creator_rating.isnot(None)),
+         'ix_refutations_author_rating'),
+        ('leaderboard_top',
+         db.select(LeaderboardEntry.id).order_by(LeaderboardEntry.total_earned.desc()).limit(20),
+         'ix_leaderboard_total_earned'),
+        ('related_postings',
+         db.select(BountyTermWeight.bounty_id, BountyTermWeight.weight).where(BountyTermWeight.term == 'proof')
+           .order_by(BountyTermWeight.weight.desc()).limit(500),
+         'ix_bounty_term_weights_term_weight'),
+    ]
+
+
+def explain(statement) -> str:
+    """Return the database's query plan for a statement as text."""
+    conn = db.session.connection()
+    sql = str(statement.compile(dialect=conn.dialect, compile_kwargs={'literal_binds': True}))
+    if conn.dialect.name == 'sqlite':
+        rows = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}').fetchall()
+        return '\n'.join(row[-1] for row in rows)
+
+    # Small tables make sequential scans look cheapest; ask whether an index path exists
+    conn.exec_driver_sql('SET LOCAL enable_seqscan = off')
+    rows = conn.exec_driver_sql(f'EXPLAIN {sql}').fetchall()
+    return '\n'.join(row[0] for row in rows)
+
+
+def check_query_plans() -> List[Tuple[str, bool, str]]:
+    """Explain every hot query. Returns (name, uses expected index, plan)."""
+    results = []
+    try:
+        for name, statement, index_name in hot_queries():
+            plan = explain(statement)
+            results.append((name, index_name in plan, plan))
+    finally:
+        db.session.rollback()
+    return results
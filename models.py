@@ -18,6 +18,12 @@ class AdjudicationStatus(enum.Enum):
     REJECTED = "rejected"
     FLAGGED = "flagged"  # AI flagged for human review
 
+class JobStatus(enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
 class User(db.Model):
     __tablename__ = 'users'
     
@@ -28,6 +34,10 @@ class User(db.Model):
     reputation_score = db.Column(db.Float, default=0.0)  # 0-100
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Denormalized counters, maintained on insert (see `flask recount`)
+    bounty_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    refutation_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    
     # Relationships
     bounties = db.relationship('Bounty', backref='creator', lazy=True)
     refutations = db.relationship('Refutation', backref='author', lazy=True)
@@ -41,12 +51,20 @@ class User(db.Model):
             'username': self.username,
             'points': self.points,
             'reputation_score': round(self.reputation_score, 2),
-            'bounties_created': len(self.bounties),
-            'refutations_submitted': len(self.refutations)
+            'bounties_created': self.bounty_count,
+            'refutations_submitted': self.refutation_count
         }
 
 class Bounty(db.Model):
     __tablename__ = 'bounties'
+    __table_args__ = (
+        # Listing pages: optional status/category filter, newest first (keyset on created_at, id)
+        db.Index('ix_bounties_created_at_id', 'created_at', 'id'),
+        db.Index('ix_bounties_status_created_at', 'status', 'created_at', 'id'),
+        db.Index('ix_bounties_category_created_at', 'category', 'created_at', 'id'),
+        # Expiry sweeper: due open bounties in expiry order
+        db.Index('ix_bounties_status_expires_at', 'status', 'expires_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -59,6 +77,11 @@ class Bounty(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     expires_at = db.Column(db.DateTime, nullable=True)
     
+    # Denormalized counter, maintained on insert (see `flask recount`)
+    refutation_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    # Bumped whenever the bounty or any of its refutations changes; the API ETag
+    version = db.Column(db.Integer, default=1, server_default='1', nullable=False)
+    
     # Relationships
     refutations = db.relationship('Refutation', backref='bounty', lazy=True)
     
@@ -76,12 +99,20 @@ class Bounty(db.Model):
             'status': self.status.value,
             'auto_adjudicate': self.auto_adjudicate,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'refutation_count': len(self.refutations),
+            'refutation_count': self.refutation_count,
             'is_open': self.status == BountyStatus.OPEN
         }
 
 class Refutation(db.Model):
     __tablename__ = 'refutations'
+    __table_args__ = (
+        # Bounty detail page: a bounty's refutations, newest first
+        db.Index('ix_refutations_bounty_created_at', 'bounty_id', 'created_at'),
+        # Reputation/leaderboard aggregates over an author's rated refutations
+        db.Index('ix_refutations_author_rating', 'author_id', 'creator_rating'),
+        # NDJSON export and `since=` pulls walk refutations in creation order
+        db.Index('ix_refutations_created_at_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     bounty_id = db.Column(db.Integer, db.ForeignKey('bounties.id'), nullable=False)
@@ -133,8 +164,9 @@ class LeaderboardEntry(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), unique=True, nullable=False)
     total_refutations = db.Column(db.Integer, default=0)
+    rated_refutations = db.Column(db.Integer, default=0)  # Denominator for avg_rating
     avg_rating = db.Column(db.Float, default=0.0)
-    total_earned = db.Column(db.Integer, default=0)
+    total_earned = db.Column(db.Integer, default=0, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     user = db.relationship('User', backref='leaderboard_entry', lazy=True)
@@ -146,4 +178,190 @@ class LeaderboardEntry(db.Model):
             'total_refutations': self.total_refutations,
             'avg_rating': round(self.avg_rating, 2),
             'total_earned': self.total_earned
-        }
\ No newline at end of file
+        }
+
+class AdjudicationJob(db.Model):
+    """Persistent queue entry for deferred AI adjudication of a refutation"""
+    __tablename__ = 'adjudication_jobs'
+    __table_args__ = (
+        db.Index('ix_adjudication_jobs_status_available_at', 'status', 'available_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    refutation_id = db.Column(db.Integer, db.ForeignKey('refutations.id'), nullable=False, index=True)
+    status = db.Column(db.Enum(JobStatus), default=JobStatus.QUEUED, nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    max_attempts = db.Column(db.Integer, default=3, nullable=False)
+    # A queued job is claimable once available_at has passed; a running job
+    # whose available_at has passed is assumed abandoned (visibility timeout).
+    available_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    locked_by = db.Column(db.String(100), nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    refutation = db.relationship('Refutation', backref='adjudication_jobs', lazy=True)
+    
+    def __repr__(self):
+        return f'<AdjudicationJob {self.id} {self.status.value}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'refutation_id': self.refutation_id,
+            'status': self.status.value,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'available_at': self.available_at.isoformat() if self.available_at else None,
+            'locked_by': self.locked_by,
+            'last_error': self.last_error
+        }
+
+class AdjudicationCacheEntry(db.Model):
+    """Persistent tier of the content-addressed adjudication result cache"""
+    __tablename__ = 'adjudication_cache'
+    
+    key = db.Column(db.String(64), primary_key=True)  # sha256 hex digest
+    result = db.Column(db.Text, nullable=False)  # JSON-encoded adjudicator result
+    hit_count = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<AdjudicationCacheEntry {self.key[:12]}>'
+
+
+class RefutationSignature(db.Model):
+    """MinHash signature of a refutation's content (see duplicates.py)"""
+    __tablename__ = 'refutation_signatures'
+    
+    refutation_id = db.Column(db.Integer, db.ForeignKey('refutations.id'), primary_key=True)
+    signature = db.Column(db.LargeBinary, nullable=False)  # NUM_PERM little-endian uint32 values
+
+
+class LshBucket(db.Model):
+    """One LSH band of a refutation's signature; refutations sharing a bucket are candidates"""
+    __tablename__ = 'lsh_buckets'
+    __table_args__ = (
+        db.Index('ix_lsh_buckets_band_bucket', 'band', 'bucket'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    band = db.Column(db.SmallInteger, nullable=False)
+    bucket = db.Column(db.BigInteger, nullable=False)
+    refutation_id = db.Column(db.Integer, db.ForeignKey('refutations.id'), nullable=False, index=True)
+
+
+class DuplicateMatch(db.Model):
+    """A refutation detected as a near-duplicate of an earlier one"""
+    __tablename__ = 'refutation_duplicates'
+    
+    refutation_id = db.Column(db.Integer, db.ForeignKey('refutations.id'), primary_key=True)
+    # Always the earliest refutation of the cluster, so clusters are one GROUP BY
+    duplicate_of_id = db.Column(db.Integer, db.ForeignKey('refutations.id'), nullable=False, index=True)
+    similarity = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    refutation = db.relationship('Refutation', foreign_keys=[refutation_id], lazy=True)
+    duplicate_of = db.relationship('Refutation', foreign_keys=[duplicate_of_id], lazy=True)
+
+
+class TfidfTerm(db.Model):
+    """Vocabulary and document frequencies of the related-bounties index (see related.py)"""
+    __tablename__ = 'tfidf_terms'
+    
+    term = db.Column(db.String(100), primary_key=True)
+    df = db.Column(db.Integer, nullable=False)
+
+
+class BountyTermWeight(db.Model):
+    """L2-normalized TF-IDF weight of a term in a bounty; an inverted index by term"""
+    __tablename__ = 'bounty_term_weights'
+    __table_args__ = (
+        # A term's heaviest postings first, so new bounties read only the top of each list
+        db.Index('ix_bounty_term_weights_term_weight', 'term', 'weight'),
+    )
+    
+    term = db.Column(db.String(100), primary_key=True)
+    bounty_id = db.Column(db.Integer, db.ForeignKey('bounties.id'), primary_key=True)
+    weight = db.Column(db.Float, nullable=False)
+
+
+class RelatedBounty(db.Model):
+    """Precomputed top-k most similar bounties for each bounty"""
+    __tablename__ = 'related_bounties'
+    __table_args__ = (
+        db.Index('ix_related_bounties_bounty_score', 'bounty_id', 'score'),
+    )
+    
+    bounty_id = db.Column(db.Integer, db.ForeignKey('bounties.id'), primary_key=True)
+    related_id = db.Column(db.Integer, db.ForeignKey('bounties.id'), primary_key=True)
+    score = db.Column(db.Float, nullable=False)  # Cosine similarity, 0-1
+    
+    related = db.relationship('Bounty', foreign_keys=[related_id], lazy=True)
+
+
+class PointsTransaction(db.Model):
+    """Append-only record of every change to a user's points (see ledger.py)"""
+    __tablename__ = 'points_ledger'
+    __table_args__ = (
+        db.Index('ix_points_ledger_user_id_id', 'user_id', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    amount = db.Column(db.Integer, nullable=False)  # Positive credit, negative debit
+    balance_after = db.Column(db.Integer, nullable=True)  # Not recorded for bulk imports
+    reason = db.Column(db.String(50), nullable=False)
+    ref_type = db.Column(db.String(20), nullable=True)  # 'bounty' or 'refutation'
+    ref_id = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class PointsSnapshot(db.Model):
+    """A user's balance as of a ledger entry, so reconciliation only sums newer entries"""
+    __tablename__ = 'points_snapshots'
+    __table_args__ = (
+        db.Index('ix_points_snapshots_user_id_id', 'user_id', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    ledger_id = db.Column(db.Integer, nullable=False)  # Last points_ledger.id included
+    balance = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class SweepCheckpoint(db.Model):
+    """Progress of a batched sweep (see expiry.py), so an interrupted run resumes where it stopped"""
+    __tablename__ = 'sweep_checkpoints'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    cutoff = db.Column(db.DateTime, nullable=True)  # Run in progress: rows due by this time
+    last_expires_at = db.Column(db.DateTime, nullable=True)  # Keyset position within the run
+    last_id = db.Column(db.Integer, default=0, nullable=False)
+    processed = db.Column(db.Integer, default=0, nullable=False)  # Rows handled in this run
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class SiteCounter(db.Model):
+    """One stripe of a maintained site-wide aggregate, e.g. total_bounties (see counters.py)"""
+    __tablename__ = 'site_counters'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    # A counter's value is the sum over its stripes, so concurrent writers rarely share a row
+    shard = db.Column(db.SmallInteger, primary_key=True, default=0, server_default='0')
+    value = db.Column(db.Integer, default=0, nullable=False)
+    
+    def __repr__(self):
+        return f'<SiteCounter {self.name}[{self.shard}]={self.value}>'
+
+
+class SchemaMigration(db.Model):
+    """Migrations applied to this database (see migrations.py)"""
+    __tablename__ = 'schema_migrations'
+    
+    version = db.Column(db.String(100), primary_key=True)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
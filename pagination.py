@@ -0,0 +1,89 @@
+"""
+Keyset (cursor) pagination helpers for Falsifi
+
+Pages are ordered newest first by (created_at, id). A cursor encodes the
+sort key of the row at a page edge, so every page is a bounded index range
+scan no matter how deep it is.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from models import db
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def page_size(value, default: int = DEFAULT_PAGE_SIZE) -> int:
+    """Clamp a requested page size to 1..MAX_PAGE_SIZE."""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def encode_cursor(created_at: datetime, row_id: int, direction: str) -> str:
+    """Encode a page edge as an opaque URL-safe token."""
+    raw = json.dumps([created_at.isoformat(), row_id, direction]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: Optional[str]) -> Optional[Tuple[datetime, int, str]]:
+    """Decode a cursor token. Returns None for a missing or malformed cursor."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        created_at, row_id, direction = json.loads(raw)
+        if direction not in ('next', 'prev'):
+            return None
+        return datetime.fromisoformat(created_at), int(row_id), direction
+    except (ValueError, TypeError):
+        return None
+
+
+def keyset_page(query, model, cursor: Optional[str], limit: int) -> Tuple[List, Optional[str], Optional[str]]:
+    """
+    Fetch one page of `query` ordered by (created_at, id) descending.
+
+    Returns (items, next_cursor, prev_cursor); a cursor is None when there is
+    no page in that direction.
+    """
+    decoded = decode_cursor(cursor)
+    sort_key = db.tuple_(model.created_at, model.id)
+
+    if decoded is None:
+        direction = 'next'
+        rows = query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1).all()
+    else:
+        created_at, row_id, direction = decoded
+        if direction == 'next':
+            rows = query.filter(sort_key < (created_at, row_id)) \
+                        .order_by(model.created_at.desc(), model.id.desc()) \
+                        .limit(limit + 1).all()
+        else:
+            # Walk backwards from the cursor, then restore newest-first order
+            rows = query.filter(sort_key > (created_at, row_id)) \
+                        .order_by(model.created_at.asc(), model.id.asc()) \
+                        .limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    items = rows[:limit]
+    if direction == 'prev':
+        items.reverse()
+
+    if not items:
+        return items, None, None
+
+    first, last = items[0], items[-1]
+    if direction == 'next':
+        has_next, has_prev = has_more, decoded is not None
+    else:
+        has_next, has_prev = True, has_more
+
+    next_cursor = encode_cursor(last.created_at, last.id, 'next') if has_next else None
+    prev_cursor = encode_cursor(first.created_at, first.id, 'prev') if has_prev else None
+    return items, next_cursor, prev_cursor
@@ -0,0 +1,247 @@
+"""
+Related-bounties index for Falsifi
+
+Bounties are represented as TF-IDF vectors over their title (counted
+twice) and description: sublinear term frequency, smoothed IDF, L2
+normalized, so the dot product of two vectors is their cosine similarity.
+
+`flask rebuild-related-bounties` builds everything offline with a SciPy
+sparse matrix: the vocabulary (tfidf_terms), every bounty's term weights
+(bounty_term_weights, which doubles as an inverted index by term) and
+the top-k neighbours of every bounty (related_bounties).
+
+New bounties are added incrementally with index_bounty(): their vector
+uses the stored document frequencies, candidates come from the postings
+of their most informative terms (the heaviest POSTINGS_PER_TERM of
+each), and they are inserted into the
+neighbour lists of the bounties they are most similar to. Document
+frequencies drift as bounties are added; rebuild periodically.
+"""
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from models import db, Bounty, TfidfTerm, BountyTermWeight, RelatedBounty
+from counters import site_counter
+
+DEFAULT_TOP_K = 10
+# Terms of a new bounty used to gather candidates; the rarest carry most of the similarity
+QUERY_TERMS = 20
+# Postings read per query term, heaviest first; common terms would otherwise scan most of the index
+POSTINGS_PER_TERM = 500
+MIN_SCORE = 0.05
+BATCH_SIZE = 1000
+SCORE_BLOCK = 256
+
+STOPWORDS = frozenset('''
+    a an and are as at be been but by can could did do does for from had has have how i if in
+    into is it its more most no not of on or our so such than that the their them then there
+    these they this those to was we were what when which who why will with would you your
+'''.split())
+
+
+def tokenize(title: str, description: str) -> Counter:
+    """Term counts for a bounty; title terms count twice."""
+    def words(text):
+        return [w for w in re.findall(r'[^\W\d_]{2,}', (text or '').lower()) if w not in STOPWORDS]
+    counts = Counter(words(description))
+    for word in words(title):
+        counts[word] += 2
+    return counts
+
+
+def idf(df: int, documents: int) -> float:
+    return math.log((1 + documents) / (1 + df)) + 1
+
+
+def _weights(counts: Counter, dfs: Dict[str, int], documents: int) -> Dict[str, float]:
+    """L2-normalized TF-IDF weights for one bounty's term counts."""
+    raw = {term: (1 + math.log(count)) * idf(dfs.get(term, 0), documents)
+           for term, count in counts.items()}
+    norm = math.sqrt(sum(w * w for w in raw.values())) or 1.0
+    return {term: w / norm for term, w in raw.items()}
+
+
+def related_bounties(bounty_id: int, limit: int = DEFAULT_TOP_K) -> List[Tuple[Bounty, float]]:
+    """A bounty's precomputed neighbours, most similar first (one indexed query)."""
+    rows = db.session.query(Bounty, RelatedBounty.score) \
+        .join(RelatedBounty, RelatedBounty.related_id == Bounty.id) \
+        .filter(RelatedBounty.bounty_id == bounty_id) \
+        .order_by(RelatedBounty.score.desc()).limit(limit).all()
+    return [(bounty, score) for bounty, score in rows]
+
+
+# ============== OFFLINE BUILD ==============
+
+def rebuild(top_k: int = DEFAULT_TOP_K) -> int:
+    """Rebuild the vocabulary, term weights and neighbour lists. Returns bounties indexed."""
+    from scipy import sparse  # Only the offline rebuild needs SciPy; keep it out of app startup
+
+    ids, docs = [], []
+    last_id = 0
+    while True:
+        rows = db.session.query(Bounty.id, Bounty.title, Bounty.description) \
+            .filter(Bounty.id > last_id).order_by(Bounty.id).limit(BATCH_SIZE).all()
+        if not rows:
+            break
+        for bounty_id, title, description in rows:
+            ids.append(bounty_id)
+            docs.append(tokenize(title, description))
+        last_id = rows[-1][0]
+
+    vocabulary: Dict[str, int] = {}
+    indptr, indices, data = [0], [], []
+    for counts in docs:
+        for term, count in counts.items():
+            indices.append(vocabulary.setdefault(term, len(vocabulary)))
+            data.append(1 + math.log(count))
+        indptr.append(len(indices))
+
+    matrix = sparse.csr_matrix((np.array(data, dtype=np.float64), indices, indptr),
+                               shape=(len(ids), len(vocabulary)))
+    dfs = np.bincount(matrix.indices, minlength=len(vocabulary))
+    idfs = np.log((1 + len(ids)) / (1 + dfs)) + 1
+    matrix = matrix @ sparse.diags(idfs)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    matrix = sparse.csr_matrix(sparse.diags(1 / norms) @ matrix)
+
+    db.session.execute(db.delete(RelatedBounty))
+    db.session.execute(db.delete(BountyTermWeight))
+    db.session.execute(db.delete(TfidfTerm))
+    terms = list(vocabulary)
+    for start in range(0, len(terms), BATCH_SIZE):
+        db.session.execute(db.insert(TfidfTerm), [
+            {'term': term, 'df': int(dfs[vocabulary[term]])} for term in terms[start:start + BATCH_SIZE]
+        ])
+
+    # Similarities are computed a few hundred rows at a time: a block of the
+    # product can be nearly dense when bounties share common terms
+    transposed = matrix.T.tocsr()
+    for start in range(0, len(ids), SCORE_BLOCK):
+        block = matrix[start:start + SCORE_BLOCK]
+        scores = (block @ transposed).tocsr()
+        weight_rows, related_rows = [], []
+        for offset in range(block.shape[0]):
+            bounty_id = ids[start + offset]
+            lo, hi = block.indptr[offset], block.indptr[offset + 1]
+            weight_rows.extend({'term': terms[col], 'bounty_id': bounty_id, 'weight': float(w)}
+                               for col, w in zip(block.indices[lo:hi], block.data[lo:hi]))
+
+            lo, hi = scores.indptr[offset], scores.indptr[offset + 1]
+            cols, values = scores.indices[lo:hi], scores.data[lo:hi]
+            keep = (values >= MIN_SCORE) & (cols != start + offset)
+            cols, values = cols[keep], values[keep]
+            if len(values) > top_k:
+                best = np.argpartition(-values, top_k - 1)[:top_k]
+                cols, values = cols[best], values[best]
+            neighbours = sorted(((ids[col], float(score)) for col, score in zip(cols, values)),
+                                key=lambda item: (-item[1], item[0]))
+            related_rows.extend({'bounty_id': bounty_id, 'related_id': related_id, 'score': score}
+                                for related_id, score in neighbours)
+        if weight_rows:
+            db.session.execute(db.insert(BountyTermWeight), weight_rows)
+        if related_rows:
+            db.session.execute(db.insert(RelatedBounty), related_rows)
+
+    db.session.commit()
+    return len(ids)
+
+
+# ============== INCREMENTAL UPDATES ==============
+
+def index_bounty(bounty: Bounty, top_k: int = DEFAULT_TOP_K) -> int:
+    """
+    Add a new (flushed) bounty to the index and the neighbour lists.
+    Caller commits. Returns the number of neighbours found.
+    """
+    counts = tokenize(bounty.title, bounty.description)
+    if not counts:
+        return 0
+
+    dfs = {term: df for term, df in db.session.query(TfidfTerm.term, TfidfTerm.df)
+           .filter(TfidfTerm.term.in_(list(counts)))}
+    weights = _weights(counts, dfs, max(site_counter('total_bounties'), 1))
+
+    query_terms = sorted(weights, key=lambda term: -weights[term])[:QUERY_TERMS]
+    scores: Dict[int, float] = {}
+    for other_id, term, weight in db.session.execute(_postings(query_terms, bounty.id)):
+        scores[other_id] = scores.get(other_id, 0.0) + weight * weights[term]
+    neighbours = sorted(((other_id, score) for other_id, score in scores.items() if score >= MIN_SCORE),
+                        key=lambda item: (-item[1], item[0]))[:top_k]
+
+    _count_terms(sorted(counts))
+    db.session.execute(db.insert(BountyTermWeight), [
+        {'term': term, 'bounty_id': bounty.id, 'weight': weight} for term, weight in weights.items()
+    ])
+
+    if neighbours:
+        db.session.execute(db.insert(RelatedBounty), [
+            {'bounty_id': bounty.id, 'related_id': other_id, 'score': score} for other_id, score in neighbours
+        ])
+        _offer_to_neighbours(bounty.id, neighbours, top_k)
+    return len(neighbours)
+
+
+def _postings(terms: List[str], bounty_id: int):
+    """(bounty_id, term, weight) of the heaviest postings of each term, one statement."""
+    selects = []
+    for term in terms:
+        top = db.select(BountyTermWeight.bounty_id, BountyTermWeight.term, BountyTermWeight.weight) \
+            .where(BountyTermWeight.term == term, BountyTermWeight.bounty_id != bounty_id) \
+            .order_by(BountyTermWeight.weight.desc()).limit(POSTINGS_PER_TERM).subquery()
+        selects.append(db.select(top))
+    return db.union_all(*selects)
+
+
+def _count_terms(terms: List[str]) -> None:
+    """
+    Count a new bounty in the document frequency of each of its terms,
+    adding terms seen for the first time. Uses INSERT ... ON CONFLICT where
+    the dialect supports it, so bounties created concurrently that share a
+    new term do not collide on its primary key.
+    """
+    table = TfidfTerm.__table__
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table).values([{'term': term, 'df': 1} for term in terms])
+        stmt = stmt.on_conflict_do_update(index_elements=[table.c.term], set_={'df': table.c.df + 1})
+        db.session.execute(stmt)
+        return
+
+    for term in terms:
+        updated = db.session.execute(table.update().where(table.c.term == term).values(df=table.c.df + 1)).rowcount
+        if not updated:
+            db.session.execute(table.insert().values(term=term, df=1))
+
+
+def _offer_to_neighbours(bounty_id: int, neighbours: List[Tuple[int, float]], top_k: int) -> None:
+    """Add the new bounty to each neighbour's list if it beats that list's weakest entry."""
+    current: Dict[int, List[Tuple[float, int]]] = {}
+    for owner_id, related_id, score in db.session.query(
+            RelatedBounty.bounty_id, RelatedBounty.related_id, RelatedBounty.score) \
+            .filter(RelatedBounty.bounty_id.in_([other_id for other_id, _ in neighbours])):
+        current.setdefault(owner_id, []).append((score, related_id))
+
+    inserts, evictions = [], []
+    for other_id, score in neighbours:
+        entries = current.get(other_id, [])
+        weakest: Optional[Tuple[float, int]] = min(entries) if entries else None
+        if len(entries) < top_k:
+            inserts.append({'bounty_id': other_id, 'related_id': bounty_id, 'score': score})
+        elif weakest is not None and score > weakest[0]:
+            inserts.append({'bounty_id': other_id, 'related_id': bounty_id, 'score': score})
+            evictions.append((other_id, weakest[1]))
+
+    for owner_id, related_id in evictions:
+        RelatedBounty.query.filter_by(bounty_id=owner_id, related_id=related_id).delete()
+    if inserts:
+        db.session.execute(db.insert(RelatedBounty), inserts)
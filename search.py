@@ -0,0 +1,217 @@
+"""
+Full-text search over bounties and refutations for Falsifi
+
+SQLite uses FTS5 external-content tables kept in sync by triggers on
+insert, update and delete. Postgres stores each row's tsvector in a
+generated search_vector column, which the database keeps up to date, and
+indexes it with GIN; searches filter and rank on the stored vector rather
+than recomputing to_tsvector() for every matching row. Both weight a title
+match four times a description match. Other databases fall back to
+unindexed LIKE matching.
+"""
+import re
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+from models import db
+
+SQLITE_SETUP = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS bounties_fts USING fts5(
+        title, description, content='bounties', content_rowid='id', tokenize='porter unicode61')""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS refutations_fts USING fts5(
+        content, content='refutations', content_rowid='id', tokenize='porter unicode61')""",
+    """CREATE TRIGGER IF NOT EXISTS bounties_fts_insert AFTER INSERT ON bounties BEGIN
+        INSERT INTO bounties_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS bounties_fts_delete AFTER DELETE ON bounties BEGIN
+        INSERT INTO bounties_fts(bounties_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS bounties_fts_update AFTER UPDATE OF title, description ON bounties BEGIN
+        INSERT INTO bounties_fts(bounties_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO bounties_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS refutations_fts_insert AFTER INSERT ON refutations BEGIN
+        INSERT INTO refutations_fts(rowid, content) VALUES (new.id, new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS refutations_fts_delete AFTER DELETE ON refutations BEGIN
+        INSERT INTO refutations_fts(refutations_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS refutations_fts_update AFTER UPDATE OF content ON refutations BEGIN
+        INSERT INTO refutations_fts(refutations_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO refutations_fts(rowid, content) VALUES (new.id, new.content);
+    END""",
+]
+
+# Titles are weighted A and descriptions C; RANK_WEIGHTS (D, C, B, A) makes a title match count 4x
+BOUNTY_TSVECTOR = ("setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+                   "setweight(to_tsvector('english', coalesce(description, '')), 'C')")
+REFUTATION_TSVECTOR = "to_tsvector('english', coalesce(content, ''))"
+RANK_WEIGHTS = "'{0.1, 0.25, 0.4, 1.0}'"
+
+POSTGRES_SETUP = [
+    f"ALTER TABLE bounties ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    f"GENERATED ALWAYS AS ({BOUNTY_TSVECTOR}) STORED",
+    f"ALTER TABLE refutations ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    f"GENERATED ALWAYS AS ({REFUTATION_TSVECTOR}) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_bounties_search_vector ON bounties USING GIN (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_refutations_search_vector ON refutations USING GIN (search_vector)",
+]
+
+SNIPPET_LENGTH = 200
+
+
+def _dialect() -> str:
+    return db.session.get_bind().dialect.name
+
+
+def install() -> None:
+    """Create the search index objects for the current database. Idempotent."""
+    dialect = _dialect()
+    statements = SQLITE_SETUP if dialect == 'sqlite' else POSTGRES_SETUP if dialect == 'postgresql' else []
+    for statement in statements:
+        db.session.execute(db.text(statement))
+    db.session.commit()
+
+
+def rebuild() -> None:
+    """Rebuild the search indexes from the base tables."""
+    dialect = _dialect()
+    install()
+    if dialect == 'sqlite':
+        db.session.execute(db.text("INSERT INTO bounties_fts(bounties_fts) VALUES ('rebuild')"))
+        db.session.execute(db.text("INSERT INTO refutations_fts(refutations_fts) VALUES ('rebuild')"))
+        db.session.commit()
+    elif dialect == 'postgresql':
+        db.session.execute(db.text("REINDEX INDEX ix_bounties_search_vector"))
+        db.session.execute(db.text("REINDEX INDEX ix_refutations_search_vector"))
+        db.session.commit()
+
+
+@contextmanager
+def bulk_load() -> Iterator[None]:
+    """
+    Suspend search index upkeep for a large load and build the indexes once
+    at the end, which is far cheaper than indexing row by row. SQLite's
+    insert triggers or Postgres' GIN indexes are dropped meanwhile (the
+    generated search_vector columns are still filled row by row); the
+    final rebuild also covers rows written by other connections.
+    """
+    dialect = _dialect()
+    if dialect == 'sqlite':
+        statements = ["DROP TRIGGER IF EXISTS bounties_fts_insert", "DROP TRIGGER IF EXISTS refutations_fts_insert"]
+    elif dialect == 'postgresql':
+        statements = ["DROP INDEX IF EXISTS ix_bounties_search_vector",
+                      "DROP INDEX IF EXISTS ix_refutations_search_vector"]
+    else:
+        statements = []
+    for statement in statements:
+        db.session.execute(db.text(statement))
+    db.session.commit()
+    try:
+        yield
+    finally:
+        db.session.rollback()
+        install()
+        if dialect == 'sqlite':
+            rebuild()
+
+
+def fts5_query(query: str) -> str:
+    """
+    Turn free text into a safe FTS5 expression: every word must match, the
+    last word as a prefix. Returns '' if the text has no searchable words.
+    """
+    words = re.findall(r'\w+', query)
+    if not words:
+        return ''
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search(query: str, kind: str = 'bounties', limit: int = 20, offset: int = 0) -> List[Dict]:
+    """
+    Ranked search. `kind` is 'bounties' or 'refutations'. Each hit is a dict
+    with type, id, bounty_id, title, snippet and score (higher is better).
+    """
+    query = (query or '').strip()
+    if not query:
+        return []
+
+    dialect = _dialect()
+    params = {'limit': limit, 'offset': offset}
+
+    if dialect == 'sqlite':
+        params['q'] = fts5_query(query)
+        if not params['q']:
+            return []
+        if kind == 'refutations':
+            sql = f"""
+                SELECT r.id, r.bounty_id, b.title,
+                       substr(r.content, 1, {SNIPPET_LENGTH}) AS snippet,
+                       -bm25(refutations_fts) AS score
+                FROM refutations_fts
+                JOIN refutations r ON r.id = refutations_fts.rowid
+                JOIN bounties b ON b.id = r.bounty_id
+                WHERE refutations_fts MATCH :q
+                ORDER BY bm25(refutations_fts), r.id LIMIT :limit OFFSET :offset"""
+        else:
+            sql = f"""
+                SELECT b.id, b.id AS bounty_id, b.title,
+                       substr(b.description, 1, {SNIPPET_LENGTH}) AS snippet,
+                       -bm25(bounties_fts, 4.0, 1.0) AS score
+                FROM bounties_fts
+                JOIN bounties b ON b.id = bounties_fts.rowid
+                WHERE bounties_fts MATCH :q
+                ORDER BY bm25(bounties_fts, 4.0, 1.0), b.id LIMIT :limit OFFSET :offset"""
+
+    elif dialect == 'postgresql':
+        params['q'] = query
+        if kind == 'refutations':
+            sql = f"""
+                SELECT r.id, r.bounty_id, b.title,
+                       left(r.content, {SNIPPET_LENGTH}) AS snippet,
+                       ts_rank(r.search_vector, q) AS score
+                FROM refutations r
+                JOIN bounties b ON b.id = r.bounty_id,
+                     websearch_to_tsquery('english', :q) q
+                WHERE r.search_vector @@ q
+                ORDER BY score DESC, r.id LIMIT :limit OFFSET :offset"""
+        else:
+            sql = f"""
+                SELECT b.id, b.id AS bounty_id, b.title,
+                       left(b.description, {SNIPPET_LENGTH}) AS snippet,
+                       ts_rank({RANK_WEIGHTS}, b.search_vector, q) AS score
+                FROM bounties b, websearch_to_tsquery('english', :q) q
+                WHERE b.search_vector @@ q
+                ORDER BY score DESC, b.id LIMIT :limit OFFSET :offset"""
+
+    else:
+        params['q'] = f'%{query}%'
+        if kind == 'refutations':
+            sql = f"""
+                SELECT r.id, r.bounty_id, b.title, substr(r.content, 1, {SNIPPET_LENGTH}) AS snippet, 0 AS score
+                FROM refutations r JOIN bounties b ON b.id = r.bounty_id
+                WHERE r.content LIKE :q
+                ORDER BY r.created_at DESC LIMIT :limit OFFSET :offset"""
+        else:
+            sql = f"""
+                SELECT b.id, b.id AS bounty_id, b.title, substr(b.description, 1, {SNIPPET_LENGTH}) AS snippet, 0 AS score
+                FROM bounties b
+                WHERE b.title LIKE :q OR b.description LIKE :q
+                ORDER BY b.created_at DESC LIMIT :limit OFFSET :offset"""
+
+    rows = db.session.execute(db.text(sql), params).fetchall()
+    return [
+        {
+            'type': 'refutation' if kind == 'refutations' else 'bounty',
+            'id': row.id,
+            'bounty_id': row.bounty_id,
+            'title': row.title,
+            'snippet': row.snippet,
+            'score': round(float(row.score or 0), 4)
+        }
+        for row in rows
+    ]
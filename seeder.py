@@ -0,0 +1,273 @@
+"""
+Synthetic data generator for scale testing
+
+    flask seed --users 100000 --bounties 1000000 --refutations 10000000
+
+Distributions are chosen to look like a live site rather than a uniform grid:
+
+- user activity follows a Zipf law, so a few users create and refute a lot
+  and most users very little
+- refutations per bounty are skewed (lognormal popularity), so some bounties
+  collect hundreds of refutations and many none
+- bounty rewards, description and refutation lengths are lognormal; about
+  half of the refutations are rated 1-10 by the bounty's creator
+- ids follow creation time, as they would on a live site, and bounties past
+  their expiry are expired or closed
+
+Everything is drawn up front with numpy from one seed, so the same seed and
+sizes always produce the same rows. Rows are then written with multi-row
+INSERTs of `chunk_size` rows per transaction, texts being assembled from a
+fixed pool of generated sentences so building them is cheap.
+
+Denormalized counters, reputations and point balances are computed in
+numpy and written with the rows, and each user's balance is recorded as an
+opening_balance entry in the points ledger, so `flask recount` and
+`flask points-ledger reconcile` find nothing to fix. Search index upkeep is
+suspended during the load and the indexes built once afterwards, then the
+leaderboard is rebuilt.
+"""
+import time
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from itertools import accumulate
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from models import db, User, Bounty, Refutation, PointsTransaction, BountyStatus, AdjudicationStatus
+from counters import bump_site_counters
+from leaderboard import rebuild_leaderboard
+import search
+
+CHUNK_SIZE = 10000
+CATEGORIES = ('science', 'economics', 'history', 'technology', 'philosophy', 'health',
+              'politics', 'sports', 'general')
+BOUNTY_LIFETIME = timedelta(days=30)
+STARTING_POINTS = 1000
+
+VOCABULARY = (
+    'the of and to in that is for it as was with be by on not this are or from at which but have an they '
+    'more one all were their been has would there can if its than also other into only some these could '
+    'claim evidence study data argument model effect cause result trend sample analysis theory assumption '
+    'measure rate growth risk policy outcome survey report source review bias error signal noise population '
+    'period region market price cost benefit impact factor correlation mechanism experiment control baseline '
+    'estimate range variance consensus record history climate energy income health education trial dose '
+    'vaccine inflation wage employment productivity emission temperature ocean forest species crop yield '
+    'study authors paper journal replication meta statistical significant confidence interval effect size '
+    'causal confounder selection survivorship regression mean median outlier distribution probability '
+    'however therefore although because despite unless whereas moreover indeed clearly arguably likely'
+).split()
+# Zipf-like word frequencies: common words first
+WORD_WEIGHTS = 1.0 / np.arange(1, len(VOCABULARY) + 1) ** 0.9
+
+
+class TextPool:
+    """
+    Texts of a requested word count, cut from a long run of generated
+    sentences. Picking a start sentence and a length is all a text costs.
+    """
+
+    def __init__(self, rng: np.random.Generator, sentences: int = 4096):
+        words = np.asarray(VOCABULARY)[rng.choice(len(VOCABULARY), size=sentences * 24,
+                                                  p=WORD_WEIGHTS / WORD_WEIGHTS.sum())]
+        lengths = rng.integers(8, 25, size=sentences)
+        self.sentences, position = [], 0
+        for length in lengths:
+            sentence = ' '.join(words[position:position + length])
+            self.sentences.append(sentence[0].upper() + sentence[1:] + '.')
+            position += length
+        # Doubled so a text can run past the end without wrapping
+        self.sentences += self.sentences
+        self.ends = list(accumulate(len(s.split()) for s in self.sentences))
+
+    def text(self, start: int, words: int, paragraph_every: int = 5) -> str:
+        first_word = self.ends[start - 1] if start else 0
+        end = min(bisect_left(self.ends, first_word + words, start) + 1, len(self.sentences))
+        sentences = self.sentences[start:end]
+        return '\n\n'.join(' '.join(sentences[i:i + paragraph_every])
+                           for i in range(0, len(sentences), paragraph_every))
+
+    def title(self, start: int, words: int) -> str:
+        return ' '.join(self.sentences[start].split()[:words]).rstrip('.')[:200]
+
+    def __len__(self) -> int:
+        return len(self.sentences) // 2
+
+
+def zipf_weights(rng: np.random.Generator, n: int, exponent: float = 1.1) -> np.ndarray:
+    """Power-law weights over n items, in random order so ids don't predict activity."""
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    rng.shuffle(weights)
+    return weights / weights.sum()
+
+
+def _insert_returning_ids(model, rows: List[Dict]) -> List[int]:
+    table = model.__table__
+    return db.session.execute(
+        table.insert().returning(table.c.id, sort_by_parameter_order=True), rows
+    ).scalars().all()
+
+
+def generate(users: int, bounties: int, refutations: int, seed: int = 42, chunk_size: int = CHUNK_SIZE,
+             days: int = 365, prefix: str = 'seed', now: Optional[datetime] = None,
+             progress: Optional[Callable[[str, int, int], None]] = None) -> Dict:
+    """
+    Generate and insert the data. Usernames are `<prefix>_<n>`. Returns row
+    counts and timings. `progress(kind, done, total)` is called after every chunk.
+    """
+    if users < 2 and refutations:
+        raise ValueError('refutations need at least two users (authors cannot refute their own bounties)')
+    if bounties < 1 and refutations:
+        raise ValueError('refutations need at least one bounty')
+    started = time.perf_counter()
+    now = now or datetime.utcnow()
+    rng = np.random.default_rng(seed)
+    pool = TextPool(rng)
+    report = progress or (lambda kind, done, total: None)
+    span = days * 86400
+
+    # ----- Draw everything up front -----
+    activity = zipf_weights(rng, users)
+    joined_before = rng.integers(0, 90 * 86400, size=users)  # Everyone joined before the window opens
+    creators = rng.choice(users, size=bounties, p=activity).astype(np.int32)
+    bounty_offsets = np.sort(rng.integers(0, span, size=bounties))  # Seconds after the window start
+    amounts = np.clip(np.round(rng.lognormal(np.log(300), 0.7, size=bounties), -1), 10, 10000).astype(np.int64)
+    description_words = np.clip(rng.lognormal(np.log(250), 0.5, size=bounties), 30, 3000).astype(np.int32)
+    bounty_texts = rng.integers(0, len(pool), size=bounties)
+    title_words = rng.integers(5, 14, size=bounties)
+    categories = rng.integers(0, len(CATEGORIES), size=bounties)
+    closed_early = rng.random(size=bounties) < 0.1
+
+    popularity = rng.lognormal(0, 1.2, size=bounties)
+    targets = rng.choice(bounties, size=refutations, p=popularity / popularity.sum()).astype(np.int32)
+    authors = rng.choice(users, size=refutations, p=activity).astype(np.int32)
+    own = authors == creators[targets]
+    authors[own] = (authors[own] + 1) % users
+    # Refutations arrive after their bounty, mostly within days, and before it expires
+    delays = np.minimum(rng.exponential(3 * 86400, size=refutations), BOUNTY_LIFETIME.total_seconds() - 1)
+    refutation_offsets = np.minimum(bounty_offsets[targets] + delays, span).astype(np.int64)
+    order = np.argsort(refutation_offsets, kind='stable')
+    targets, authors, refutation_offsets = targets[order], authors[order], refutation_offsets[order]
+    ai_scores = np.clip(np.round(rng.normal(62, 18, size=refutations)), 0, 100).astype(np.int32)
+    ratings = np.where(rng.random(size=refutations) < 0.5, rng.binomial(9, 0.55, size=refutations) + 1, 0)
+    bonds = rng.choice(np.array([0, 10, 25, 50, 100]), size=refutations, p=[0.1, 0.2, 0.2, 0.4, 0.1])
+    refutation_words = np.clip(rng.lognormal(np.log(120), 0.7, size=refutations), 5, 2000).astype(np.int32)
+    refutation_texts = rng.integers(0, len(pool), size=refutations)
+    source_counts = rng.choice(4, size=refutations, p=[0.4, 0.3, 0.2, 0.1])
+    source_ids = rng.integers(1, 10 ** 7, size=refutations)
+
+    # Same formula as AIAdjudicator.calculate_reward and should_return_bond for rated refutations
+    rated = ratings > 0
+    rewards = np.where(rated, (0.7 * ratings / 10 + 0.3 * ai_scores / 100) * amounts[targets], 0).astype(np.int64)
+    bond_returned = rated & (ratings >= 5)
+
+    # ----- Derived counters and balances -----
+    start = now - timedelta(seconds=span)
+    expired = bounty_offsets + BOUNTY_LIFETIME.total_seconds() < span
+    statuses = np.where(expired, np.where(closed_early, 1, 2), np.where(closed_early, 1, 0))  # open, closed, expired
+    status_values = (BountyStatus.OPEN, BountyStatus.CLOSED, BountyStatus.EXPIRED)
+    refunded = np.bincount(creators, weights=np.where(statuses > 0, amounts, 0), minlength=users)
+    earned = np.bincount(authors, weights=rewards + np.where(bond_returned, bonds, 0), minlength=users)
+    # Starting balances just cover what each user spends, so the history never overdraws
+    balances = (STARTING_POINTS + refunded + earned).astype(np.int64)
+    user_bounties = np.bincount(creators, minlength=users)
+    user_refutations = np.bincount(authors, minlength=users)
+    rating_counts = np.bincount(authors, weights=rated, minlength=users)
+    rating_sums = np.bincount(authors, weights=ratings, minlength=users)
+    reputations = np.divide(rating_sums * 10, rating_counts, out=np.zeros(users), where=rating_counts > 0)
+    bounty_refutations = np.bincount(targets, minlength=bounties)
+    generated = time.perf_counter()
+
+    # Search indexes are built once at the end rather than row by row
+    with search.bulk_load():
+        # ----- Users -----
+        user_ids = np.zeros(users, dtype=np.int64)
+        for first in range(0, users, chunk_size):
+            last = min(first + chunk_size, users)
+            rows = [{
+                'username': f'{prefix}_{i}',
+                'email': f'{prefix}_{i}@example.com',
+                'points': int(balances[i]),
+                'reputation_score': float(reputations[i]),
+                'bounty_count': int(user_bounties[i]),
+                'refutation_count': int(user_refutations[i]),
+                'created_at': start - timedelta(seconds=int(joined_before[i])),
+            } for i in range(first, last)]
+            ids = _insert_returning_ids(User, rows)
+            user_ids[first:last] = ids
+            db.session.execute(PointsTransaction.__table__.insert(), [
+                {'user_id': user_id, 'amount': row['points'], 'balance_after': row['points'],
+                 'reason': 'opening_balance', 'created_at': row['created_at']}
+                for row, user_id in zip(rows, ids)
+            ])
+            bump_site_counters(total_users=last - first)
+            db.session.commit()
+            report('users', last, users)
+
+        # ----- Bounties -----
+        bounty_ids = np.zeros(bounties, dtype=np.int64)
+        for first in range(0, bounties, chunk_size):
+            last = min(first + chunk_size, bounties)
+            rows = []
+            for i in range(first, last):
+                created_at = start + timedelta(seconds=int(bounty_offsets[i]))
+                rows.append({
+                    'title': pool.title(int(bounty_texts[i]), int(title_words[i])),
+                    'description': pool.text(int(bounty_texts[i]), int(description_words[i])),
+                    'category': CATEGORIES[categories[i]],
+                    'bounty_amount': int(amounts[i]),
+                    'creator_id': int(user_ids[creators[i]]),
+                    'status': status_values[statuses[i]],
+                    'auto_adjudicate': True,
+                    'created_at': created_at,
+                    'expires_at': created_at + BOUNTY_LIFETIME,
+                    'refutation_count': int(bounty_refutations[i]),
+                    'version': 1 + int(bounty_refutations[i]),
+                })
+            bounty_ids[first:last] = _insert_returning_ids(Bounty, rows)
+            bump_site_counters(total_bounties=last - first,
+                               open_bounties=int(np.count_nonzero(statuses[first:last] == 0)))
+            db.session.commit()
+            report('bounties', last, bounties)
+
+        # ----- Refutations -----
+        for first in range(0, refutations, chunk_size):
+            last = min(first + chunk_size, refutations)
+            rows = []
+            for i in range(first, last):
+                score = int(ai_scores[i])
+                rating = int(ratings[i]) or None
+                sources = '\n'.join(f'https://example.org/papers/{source_ids[i] + n}' for n in range(source_counts[i]))
+                rows.append({
+                    'bounty_id': int(bounty_ids[targets[i]]),
+                    'author_id': int(user_ids[authors[i]]),
+                    'content': pool.text(int(refutation_texts[i]), int(refutation_words[i])),
+                    'sources': sources or None,
+                    'bond_amount': int(bonds[i]),
+                    'ai_score': float(score),
+                    'ai_feedback': f'Synthetic evaluation ({score}/100).',
+                    'adjudication_status': (AdjudicationStatus.APPROVED if score >= 60 else
+                                            AdjudicationStatus.FLAGGED if score >= 30 else AdjudicationStatus.REJECTED),
+                    'creator_rating': rating,
+                    'reward_earned': int(rewards[i]),
+                    'bond_returned': bool(bond_returned[i]),
+                    'created_at': start + timedelta(seconds=int(refutation_offsets[i])),
+                })
+            # Core insert: one executemany per chunk (the ORM bulk path splits rows by which values are NULL)
+            db.session.execute(Refutation.__table__.insert(), rows)
+            bump_site_counters(total_refutations=last - first)
+            db.session.commit()
+            report('refutations', last, refutations)
+
+        inserted = time.perf_counter()
+    rebuild_leaderboard()
+    finished = time.perf_counter()
+    return {
+        'users': users,
+        'bounties': bounties,
+        'refutations': refutations,
+        'generate_seconds': generated - started,
+        'insert_seconds': inserted - generated,
+        'index_seconds': finished - inserted,
+        'rows_per_second': (users + bounties + refutations) / max(inserted - generated, 1e-9),
+    }
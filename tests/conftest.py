@@ -0,0 +1,38 @@
+"""
+Shared fixtures for the Falsifi test suite
+
+The app reads DATABASE_URL when it is imported, so a fresh SQLite database
+is configured here first. The sample data is loaded once per session; tests
+that need rows of their own create them.
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_database_dir = tempfile.mkdtemp(prefix='falsifi-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_database_dir, 'test.db')}"
+os.environ.pop('OPENAI_API_KEY', None)
+os.environ.pop('PROMETHEUS_MULTIPROC_DIR', None)
+
+import pytest
+
+
+@pytest.fixture(scope='session')
+def app():
+    import app as falsifi
+    falsifi.setup_database()
+    return falsifi.app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def app_context(app):
+    with app.app_context():
+        yield
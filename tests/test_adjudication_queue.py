@@ -0,0 +1,124 @@
+"""
+Adjudication worker: claiming, visibility timeouts, retries and failures
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from adjudication_queue import AdjudicationWorker, enqueue_adjudication
+from ai_adjudicator import AIAdjudicator
+from circuit_breaker import CircuitBreaker, RetryPolicy
+from fake_llm import FakeLLM
+from models import db, AdjudicationJob, AdjudicationStatus, Bounty, JobStatus, Refutation, User
+
+CONTENT = ('The study cited measured correlation only; according to the 2019 replication '
+           'https://example.org/replication the effect disappears once income is controlled for.')
+
+
+@pytest.fixture
+def job(app, app_context):
+    """A queued job for a fresh refutation; its id, so tests can reload it from any session."""
+    creator = User(username='queue-creator', email='queue-creator@example.com')
+    author = User(username='queue-author', email='queue-author@example.com')
+    db.session.add_all([creator, author])
+    db.session.flush()
+    bounty = Bounty(title='Queue bounty', description='A claim to refute.', bounty_amount=100,
+                    creator_id=creator.id, auto_adjudicate=True)
+    db.session.add(bounty)
+    db.session.flush()
+    refutation = Refutation(bounty_id=bounty.id, author_id=author.id, content=CONTENT)
+    db.session.add(refutation)
+    db.session.flush()
+    job = enqueue_adjudication(refutation, max_attempts=2)
+    db.session.commit()
+    job_id = job.id
+    yield job_id
+
+    AdjudicationJob.query.filter_by(id=job_id).delete()
+    for model, row_id in ((Refutation, refutation.id), (Bounty, bounty.id), (User, author.id), (User, creator.id)):
+        model.query.filter_by(id=row_id).delete()
+    db.session.commit()
+
+
+def worker_for(app, adjudicator=None, **kwargs):
+    kwargs.setdefault('retry_delay', 0)
+    return AdjudicationWorker(app, adjudicator or AIAdjudicator(api_key=None), concurrency=2, **kwargs)
+
+
+def reload(job_id):
+    db.session.expire_all()
+    return db.session.get(AdjudicationJob, job_id)
+
+
+def test_run_once_scores_the_refutation_and_finishes_the_job(app, job):
+    assert worker_for(app).run_once() >= 1
+
+    finished = reload(job)
+    assert finished.status == JobStatus.DONE
+    assert finished.attempts == 1 and finished.locked_by is None
+    refutation = finished.refutation
+    assert refutation.ai_score is not None
+    assert refutation.ai_feedback
+    assert refutation.adjudication_status != AdjudicationStatus.PENDING
+
+
+def test_claim_is_hidden_until_the_visibility_timeout_passes(app, job):
+    worker = worker_for(app, visibility_timeout=300)
+    assert job in worker.claim_jobs(10)
+    assert job not in worker.claim_jobs(10)
+
+    # The claiming worker died; once the timeout has passed the job is claimed again
+    claimed = reload(job)
+    claimed.available_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    assert job in worker_for(app).claim_jobs(10)
+    assert reload(job).attempts == 2
+
+
+def test_abandoned_job_fails_once_its_attempts_are_used_up(app, job):
+    worker = worker_for(app, visibility_timeout=300)
+    for _ in range(2):
+        assert job in worker.claim_jobs(10)
+        claimed = reload(job)
+        claimed.available_at = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+
+    assert job not in worker.claim_jobs(10)
+    failed = reload(job)
+    assert failed.status == JobStatus.FAILED
+    assert failed.locked_by is None
+    assert 'visibility timeout' in failed.last_error
+
+
+def test_model_errors_are_retried_by_the_queue_until_the_job_fails(app, job):
+    with FakeLLM(error_rate=1.0, error_status=503) as fake:
+        adjudicator = AIAdjudicator(api_key='test', base_url=fake.base_url,
+                                    breaker=CircuitBreaker(failure_threshold=100),
+                                    retry_policy=RetryPolicy(max_attempts=1))
+        worker = worker_for(app, adjudicator)
+
+        worker.run_once()
+        retried = reload(job)
+        assert retried.status == JobStatus.QUEUED
+        assert retried.attempts == 1
+        assert 'InternalServerError' in retried.last_error
+        assert retried.refutation.ai_score is None
+
+        worker.run_once()
+    failed = reload(job)
+    assert failed.status == JobStatus.FAILED
+    assert failed.attempts == 2
+    assert failed.refutation.adjudication_status == AdjudicationStatus.PENDING
+
+
+def test_tripped_breaker_defers_the_job_without_using_an_attempt(app, job):
+    with FakeLLM(error_rate=1.0, error_status=503) as fake:
+        adjudicator = AIAdjudicator(api_key='test', base_url=fake.base_url,
+                                    breaker=CircuitBreaker(failure_threshold=1, cooldown=60),
+                                    retry_policy=RetryPolicy(max_attempts=1))
+        worker_for(app, adjudicator).run_once()
+
+    deferred = reload(job)
+    assert deferred.status == JobStatus.QUEUED
+    assert deferred.attempts == 0
+    assert deferred.available_at > datetime.utcnow() + timedelta(seconds=30)
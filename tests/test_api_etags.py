@@ -0,0 +1,42 @@
+"""
+Conditional GETs on /api/bounties: a page's ETag follows only the bounties on it
+"""
+from counters import bump_bounty_version
+from instrumentation import assert_max_queries
+from models import db, Bounty, User
+
+
+def test_list_etag_follows_the_page(app, client):
+    with app.app_context():
+        creator_id = User.query.first().id
+        db.session.add_all([Bounty(title=f'ETag bounty {i}', description='...', bounty_amount=10,
+                                   creator_id=creator_id) for i in range(6)])
+        db.session.commit()
+
+    first = client.get('/api/bounties?limit=2')
+    etag = first.headers['ETag']
+    page_ids = [bounty['id'] for bounty in first.get_json()['bounties']]
+
+    with assert_max_queries(1):
+        revalidated = client.get('/api/bounties?limit=2', headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
+
+    # A write to a bounty off the page leaves its ETag alone...
+    with app.app_context():
+        off_page = Bounty.query.filter(Bounty.id.notin_(page_ids)).first()
+        bump_bounty_version(off_page.id)
+        db.session.commit()
+    assert client.get('/api/bounties?limit=2', headers={'If-None-Match': etag}).status_code == 304
+
+    # ...while a write to one on it, or a new bounty joining it, does not
+    with app.app_context():
+        bump_bounty_version(page_ids[0])
+        db.session.commit()
+    changed = client.get('/api/bounties?limit=2', headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+
+    etag = changed.headers['ETag']
+    with app.app_context():
+        db.session.add(Bounty(title='Newest', description='...', bounty_amount=10, creator_id=creator_id))
+        db.session.commit()
+    assert client.get('/api/bounties?limit=2', headers={'If-None-Match': etag}).status_code == 200
@@ -0,0 +1,124 @@
+"""
+Circuit breaker and retry policy, against the fake OpenAI-compatible server
+"""
+import openai
+import pytest
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen, RetryPolicy, call_with_policy
+from fake_llm import FakeLLM
+
+MESSAGES = [{'role': 'user', 'content': 'Is the earth flat?'}]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def breaker_for(clock, threshold=3):
+    return CircuitBreaker(failure_threshold=threshold, window=60, cooldown=30, clock=clock)
+
+
+def no_retries():
+    return RetryPolicy(max_attempts=1, budget=5)
+
+
+def completion(fake):
+    client = openai.OpenAI(api_key='test', base_url=fake.base_url, max_retries=0)
+    return lambda timeout: client.chat.completions.create(model='fake', messages=MESSAGES, timeout=timeout)
+
+
+def failing_with(*statuses):
+    """An `error` callable for FakeLLM answering with these statuses in turn, then normally."""
+    remaining = list(statuses)
+    return lambda body: remaining.pop(0) if remaining else None
+
+
+def test_opens_after_threshold_and_half_opens_after_cooldown(clock):
+    breaker = breaker_for(clock)
+    for _ in range(3):
+        breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.retry_after() == 30
+
+    clock.now += 30
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # Only one probe at a time
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+
+def test_failures_outside_the_window_are_forgotten(clock):
+    breaker = breaker_for(clock)
+    breaker.record_failure()
+    breaker.record_failure()
+    clock.now += 61
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+
+def test_server_errors_open_the_breaker_and_calls_then_fail_fast(clock):
+    breaker = breaker_for(clock)
+    with FakeLLM(error_rate=1.0, error_status=503) as fake:
+        attempt = completion(fake)
+        for _ in range(3):
+            with pytest.raises(openai.InternalServerError):
+                call_with_policy(attempt, breaker, no_retries())
+        with pytest.raises(CircuitOpen):
+            call_with_policy(attempt, breaker, no_retries())
+    assert fake.requests == 3
+    assert breaker.state == OPEN
+
+
+def test_a_bad_request_neither_clears_nor_adds_failures(clock):
+    breaker = breaker_for(clock)
+    with FakeLLM(error=failing_with(503, 503, 400, 503)) as fake:
+        attempt = completion(fake)
+        for error in (openai.InternalServerError, openai.InternalServerError,
+                      openai.BadRequestError, openai.InternalServerError):
+            with pytest.raises(error):
+                call_with_policy(attempt, breaker, no_retries())
+    assert breaker.state == OPEN
+
+
+def test_a_bad_request_on_the_probe_releases_it(clock):
+    breaker = breaker_for(clock, threshold=1)
+    breaker.record_failure()
+    clock.now += 30
+    with FakeLLM(error=failing_with(400)) as fake:
+        with pytest.raises(openai.BadRequestError):
+            call_with_policy(completion(fake), breaker, no_retries())
+        assert breaker.state == HALF_OPEN
+        call_with_policy(completion(fake), breaker, no_retries())
+    assert breaker.state == CLOSED
+
+
+def test_retries_server_errors_with_backoff(clock):
+    breaker = breaker_for(clock)
+    policy = RetryPolicy(max_attempts=3, budget=5, base_delay=0.01, max_delay=0.05)
+    with FakeLLM(error=failing_with(503, 429)) as fake:
+        fake.retry_after = 0
+        response = call_with_policy(completion(fake), breaker, policy)
+    assert response.choices[0].message.content
+    assert fake.requests == 3
+    assert breaker.state == CLOSED
+
+
+def test_no_retry_once_the_failure_trips_the_breaker(clock):
+    breaker = breaker_for(clock, threshold=1)
+    policy = RetryPolicy(max_attempts=3, budget=5, base_delay=0.01, max_delay=0.05)
+    with FakeLLM(error=failing_with(503)) as fake:
+        with pytest.raises(openai.InternalServerError):
+            call_with_policy(completion(fake), breaker, policy)
+    assert fake.requests == 1
+    assert breaker.state == OPEN
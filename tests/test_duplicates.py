@@ -0,0 +1,73 @@
+"""
+Near-duplicate refutations: which copies may reuse an earlier verdict
+"""
+import pytest
+
+import duplicates
+from models import db, User, Bounty, Refutation, RefutationSignature, AdjudicationStatus
+
+TEXT = ('The cited survey measured household income rather than wealth, so the claimed '
+        'gap in wealth between the two regions is not supported by the figures it quotes.')
+
+
+@pytest.fixture
+def setting(app_context):
+    first, second = User(username='dup-first', email='dup-first@example.com'), \
+        User(username='dup-second', email='dup-second@example.com')
+    creator = User(username='dup-creator', email='dup-creator@example.com')
+    db.session.add_all([first, second, creator])
+    db.session.flush()
+    bounties = [Bounty(title=f'Duplicate bounty {i}', description='...', bounty_amount=100,
+                       creator_id=creator.id, auto_adjudicate=i < 2) for i in range(3)]
+    db.session.add_all(bounties)
+    db.session.flush()
+    original = submit(bounties[0], first, TEXT)
+    original.ai_score, original.ai_feedback = 77, 'Solid.'
+    original.adjudication_status = AdjudicationStatus.APPROVED
+    db.session.flush()
+    yield {'first': first, 'second': second, 'bounties': bounties}
+    db.session.rollback()
+
+
+def submit(bounty, author, content):
+    refutation = Refutation(bounty_id=bounty.id, author_id=author.id, content=content)
+    db.session.add(refutation)
+    db.session.flush()
+    match = duplicates.check_and_index(refutation)
+    if match is not None:
+        duplicates.apply_duplicate_verdict(refutation, match)
+    return refutation
+
+
+def test_resubmission_reuses_verdict(setting):
+    copy = submit(setting['bounties'][0], setting['first'], TEXT + ' Resubmitted.')
+    assert copy.adjudication_status == AdjudicationStatus.APPROVED
+    assert copy.ai_score == 77
+
+
+def test_copy_by_another_author_is_flagged(setting):
+    copy = submit(setting['bounties'][0], setting['second'], TEXT)
+    assert copy.adjudication_status == AdjudicationStatus.FLAGGED
+    assert copy.ai_score is None
+    assert "another user's refutation" in copy.ai_feedback
+
+
+def test_copy_on_another_bounty_is_flagged(setting):
+    copy = submit(setting['bounties'][1], setting['first'], TEXT)
+    assert copy.adjudication_status == AdjudicationStatus.FLAGGED
+    assert 'another bounty' in copy.ai_feedback
+
+
+def test_no_verdict_without_auto_adjudication(setting):
+    copy = submit(setting['bounties'][2], setting['first'], TEXT)
+    assert copy.adjudication_status == AdjudicationStatus.PENDING
+    assert copy.ai_feedback is None
+
+
+def test_sample_data_is_indexed(app_context):
+    sample = Refutation.query.join(User, Refutation.author_id == User.id) \
+        .filter(User.username.in_(['alice', 'bob', 'charlie', 'demo_user'])).all()
+    assert sample
+    indexed = {row.refutation_id for row in RefutationSignature.query.filter(
+        RefutationSignature.refutation_id.in_([r.id for r in sample]))}
+    assert indexed == {r.id for r in sample if duplicates.signature(r.content) is not None}
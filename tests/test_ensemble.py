@@ -0,0 +1,137 @@
+"""
+Judge ensemble against the fake OpenAI-compatible server
+"""
+import time
+
+import pytest
+
+from ai_adjudicator import AIAdjudicator
+from circuit_breaker import CLOSED, CircuitBreaker, CircuitOpen
+from ensemble import JUDGE_FOCUSES, JudgeEnsemble, aggregate, is_decided
+from fake_llm import FakeLLM
+
+MESSAGES = [
+    {'role': 'system', 'content': 'You are an impartial judge.'},
+    {'role': 'user', 'content': 'Claim: the earth is flat.'},
+    {'role': 'user', 'content': 'Refutation: ships disappear hull first over the horizon.'},
+]
+
+
+def focus_of(body):
+    content = body['messages'][-1]['content']
+    return next(index for index, focus in enumerate(JUDGE_FOCUSES) if focus in content)
+
+
+def verdict(score, status, flags=()):
+    return {'score': score, 'feedback': f'Judged {score}.', 'status': status, 'flags': list(flags)}
+
+
+@pytest.fixture
+def parse():
+    return AIAdjudicator()._parse_response
+
+
+def ensemble_for(fake, size, timeout=5.0, **kwargs):
+    return JudgeEnsemble(size=size, timeout=timeout, api_key='test', base_url=fake.base_url, **kwargs)
+
+
+def test_aggregate_takes_median_majority_and_union_of_flags():
+    result = aggregate([verdict(80, 'approved'), verdict(90, 'approved', ['weak_evidence']),
+                        verdict(10, 'rejected', ['spam'])], judges=3)
+    assert result['score'] == 80
+    assert result['status'] == 'approved'
+    assert result['flags'] == ['weak_evidence', 'spam']
+    assert result['feedback'].startswith('Ensemble of 3/3 judges')
+
+
+def test_tied_vote_goes_to_review():
+    assert aggregate([verdict(80, 'approved'), verdict(20, 'rejected')], judges=2)['status'] == 'flagged'
+    assert not is_decided([verdict(80, 'approved'), verdict(20, 'rejected')], pending=1)
+    assert is_decided([verdict(80, 'approved'), verdict(90, 'approved')], pending=1)
+
+
+def test_judges_are_asked_concurrently_and_combined(parse):
+    verdicts = [verdict(80, 'approved'), verdict(90, 'approved', ['weak_evidence']), verdict(10, 'rejected')]
+    # The dissenting judge answers first, so the majority is only settled by the last one
+    with FakeLLM(latency=lambda body: 0.1 if focus_of(body) == 2 else 0.5,
+                 verdict=lambda body: verdicts[focus_of(body)]) as fake:
+        ensemble = ensemble_for(fake, size=3)
+        ensemble._ensure_loop()
+        started = time.monotonic()
+        result = ensemble.evaluate(MESSAGES, parse)
+        elapsed = time.monotonic() - started
+
+    assert fake.requests == 3
+    assert elapsed < 1.4
+    assert result['status'] == 'approved'
+    assert result['score'] == 80
+    assert 'weak_evidence' in result['flags']
+
+
+def test_outstanding_judges_are_cancelled_once_the_majority_is_settled(parse):
+    with FakeLLM(latency=lambda body: 0.05 if focus_of(body) < 3 else 3.0,
+                 verdict=lambda body: verdict(85, 'approved')) as fake:
+        ensemble = ensemble_for(fake, size=5, timeout=10.0)
+        started = time.monotonic()
+        result = ensemble.evaluate(MESSAGES, parse)
+        elapsed = time.monotonic() - started
+
+    assert elapsed < 2.0
+    assert result['feedback'].startswith('Ensemble of 3/5 judges')
+
+
+def test_failed_and_slow_judges_are_left_out(parse):
+    with FakeLLM(latency=lambda body: 2.0 if focus_of(body) == 2 else 0.0,
+                 error=lambda body: 400 if focus_of(body) == 1 else None,
+                 verdict=lambda body: verdict(70, 'approved')) as fake:
+        result = ensemble_for(fake, size=3, timeout=0.5).evaluate(MESSAGES, parse)
+    assert result['feedback'].startswith('Ensemble of 1/3 judges')
+
+    with FakeLLM(error=lambda body: 400) as fake:
+        assert ensemble_for(fake, size=3).evaluate(MESSAGES, parse) is None
+
+
+def test_a_half_open_breaker_lets_only_one_judge_through(parse):
+    now = [1000.0]
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=30, clock=lambda: now[0])
+    breaker.record_failure()
+    now[0] += 30
+
+    with FakeLLM(verdict=lambda body: verdict(85, 'approved')) as fake:
+        ensemble = ensemble_for(fake, size=3, breaker=breaker)
+        first, second = ensemble.evaluate_all([MESSAGES, MESSAGES[:-1] + [{'role': 'user', 'content': 'Another.'}]],
+                                              parse)
+
+    assert fake.requests == 1
+    verdicts = [result for result in (first, second) if isinstance(result, dict)]
+    assert len(verdicts) == 1 and verdicts[0]['feedback'].startswith('Ensemble of 1/3 judges')
+    assert any(isinstance(result, CircuitOpen) for result in (first, second))
+    assert breaker.state == CLOSED
+
+
+def test_server_errors_count_against_the_breaker(parse):
+    breaker = CircuitBreaker(failure_threshold=2)
+    with FakeLLM(error_rate=1.0, error_status=503) as fake:
+        ensemble = ensemble_for(fake, size=3, breaker=breaker)
+        assert ensemble.evaluate(MESSAGES, parse) is None
+        assert breaker.is_open()
+        sent = fake.requests
+        assert isinstance(ensemble.evaluate(MESSAGES, parse), CircuitOpen)
+    assert fake.requests == sent
+
+
+def test_json_that_is_not_an_object_is_a_parsing_error(parse):
+    for text in ('[1, 2]', '42', '"approved"'):
+        assert parse(text)['flags'] == ['parsing_error']
+
+
+def test_an_unreadable_judge_is_left_out(parse):
+    with FakeLLM(verdict=lambda body: [1, 2] if focus_of(body) == 0 else verdict(75, 'approved')) as fake:
+        result = ensemble_for(fake, size=3).evaluate(MESSAGES, parse)
+    assert result['feedback'].startswith('Ensemble of 2/3 judges')
+
+    def broken(text):
+        raise AttributeError('not a verdict')
+
+    with FakeLLM() as fake:
+        assert ensemble_for(fake, size=3).evaluate(MESSAGES, broken) is None
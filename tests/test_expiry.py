@@ -0,0 +1,102 @@
+"""
+Bounty expiry sweeper: refunds, checkpoints and races with closing a bounty
+"""
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as falsifi
+import expiry
+from counters import site_counter
+from models import db, Bounty, BountyStatus, PointsTransaction, User
+
+
+@pytest.fixture
+def creator(app_context):
+    user = User(username='expiry-creator', email='expiry-creator@example.com', points=0)
+    db.session.add(user)
+    db.session.commit()
+    yield user
+    bounty_ids = [bounty_id for (bounty_id,) in db.session.query(Bounty.id).filter_by(creator_id=user.id)]
+    PointsTransaction.query.filter_by(user_id=user.id).delete()
+    Bounty.query.filter(Bounty.id.in_(bounty_ids)).delete()
+    User.query.filter_by(id=user.id).delete()
+    db.session.commit()
+
+
+def overdue(creator, count=1, amount=100):
+    bounties = [Bounty(title=f'Overdue bounty {i}', description='...', bounty_amount=amount, creator_id=creator.id,
+                       expires_at=datetime.utcnow() - timedelta(hours=count - i))
+                for i in range(count)]
+    db.session.add_all(bounties)
+    db.session.commit()
+    return [bounty.id for bounty in bounties]
+
+
+def refunded(bounty_id):
+    return db.session.query(db.func.sum(PointsTransaction.amount)) \
+        .filter_by(ref_type='bounty', ref_id=bounty_id).scalar() or 0
+
+
+def test_overdue_bounty_expires_and_is_refunded_once(creator):
+    bounty_id, = overdue(creator, amount=250)
+    open_before = site_counter('open_bounties')
+
+    assert expiry.sweep()['finished']
+    assert expiry.sweep()['expired'] == 0
+
+    db.session.expire_all()
+    assert db.session.get(Bounty, bounty_id).status == BountyStatus.EXPIRED
+    assert refunded(bounty_id) == 250
+    assert PointsTransaction.query.filter_by(ref_type='bounty', ref_id=bounty_id).one().reason == 'bounty_expired'
+    assert db.session.get(User, creator.id).points == 250
+    assert site_counter('open_bounties') == open_before - 1
+
+
+def test_interrupted_sweep_resumes_from_its_checkpoint(creator):
+    bounty_ids = overdue(creator, count=3)
+
+    first = expiry.sweep(batch_size=1, max_batches=1)
+    assert not first['finished'] and first['expired'] == 1 and not first['resumed']
+    second = expiry.sweep(batch_size=1, max_batches=1)
+    assert second['resumed'] and second['expired'] == 2
+    assert second['cutoff'] == first['cutoff']
+    last = expiry.sweep(batch_size=1)
+    assert last['finished'] and last['expired'] == 3
+
+    db.session.expire_all()
+    assert {db.session.get(Bounty, bounty_id).status for bounty_id in bounty_ids} == {BountyStatus.EXPIRED}
+    assert [refunded(bounty_id) for bounty_id in bounty_ids] == [100, 100, 100]
+
+
+def test_bounty_closed_while_the_sweep_expires_it_is_refunded_once(app, creator, monkeypatch):
+    bounty_id, = overdue(creator, amount=300)
+    client = app.test_client()
+    client.post('/login', data={'username': creator.username})
+
+    # close_bounty looks the user up again after loading the bounty; the sweep
+    # expires and refunds it right then, in another session
+    calls = []
+    get_current_user = falsifi.get_current_user
+
+    def sweep_in_between():
+        calls.append(None)
+        if len(calls) == 2:
+            def sweep():
+                with app.app_context():
+                    expiry.sweep()
+            thread = threading.Thread(target=sweep)
+            thread.start()
+            thread.join()
+        return get_current_user()
+
+    monkeypatch.setattr(falsifi, 'get_current_user', sweep_in_between)
+    response = client.post(f'/bounties/{bounty_id}/close')
+    assert response.status_code == 302
+    assert len(calls) >= 2
+
+    db.session.expire_all()
+    assert db.session.get(Bounty, bounty_id).status == BountyStatus.EXPIRED
+    assert refunded(bounty_id) == 300
+    assert db.session.get(User, creator.id).points == 300
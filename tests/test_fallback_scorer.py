@@ -0,0 +1,41 @@
+"""
+The batch fallback scorer must agree with AIAdjudicator._fallback_evaluation on any input
+"""
+from hypothesis import given, settings, strategies as st
+
+from ai_adjudicator import AIAdjudicator
+from fallback_scorer import REGEX_MIN_PHRASES, SPAM_PHRASES, SpamMatcher, score_batch
+
+# Text biased towards the heuristics' edges: spam phrases in any case, runs of
+# capitals, every kind of whitespace, and arbitrary (including astral) characters
+fragments = st.one_of(
+    st.sampled_from(SPAM_PHRASES).map(str.upper),
+    st.sampled_from(SPAM_PHRASES),
+    st.text(alphabet='ABCXYZ ', max_size=30),
+    st.text(alphabet=' \t\n\r\x0b\x0c\x1c\x85\xa0 　', max_size=5),
+    st.sampled_from(['word ' * 19, 'word ' * 20, 'word ' * 100, 'word ' * 101]),
+    st.text(max_size=40),
+)
+texts = st.lists(fragments, max_size=8).map(''.join)
+
+
+@settings(max_examples=300, deadline=None)
+@given(st.lists(texts, max_size=12))
+def test_batch_matches_scalar(contents):
+    adjudicator = AIAdjudicator(api_key=None)
+    assert score_batch(contents) == [adjudicator._fallback_evaluation(text) for text in contents]
+
+
+@settings(max_examples=100, deadline=None)
+@given(st.lists(st.text(min_size=1, max_size=6), min_size=REGEX_MIN_PHRASES, max_size=40, unique=True),
+       st.lists(texts, max_size=8))
+def test_batch_matches_scalar_with_many_phrases(phrases, contents):
+    phrases = [phrase.lower() for phrase in phrases]
+    adjudicator = AIAdjudicator(api_key=None, spam_phrases=phrases)
+    matcher = SpamMatcher(phrases)
+    assert score_batch(contents, matcher) == [adjudicator._fallback_evaluation(text) for text in contents]
+
+
+@given(st.lists(st.text(max_size=4), max_size=20), st.text(max_size=30))
+def test_spam_matcher_matches_substring_test(phrases, text):
+    assert SpamMatcher(phrases).contains_any(text) == any(phrase in text for phrase in phrases)
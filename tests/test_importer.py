@@ -0,0 +1,83 @@
+"""
+Bulk import validation: bad input is reported up front and a load is all-or-nothing
+"""
+import json
+
+import pytest
+
+from importer import ImportValidationError, import_files
+from models import db, User, Bounty
+
+
+def write_records(tmp_path, records):
+    path = tmp_path / 'import.jsonl'
+    path.write_text('\n'.join(json.dumps(record) for record in records) + '\n', encoding='utf-8')
+    return [str(path)]
+
+
+def validation_errors(paths):
+    with pytest.raises(ImportValidationError) as error:
+        import_files(paths)
+    return error.value.errors
+
+
+def test_wrong_types_are_reported(app_context, tmp_path):
+    paths = write_records(tmp_path, [
+        {'type': 'user', 'username': 'typed-1', 'email': 'typed-1@example.com', 'points': [1]},
+        {'type': 'user', 'username': 'typed-2', 'email': 'typed-2@example.com', 'created_at': 12345},
+        {'type': 'user', 'username': 'typed-3', 'email': 'typed-3@example.com', 'points': True},
+    ])
+    errors = validation_errors(paths)
+    assert len(errors) == 3
+    assert 'points must be an integer' in errors[0]
+    assert 'created_at must be an ISO 8601 string' in errors[1]
+    assert User.query.filter(User.username.like('typed-%')).count() == 0
+
+
+def test_existing_email_is_reported(app_context, tmp_path):
+    existing = User.query.first()
+    paths = write_records(tmp_path, [
+        {'type': 'user', 'username': 'fresh-name', 'email': existing.email},
+    ])
+    assert validation_errors(paths) == [f'{paths[0]}:1: duplicate email {existing.email!r}']
+
+
+def test_overdraw_is_reported(app_context, tmp_path):
+    paths = write_records(tmp_path, [
+        {'type': 'user', 'username': 'thrifty', 'email': 'thrifty@example.com', 'points': 100},
+        {'type': 'bounty', 'creator': 'thrifty', 'title': 'Too dear', 'description': '...', 'bounty_amount': 80},
+        {'type': 'bounty', 'creator': 'thrifty', 'title': 'Too dear', 'description': '...', 'bounty_amount': 80},
+    ])
+    errors = validation_errors(paths)
+    assert errors == [f"{paths[0]}:3: 'thrifty' cannot afford a bounty of 80 (balance 20)"]
+
+
+def test_closed_and_expired_bounties_are_refunded(app_context, tmp_path):
+    paths = write_records(tmp_path, [
+        {'type': 'user', 'username': 'refunded', 'email': 'refunded@example.com', 'points': 500},
+        {'type': 'bounty', 'creator': 'refunded', 'title': 'Open', 'description': '...', 'bounty_amount': 100},
+        {'type': 'bounty', 'creator': 'refunded', 'title': 'Closed', 'description': '...', 'bounty_amount': 300,
+         'status': 'closed'},
+        {'type': 'bounty', 'creator': 'refunded', 'title': 'Expired', 'description': '...', 'bounty_amount': 400,
+         'status': 'expired'},
+    ])
+    import_files(paths)
+    user = User.query.filter_by(username='refunded').one()
+    assert user.points == 400
+    assert Bounty.query.filter_by(creator_id=user.id).count() == 3
+
+
+def test_failed_load_writes_nothing(app_context, tmp_path, monkeypatch):
+    paths = write_records(tmp_path, [
+        {'type': 'user', 'username': f'partial-{i}', 'email': f'partial-{i}@example.com'} for i in range(5)
+    ] + [
+        {'type': 'bounty', 'creator': 'partial-0', 'title': 'Late failure', 'description': '...', 'bounty_amount': 10},
+    ])
+
+    def fail(self, records):
+        raise RuntimeError('database went away')
+
+    monkeypatch.setattr('importer.BulkImporter._insert_bountys', fail)
+    with pytest.raises(RuntimeError):
+        import_files(paths, chunk_size=2)
+    assert User.query.filter(User.username.like('partial-%')).count() == 0
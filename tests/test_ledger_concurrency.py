@@ -0,0 +1,106 @@
+"""
+Concurrency stress tests for the points ledger and the rating payout
+
+Several threads, each with its own client and database session, hit the same
+rows at once; afterwards no points may have been created or lost.
+"""
+import random
+import threading
+
+import pytest
+
+import ledger
+from models import db, User, Bounty, Refutation, PointsTransaction
+
+THREADS = 8
+
+
+def run_threads(target, count=THREADS):
+    errors = []
+
+    def guarded(index):
+        try:
+            target(index)
+        except Exception as e:  # Surfaced below; a thread's exception would otherwise be lost
+            errors.append(e)
+
+    threads = [threading.Thread(target=guarded, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors, errors
+
+
+@pytest.fixture
+def rated_refutation(app):
+    with app.app_context():
+        creator = User(username='stress-creator', email='stress-creator@example.com', points=0)
+        author = User(username='stress-author', email='stress-author@example.com', points=0)
+        db.session.add_all([creator, author])
+        db.session.flush()
+        ledger.credit(author.id, 500, 'stress_seed')
+        bounty = Bounty(title='Rated under load', description='...', bounty_amount=1000, creator_id=creator.id)
+        db.session.add(bounty)
+        db.session.flush()
+        refutation = Refutation(bounty_id=bounty.id, author_id=author.id, content='...', ai_score=80, bond_amount=50)
+        db.session.add(refutation)
+        db.session.commit()
+        return {'creator': creator.username, 'author_id': author.id, 'refutation_id': refutation.id}
+
+
+def test_concurrent_ratings_pay_only_the_final_reward(app, rated_refutation):
+    statuses = []
+
+    def rate(index):
+        client = app.test_client()
+        client.post('/login', data={'username': rated_refutation['creator']})
+        rng = random.Random(index)
+        for _ in range(10):
+            response = client.post(f"/refutations/{rated_refutation['refutation_id']}/rate",
+                                   data={'rating': rng.randint(1, 10), 'feedback': f'thread {index}'})
+            statuses.append(response.status_code)
+
+    run_threads(rate)
+    assert set(statuses) == {302}
+
+    with app.app_context():
+        refutation = db.session.get(Refutation, rated_refutation['refutation_id'])
+        author = db.session.get(User, rated_refutation['author_id'])
+        bond = refutation.bond_amount if refutation.bond_returned else 0
+        assert author.points == 500 + refutation.reward_earned + bond
+        paid = db.session.query(db.func.sum(PointsTransaction.amount)) \
+            .filter_by(ref_type='refutation', ref_id=refutation.id).scalar() or 0
+        assert paid == refutation.reward_earned + bond
+        assert not [row for row in ledger.reconcile() if row['user_id'] == author.id]
+
+
+def test_concurrent_transfers_conserve_points(app):
+    with app.app_context():
+        users = [User(username=f'stress-transfer-{i}', email=f'stress-transfer-{i}@example.com', points=0)
+                 for i in range(4)]
+        db.session.add_all(users)
+        db.session.flush()
+        for user in users:
+            ledger.credit(user.id, 100, 'stress_seed')
+        db.session.commit()
+        user_ids = [user.id for user in users]
+
+    def transfer(index):
+        rng = random.Random(index)
+        with app.app_context():
+            for _ in range(25):
+                sender, receiver = rng.sample(user_ids, 2)
+                try:
+                    ledger.transfer(sender, receiver, rng.randint(1, 60), 'stress')
+                    db.session.commit()
+                except ledger.InsufficientPoints:
+                    db.session.rollback()
+
+    run_threads(transfer)
+
+    with app.app_context():
+        balances = [points for (points,) in db.session.query(User.points).filter(User.id.in_(user_ids))]
+        assert sum(balances) == 400
+        assert min(balances) >= 0
+        assert not [row for row in ledger.reconcile() if row['user_id'] in user_ids]
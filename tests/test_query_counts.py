@@ -0,0 +1,63 @@
+"""
+Query-count budgets for the hot pages (see instrumentation.assert_max_queries)
+
+Each page is requested once to warm per-process caches, then measured after
+extra bounties, refutations and users are added, so a query per row (an N+1)
+fails the budget rather than hiding behind the small sample data.
+"""
+import pytest
+
+from instrumentation import assert_max_queries
+from models import db, User, Bounty, Refutation, AdjudicationStatus
+from leaderboard import rebuild_leaderboard
+
+
+@pytest.fixture(scope='module')
+def bounty_id(app):
+    with app.app_context():
+        authors = [User(username=f'query-count-{i}', email=f'query-count-{i}@example.com') for i in range(10)]
+        db.session.add_all(authors)
+        db.session.flush()
+        bounty = None
+        for i in range(20):
+            bounty = Bounty(title=f'Query count bounty {i}', description='Claim under test', category=f'cat-{i % 4}',
+                            bounty_amount=100, creator_id=authors[i % 10].id)
+            db.session.add(bounty)
+            db.session.flush()
+            for author in authors[:5]:
+                if author.id != bounty.creator_id:
+                    db.session.add(Refutation(bounty_id=bounty.id, author_id=author.id, content='A refutation',
+                                              creator_rating=7, adjudication_status=AdjudicationStatus.APPROVED))
+        db.session.commit()
+        rebuild_leaderboard()
+        return bounty.id
+
+
+@pytest.mark.parametrize('path, max_queries', [
+    ('/', 2),
+    ('/bounties', 2),
+    ('/bounties?status=open&category=cat-1', 2),
+    ('/bounties/{bounty_id}', 5),
+    ('/leaderboard', 1),
+    ('/api/bounties', 2),
+    ('/api/bounties/{bounty_id}', 3),
+    ('/search?q=refutation', 1),
+])
+def test_page_query_budget(app, client, bounty_id, path, max_queries):
+    path = path.format(bounty_id=bounty_id)
+    assert client.get(path).status_code == 200
+    app.config['SITE_COUNTER_TTL'], ttl = 0, app.config['SITE_COUNTER_TTL']
+    try:
+        with assert_max_queries(max_queries):
+            response = client.get(path)
+    finally:
+        app.config['SITE_COUNTER_TTL'] = ttl
+    assert response.status_code == 200
+
+
+def test_assert_max_queries_lists_statements(app_context):
+    with pytest.raises(AssertionError, match='Expected at most 1 queries, got 2') as error:
+        with assert_max_queries(1):
+            User.query.first()
+            Bounty.query.first()
+    assert 'FROM users' in str(error.value)
@@ -0,0 +1,24 @@
+"""
+Every hot query must be served by the index migration 0002 (or 0010) created for it
+"""
+import pytest
+
+from migrations import check_query_plans, explain, hot_queries
+
+
+@pytest.mark.parametrize('name, statement, index_name', hot_queries(), ids=[name for name, _, _ in hot_queries()])
+def test_hot_query_uses_index(app_context, name, statement, index_name):
+    plan = explain(statement)
+    assert index_name in plan, f'{name} does not use {index_name}:\n{plan}'
+
+
+def test_check_query_plans_reports_every_query(app_context):
+    results = check_query_plans()
+    assert [name for name, _, _ in results] == [name for name, _, _ in hot_queries()]
+    assert all(uses_index for _, uses_index, _ in results)
+
+
+def test_check_query_plans_command(app):
+    result = app.test_cli_runner().invoke(args=['check-indexes'])
+    assert result.exit_code == 0, result.output
+    assert 'FAIL' not in result.output
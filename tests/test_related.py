@@ -0,0 +1,46 @@
+"""
+Related-bounty suggestions on a fresh database
+"""
+import related
+from models import db, Bounty, BountyTermWeight, TfidfTerm, User
+
+
+def test_new_bounty_is_related_to_sample_data(app_context):
+    sample = Bounty.query.filter_by(title='Proof of stake is more secure than proof of work').one()
+    assert BountyTermWeight.query.filter_by(bounty_id=sample.id).count() > 0
+
+    bounty = Bounty(title='Proof of work mining is more secure than proof of stake validators',
+                    description='Staking concentrates control; mining costs make attacks expensive.',
+                    bounty_amount=100, creator_id=User.query.filter_by(username='bob').one().id)
+    db.session.add(bounty)
+    db.session.flush()
+    related.index_bounty(bounty)
+    try:
+        assert sample.id in [neighbour.id for neighbour, _ in related.related_bounties(bounty.id)]
+    finally:
+        db.session.rollback()
+
+
+def test_new_terms_are_counted_once_per_bounty(app_context):
+    creator_id = User.query.filter_by(username='bob').one().id
+    try:
+        bounties = []
+        for title in ('Zyxwvut ferments are unstable', 'Zyxwvut ferments are stable'):
+            bounty = Bounty(title=title, description='Zyxwvut cultures.', bounty_amount=100, creator_id=creator_id)
+            db.session.add(bounty)
+            db.session.flush()
+            related.index_bounty(bounty)
+            bounties.append(bounty)
+        assert db.session.get(TfidfTerm, 'zyxwvut').df == 2
+        assert db.session.get(TfidfTerm, 'unstable').df == 1
+        first, second = bounties
+        assert second.id in [neighbour.id for neighbour, _ in related.related_bounties(first.id)]
+    finally:
+        db.session.rollback()
+
+
+def test_postings_are_capped_per_term(app_context, monkeypatch):
+    monkeypatch.setattr(related, 'POSTINGS_PER_TERM', 1)
+    rows = db.session.execute(related._postings(['proof', 'stake'], bounty_id=0)).all()
+    assert len(rows) <= 2
+    assert {term for _, term, _ in rows} <= {'proof', 'stake'}
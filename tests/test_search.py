@@ -0,0 +1,86 @@
+"""
+Full-text search on SQLite: ranking, pagination and FTS5 index upkeep
+"""
+import pytest
+
+import search
+from models import db, Bounty, Refutation, User
+
+
+@pytest.fixture
+def creator(app_context):
+    user = User(username='search-creator', email='search-creator@example.com')
+    db.session.add(user)
+    db.session.commit()
+    yield user
+    db.session.rollback()
+    bounty_ids = [bounty_id for (bounty_id,) in db.session.query(Bounty.id).filter_by(creator_id=user.id)]
+    Refutation.query.filter(Refutation.bounty_id.in_(bounty_ids)).delete()
+    Bounty.query.filter(Bounty.id.in_(bounty_ids)).delete()
+    User.query.filter_by(id=user.id).delete()
+    db.session.commit()
+
+
+def add_bounty(creator, title, description='A claim to refute.'):
+    bounty = Bounty(title=title, description=description, bounty_amount=100, creator_id=creator.id)
+    db.session.add(bounty)
+    db.session.commit()
+    return bounty.id
+
+
+def ids(query, **kwargs):
+    return [result['id'] for result in search.search(query, **kwargs)]
+
+
+def test_title_match_ranks_above_description_match(creator):
+    in_description = add_bounty(creator, 'Tides follow the moon', 'Quokkazine levels rise and fall with the tides.')
+    in_title = add_bounty(creator, 'Quokkazine cures insomnia')
+
+    assert ids('quokkazine') == [in_title, in_description]
+    first, second = search.search('quokkazine')
+    assert first['score'] > second['score']
+    assert first['type'] == 'bounty' and first['bounty_id'] == in_title
+
+
+def test_refutations_are_searched_and_point_at_their_bounty(creator):
+    bounty_id = add_bounty(creator, 'Glaciers are growing')
+    refutation = Refutation(bounty_id=bounty_id, author_id=creator.id,
+                            content='Satellite gravimetry shows xerbolith ice loss every year.')
+    db.session.add(refutation)
+    db.session.commit()
+
+    result, = search.search('xerbolith', kind='refutations')
+    assert (result['id'], result['bounty_id'], result['title']) == (refutation.id, bounty_id, 'Glaciers are growing')
+    assert search.search('xerbolith') == []
+
+
+def test_pages_are_disjoint_and_cover_every_match(creator, client):
+    expected = {add_bounty(creator, f'Plimsoll claim {i}') for i in range(5)}
+
+    pages = [ids('plimsoll', limit=2, offset=offset) for offset in (0, 2, 4)]
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert set().union(*pages) == expected
+
+    seen, page, has_next = [], 1, True
+    while has_next:
+        body = client.get(f'/api/search?q=plimsoll&limit=2&page={page}').get_json()
+        assert body['page'] == page and body['limit'] == 2
+        seen += [result['id'] for result in body['results']]
+        has_next, page = body['has_next'], page + 1
+    assert page == 4
+    assert sorted(seen) == sorted(expected)
+
+
+def test_index_follows_updates_and_deletes(creator):
+    bounty_id = add_bounty(creator, 'Vorpalite is a metal')
+    assert ids('vorpalite') == [bounty_id]
+
+    bounty = db.session.get(Bounty, bounty_id)
+    bounty.title = 'Snarkite is a metal'
+    db.session.commit()
+    assert ids('vorpalite') == []
+    assert ids('snarkite') == [bounty_id]
+
+    db.session.delete(bounty)
+    db.session.commit()
+    assert ids('snarkite') == []
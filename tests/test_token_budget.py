@@ -0,0 +1,90 @@
+"""
+Prompt budgeting with the character-count estimate (no tiktoken download)
+"""
+import json
+
+import pytest
+from hypothesis import given, settings, strategies as st
+
+import token_budget
+from ai_adjudicator import AIAdjudicator
+from token_budget import TRUNCATION_POLICIES, PromptBudget, Tokenizer
+
+ESTIMATE = 'character-estimate'
+
+words = st.sampled_from(['evidence', 'claim', 'the', 'data', 'a', 'replication', 'shows', 'otherwise'])
+sentences = st.lists(words, min_size=1, max_size=12).map(lambda ws: ' '.join(ws).capitalize() + '.')
+paragraphs = st.lists(sentences, min_size=1, max_size=6).map(' '.join)
+documents = st.lists(paragraphs, min_size=1, max_size=5).map('\n\n'.join)
+
+LONG = '\n\n'.join(
+    f'Paragraph {p} opens with its lead sentence. ' + ' '.join(
+        f'Then detail {p}.{s} adds supporting evidence and more words.' for s in range(8))
+    for p in range(4))
+
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    # An encoding that failed to load is cached as None; the tokenizer then estimates
+    monkeypatch.setitem(token_budget._encodings, ESTIMATE, None)
+
+
+def budget(**kwargs):
+    return PromptBudget(Tokenizer(ESTIMATE), **kwargs)
+
+
+def test_tokenizer_estimates_from_characters():
+    tokenizer = Tokenizer(ESTIMATE)
+    assert not tokenizer.exact
+    assert tokenizer.count('x' * 9) == 3
+
+
+@settings(max_examples=200, deadline=None)
+@given(documents, st.integers(min_value=0, max_value=120), st.sampled_from(TRUNCATION_POLICIES))
+def test_truncate_stays_within_max_tokens(text, max_tokens, policy):
+    prompt_budget = budget(policy=policy)
+    cut, omitted = prompt_budget.truncate(text, max_tokens)
+    assert prompt_budget.count(cut) <= max_tokens
+    if cut == text:
+        assert omitted == 0
+    else:
+        assert omitted > 0
+
+
+def test_extract_keeps_each_paragraphs_lead_sentence():
+    prompt_budget = budget(policy='extract')
+    cut, omitted = prompt_budget.truncate(LONG, 120)
+    assert omitted > 0
+    for p in range(4):
+        assert f'Paragraph {p} opens with its lead sentence.' in cut
+    assert '[...]' in cut
+
+
+def test_fit_description_is_deterministic():
+    first, second = budget(max_description_tokens=50), budget(max_description_tokens=50)
+    fitted = first.fit_description(LONG)
+    assert first.count(fitted) <= 50
+    assert first.fit_description(LONG) == fitted
+    assert second.fit_description(LONG) == fitted
+
+
+def test_fit_refutation_shares_available_tokens_between_content_and_sources():
+    prompt_budget = budget(max_refutation_tokens=1000, max_sources_tokens=1000)
+    content, sources, omitted = prompt_budget.fit_refutation('c' * 400, 's' * 400, available=150)
+    assert omitted > 0
+    assert prompt_budget.count(content) + prompt_budget.count(sources or '') <= 150
+
+    content, sources, omitted = prompt_budget.fit_refutation('short refutation', 'short sources', available=150)
+    assert (content, sources, omitted) == ('short refutation', 'short sources', 0)
+
+
+def test_prefix_is_identical_for_every_refutation_of_a_bounty():
+    adjudicator = AIAdjudicator(api_key=None, budget=budget(max_description_tokens=60, max_prompt_tokens=600))
+    first, _ = adjudicator._build_messages('A bounty', LONG, 'First refutation. ' * 40, 'source one')
+    second, _ = adjudicator._build_messages('A bounty', LONG, 'Another, different refutation.', None)
+
+    prefix = json.dumps(first[:-1]).encode('utf-8')
+    assert json.dumps(second[:-1]).encode('utf-8') == prefix
+    assert json.dumps(adjudicator._prefix_messages('A bounty', LONG)).encode('utf-8') == prefix
+    assert first[-1] != second[-1]
+    assert adjudicator.budget.count_messages(first) <= 600
@@ -0,0 +1,300 @@
+"""
+Prompt token budgeting for the AI adjudicator
+
+Prompts are measured with the model's tiktoken encoding before they are
+sent. tiktoken downloads its BPE file on first use; where that is not
+possible the tokenizer falls back to an estimate of one token per four
+characters, which is close for English prose.
+
+PromptBudget caps each part of a prompt:
+
+- the bounty description, cut deterministically so the same bounty always
+  produces the same text
+- each refutation, which may use what the fixed parts leave of
+  max_prompt_tokens, up to max_refutation_tokens
+- its sources, which get what the refutation leaves, up to
+  max_sources_tokens
+
+Oversized text is shortened with a truncation policy:
+
+- 'head' keeps the start
+- 'middle' keeps the start and the end
+- 'extract' keeps the first sentence of every paragraph, then as many
+  following sentences as fit, in their original order
+
+Omissions are marked in the text so the model knows something was cut.
+
+Every model call is logged as a JSON line on `falsifi.tokens`. The line
+holds the estimated and reported prompt tokens, prompt tokens served from
+the provider's prefix cache, completion tokens and this process's running
+totals.
+"""
+import json
+import logging
+import math
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from metrics import ADJUDICATOR_TOKENS
+
+logger = logging.getLogger(__name__)
+token_logger = logging.getLogger('falsifi.tokens')
+
+TRUNCATION_POLICIES = ('head', 'middle', 'extract')
+OMISSION_MARKER = ' [... {count} tokens omitted ...] '
+# Chat format overhead: tokens added around every message and to prime the reply
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_REPLY = 3
+CHARS_PER_TOKEN = 4
+
+_totals = {'calls': 0, 'estimated_prompt_tokens': 0, 'prompt_tokens': 0,
+           'cached_prompt_tokens': 0, 'completion_tokens': 0}
+_totals_lock = threading.Lock()
+_encodings = {}
+_encodings_lock = threading.Lock()
+
+
+def _load_encoding(model: str):
+    """The tiktoken encoding for `model`, or None if it cannot be loaded; tried once per process."""
+    with _encodings_lock:
+        if model not in _encodings:
+            try:
+                import tiktoken
+                try:
+                    _encodings[model] = tiktoken.encoding_for_model(model)
+                except KeyError:
+                    _encodings[model] = tiktoken.get_encoding('o200k_base')
+            except Exception as e:
+                logger.warning('tiktoken unavailable, estimating tokens from characters: %s', e)
+                _encodings[model] = None
+        return _encodings[model]
+
+
+class Tokenizer:
+    """The model's tiktoken encoding, loaded on first use, or a character-count estimate."""
+
+    def __init__(self, model: str = 'gpt-4o-mini'):
+        self.model = model
+        self._encoding = None
+        self._loaded = False
+
+    def _get_encoding(self):
+        if not self._loaded:
+            self._encoding = _load_encoding(self.model)
+            self._loaded = True
+        return self._encoding
+
+    @property
+    def exact(self) -> bool:
+        return self._get_encoding() is not None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        encoding = self._get_encoding()
+        if encoding is None:
+            return math.ceil(len(text) / CHARS_PER_TOKEN)
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def head(self, text: str, tokens: int) -> str:
+        """The longest start of `text` within `tokens` tokens."""
+        encoding = self._get_encoding()
+        if encoding is None:
+            return _snap_end(text[:tokens * CHARS_PER_TOKEN]) if tokens > 0 else ''
+        return encoding.decode(encoding.encode(text, disallowed_special=())[:max(tokens, 0)])
+
+    def tail(self, text: str, tokens: int) -> str:
+        """The longest end of `text` within `tokens` tokens."""
+        if tokens <= 0:
+            return ''
+        encoding = self._get_encoding()
+        if encoding is None:
+            return _snap_start(text[-tokens * CHARS_PER_TOKEN:])
+        return encoding.decode(encoding.encode(text, disallowed_special=())[-tokens:])
+
+
+def _snap_end(text: str) -> str:
+    """Drop a trailing partial word, if a word boundary is close."""
+    cut = text.rfind(' ', max(0, len(text) - 20))
+    return text[:cut] if cut > 0 else text
+
+
+def _snap_start(text: str) -> str:
+    cut = text.find(' ', 0, 20)
+    return text[cut + 1:] if cut >= 0 else text
+
+
+def _sentences(paragraph: str) -> List[str]:
+    return [s for s in re.split(r'(?<=[.!?])\s+', paragraph.strip()) if s]
+
+
+class PromptBudget:
+    """Token limits for the parts of an adjudication prompt and how to enforce them."""
+
+    def __init__(self, tokenizer: Optional[Tokenizer] = None, max_prompt_tokens: int = 4000,
+                 max_description_tokens: int = 1000, max_refutation_tokens: int = 2000,
+                 max_sources_tokens: int = 500, policy: str = 'middle'):
+        if policy not in TRUNCATION_POLICIES:
+            raise ValueError(f'unknown truncation policy {policy!r}; use one of {", ".join(TRUNCATION_POLICIES)}')
+        self.tokenizer = tokenizer or Tokenizer()
+        self.max_prompt_tokens = max_prompt_tokens
+        self.max_description_tokens = max_description_tokens
+        self.max_refutation_tokens = max_refutation_tokens
+        self.max_sources_tokens = max_sources_tokens
+        self.policy = policy
+        # Bounty descriptions recur for every refutation of a bounty; cut each once
+        self._descriptions = OrderedDict()
+        self._descriptions_lock = threading.Lock()
+
+    def signature(self) -> str:
+        """Settings that change what the model sees; part of the prompt version."""
+        return (f'{self.max_prompt_tokens}/{self.max_description_tokens}/{self.max_refutation_tokens}/'
+                f'{self.max_sources_tokens}/{self.policy}')
+
+    def count(self, text: str) -> int:
+        return self.tokenizer.count(text)
+
+    def count_messages(self, messages: List[Dict]) -> int:
+        """Estimated prompt tokens for a chat request."""
+        return sum(TOKENS_PER_MESSAGE + self.count(m['content']) for m in messages) + TOKENS_PER_REPLY
+
+    def truncate(self, text: str, max_tokens: int) -> Tuple[str, int]:
+        """Fit `text` into `max_tokens` with the policy. Returns (text, tokens omitted)."""
+        total = self.count(text)
+        if total <= max_tokens:
+            return text, 0
+        if max_tokens <= 0:
+            return '', total
+
+        if self.policy == 'extract':
+            # Ellipses and joins are not in the sentence costs; shrink until the extract fits
+            room = max_tokens
+            while room > 0:
+                extracted = self._extract(text, room)
+                if not extracted:
+                    break
+                over = self.count(extracted) - max_tokens
+                if over <= 0:
+                    return extracted, total - self.count(extracted)
+                room -= over
+
+        keep = max(max_tokens - self.count(OMISSION_MARKER.format(count=total)), 0)
+        while True:
+            cut, omitted = self._cut(text, total, keep)
+            # Token boundaries shift where pieces are joined; shrink until the result fits
+            over = self.count(cut) - max_tokens
+            if over <= 0:
+                return cut, omitted
+            if keep == 0:
+                # Not even the omission marker fits
+                return '', total
+            keep = max(keep - over, 0)
+
+    def _cut(self, text: str, total: int, keep: int) -> Tuple[str, int]:
+        """Keep `keep` tokens of `text` by the 'head' or 'middle' policy, marking the omission."""
+        if self.policy == 'head':
+            kept = self.tokenizer.head(text, keep)
+            omitted = total - self.count(kept)
+            return kept + OMISSION_MARKER.format(count=omitted).rstrip(), omitted
+        head = self.tokenizer.head(text, keep - keep // 2)
+        tail = self.tokenizer.tail(text, keep // 2)
+        omitted = total - self.count(head) - self.count(tail)
+        return head + OMISSION_MARKER.format(count=omitted) + tail, omitted
+
+    def _extract(self, text: str, max_tokens: int) -> str:
+        """Lead sentence of each paragraph first, then later sentences, in document order."""
+        paragraphs = [_sentences(p) for p in re.split(r'\n\s*\n', text) if p.strip()]
+        sentences = [(p, s) for p, paragraph in enumerate(paragraphs) for s in range(len(paragraph))]
+        # Leads first, then everything else by position
+        order = sorted(sentences, key=lambda ps: (ps[1] > 0, ps))
+        chosen, used = set(), 0
+        for p, s in order:
+            cost = self.count(paragraphs[p][s]) + 1
+            if used + cost <= max_tokens:
+                chosen.add((p, s))
+                used += cost
+        if not chosen:
+            return ''
+
+        parts = []
+        for p, paragraph in enumerate(paragraphs):
+            kept = [paragraph[s] if (p, s) in chosen else None for s in range(len(paragraph))]
+            if not any(kept):
+                continue
+            # Runs of dropped sentences become one ellipsis
+            text_parts = []
+            for sentence in kept:
+                if sentence is not None:
+                    text_parts.append(sentence)
+                elif not text_parts or text_parts[-1] != '[...]':
+                    text_parts.append('[...]')
+            parts.append(' '.join(text_parts))
+        return '\n\n'.join(parts)
+
+    def fit_description(self, description: str) -> str:
+        """The bounty description within its budget; the same input always gives the same text."""
+        with self._descriptions_lock:
+            if description in self._descriptions:
+                self._descriptions.move_to_end(description)
+                return self._descriptions[description]
+        fitted, _ = self.truncate(description or '', self.max_description_tokens)
+        with self._descriptions_lock:
+            self._descriptions[description] = fitted
+            while len(self._descriptions) > 256:
+                self._descriptions.popitem(last=False)
+        return fitted
+
+    def fit_refutation(self, content: str, sources: Optional[str], available: int) -> Tuple[str, Optional[str], int]:
+        """
+        Fit a refutation and its sources into `available` tokens (what the
+        fixed parts of the prompt leave). Returns (content, sources, tokens omitted).
+        """
+        content, omitted = self.truncate(content or '', min(self.max_refutation_tokens, available))
+        if sources:
+            room = min(self.max_sources_tokens, available - self.count(content))
+            sources, sources_omitted = self.truncate(sources, room)
+            omitted += sources_omitted
+        return content, sources or None, omitted
+
+
+def log_usage(mode: str, estimated_prompt_tokens: int, response=None, omitted_tokens: int = 0) -> None:
+    """Record one call's token counts in the metrics, the running totals and the token log."""
+    usage = getattr(response, 'usage', None)
+    prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+    completion_tokens = getattr(usage, 'completion_tokens', 0) or 0
+    details = getattr(usage, 'prompt_tokens_details', None)
+    if isinstance(details, dict):
+        cached_tokens = details.get('cached_tokens') or 0
+    else:
+        cached_tokens = getattr(details, 'cached_tokens', 0) or 0
+
+    ADJUDICATOR_TOKENS.labels(kind='estimated_prompt').inc(estimated_prompt_tokens)
+    if cached_tokens:
+        ADJUDICATOR_TOKENS.labels(kind='cached_prompt').inc(cached_tokens)
+    with _totals_lock:
+        _totals['calls'] += 1
+        _totals['estimated_prompt_tokens'] += estimated_prompt_tokens
+        _totals['prompt_tokens'] += prompt_tokens
+        _totals['cached_prompt_tokens'] += cached_tokens
+        _totals['completion_tokens'] += completion_tokens
+        totals = dict(_totals)
+
+    if token_logger.isEnabledFor(logging.INFO):
+        token_logger.info(json.dumps({
+            'event': 'model_tokens',
+            'mode': mode,
+            'estimated_prompt_tokens': estimated_prompt_tokens,
+            'prompt_tokens': prompt_tokens,
+            'cached_prompt_tokens': cached_tokens,
+            'completion_tokens': completion_tokens,
+            'omitted_tokens': omitted_tokens,
+            'totals': totals
+        }))
+
+
+def usage_totals() -> Dict[str, int]:
+    """Token counts of every model call made by this process so far."""
+    with _totals_lock:
+        return dict(_totals)